@@ -1,90 +1,282 @@
 # main.py
 import network
-import urequests
+import uasyncio as asyncio
+from array import array
 from machine import SoftI2C, Pin
-from utime import ticks_diff, ticks_us, ticks_ms, sleep 
+from utime import ticks_diff, ticks_ms, sleep, time
 from max30102 import MAX30102, MAX30105_PULSE_AMP_MEDIUM
+from pulseguard.aio import AsyncUplink
+from pulseguard.filters import PPGFilter
+from pulseguard.heart_rate import HeartRateMonitor
+from pulseguard.hrv import HRVStats
+from pulseguard.memory import HeapMonitor
+from pulseguard.outbox import Outbox
+from pulseguard.pipeline import VitalSignsMonitor
+from pulseguard.presence import MOTION_END, MOTION_START, MotionEpisodes
+from pulseguard.profiling import Profiler
+from pulseguard.quality import SignalQuality
+from pulseguard.spo2 import SpO2Estimator
+
+# Aquisição por interrupção: o pino INT do MAX30102 (ativo em nível baixo)
+# avisa quando a FIFO está quase cheia. Com False, o sensor é sondado.
+MODO_INTERRUPCAO = True
+PINO_INT_MAX30102 = 19  # Ajuste para o GPIO conectado ao INT do MAX30102
+PINO_PRESENCA = 20  # Ajuste para o GPIO conectado ao HC-SR501
+
+# Amostras guardadas pelo driver enquanto o laço está ocupado (~5 s a 50 Hz)
+TAMANHO_ARMAZENAMENTO = 256
+# Amostras retiradas do armazenamento por chamada
+TAMANHO_LOTE = 64
+
+# Servidor Flask que recebe os dados (PUT /add)
+SERVIDOR_IP = "172.20.10.3"
+SERVIDOR_PORTA = 5000
+# Tempo máximo de um envio: um servidor lento não segura a fila
+TIMEOUT_ENVIO_MS = 5000
+# As mensagens são guardadas num arquivo circular na flash e enviadas em
+# lotes: sem servidor, nada se perde até o arquivo encher (~5 h de medidas a
+# cada 5 s com 256 KB; metade com o perfil); cheio, as mais antigas são
+# descartadas
+ARQUIVO_PENDENTES = "medidas_pendentes.bin"
+CAPACIDADE_PENDENTES = 256 * 1024
+# JSON enviado por lote e intervalo mínimo entre lotes: o acumulado é
+# esvaziado aos poucos, sem ocupar o rádio o tempo todo
+TAMANHO_LOTE_ENVIO = 4096
+INTERVALO_ENVIO_MS = 1000
+
+# Os batimentos são detectados a cada amostra: o BPM está sempre atualizado
+INTERVALO_BPM_S = 5
+# Índice de qualidade do sinal (0 a 1) abaixo do qual a janela é descartada
+QUALIDADE_MINIMA = 0.5
+# Sem interrupção: intervalo de leitura da FIFO (32 amostras = 640 ms a 50 Hz)
+PERIODO_SONDAGEM_MS = 100
+
+# HC-SR501 por interrupção: bordas mais curtas que DEBOUNCE_PRESENCA_MS são
+# ignoradas; um episódio de movimento termina depois de FIM_PRESENCA_MS com a
+# saída em nível baixo e dura no mínimo INTERVALO_PRESENCA_MS (no máximo um
+# início e um fim enviados por intervalo, por mais que o sensor dispare)
+DEBOUNCE_PRESENCA_MS = 100
+FIM_PRESENCA_MS = 5000
+INTERVALO_PRESENCA_MS = 30000
+# Intervalo de verificação dos episódios (não há leitura do pino)
+PERIODO_PRESENCA_MS = 100
+
+# Fragmentação do heap: medida por alocações de teste, cada uma seguida de uma
+# coleta (alguns ms no total), no máximo uma vez por período, depois de um
+# envio. None desliga a medida.
+PERIODO_FRAGMENTACAO_MS = 60000
+
+# Medida do tempo gasto em cada etapa (histogramas de latência) e dos
+# travamentos do laço de eventos, enviada junto com cada medida. Desligada,
+# custa uma chamada vazia por etapa.
+PERFILAMENTO = True
+# Imprime também as medidas no console a cada medida enviada
+PERFIL_NO_CONSOLE = False
+# Período da tarefa que mede o laço de eventos: um atraso bem maior indica
+# que alguma tarefa segurou o processador
+PERIODO_PERFIL_MS = 10
+# Etapas medidas (índices em ETAPAS)
+ETAPA_AMOSTRAS, ETAPA_BPM, ETAPA_PRESENCA, ETAPA_ENVIO, ETAPA_GC = range(5)
+ETAPAS = ("amostras", "bpm", "presenca", "envio", "gc")
+
+# Campos do JSON de cada medida. O dicionário é alocado uma única vez e
+# reutilizado (cada medida é gravada na flash assim que fica pronta), para
+# não fragmentar o heap
+CAMPOS_MEDIDA = (
+    "instante", "batimentos", "oximetria", "status", "qualidade", "rmssd",
+    "sdnn", "bpm_min", "bpm_max", "bpm_medio_sessao", "amostras_perdidas",
+    "estouros_fifo", "amostras_sobrescritas", "medidas_pendentes",
+    "medidas_descartadas", "heap_livre", "heap_usado", "fragmentacao_heap",
+    "gc_coletas", "gc_pausa_max_us", "gc_pausa_total_us", "perfil")
+# Início e fim de um episódio de movimento; só os valores mudam
+ALERTA_MOVIMENTO = {"instante": None, "evento": "Movimento detectado",
+                    "status": "Alerta", "episodio": None}
+FIM_MOVIMENTO = {"instante": None, "evento": "Movimento encerrado",
+                 "status": "Normal", "episodio": None, "duracao_s": None,
+                 "acionamentos": None}
+
+
+async def tarefa_aquisicao(sensor, novas_amostras):
+    # Modo sem interrupção: lê a FIFO do sensor para o armazenamento do driver
+    while True:
+        if sensor.check():
+            novas_amostras.set()
+        await asyncio.sleep_ms(PERIODO_SONDAGEM_MS)
+
+
+async def tarefa_perfil(perfil):
+    # Acorda a cada PERIODO_PERFIL_MS: os intervalos entre as voltas medem
+    # quanto o laço de eventos demora a atender as tarefas
+    while True:
+        perfil.loop()
+        await asyncio.sleep_ms(PERIODO_PERFIL_MS)
+
 
+async def tarefa_amostras(sensor, sinais, novas_amostras, perfil):
+    # Passa as amostras do armazenamento do driver para os monitores
+    # (frequência cardíaca e SpO2, numa única passagem)
+    red_lote = array('i', [0] * TAMANHO_LOTE)
+    ir_lote = array('i', [0] * TAMANHO_LOTE)
+    while True:
+        await novas_amostras.wait()
+        perfil.start(ETAPA_AMOSTRAS)
+        while sensor.available():
+            seq = sensor.get_storage_sequence()
+            n = sensor.read_storage(red_lote, ir_lote)
+            for i in range(n):
+                sinais.add_sample(red_lote[i], ir_lote[i], sensor.sample_timestamp(seq + i))
+        perfil.stop(ETAPA_AMOSTRAS)
+
+
+def arredonda(valor, casas=1):
+    # None (null no JSON) enquanto a estatística não tem dados suficientes
+    return round(valor, casas) if valor is not None else None
+
+
+async def tarefa_bpm(sensor, sinais, janela, sessao, qualidade, memoria,
+                     perfil, pendentes, novos_dados):
+    # Calcula o BPM a cada intervalo e guarda o resultado para envio; janela
+    # acumula os intervalos R-R do intervalo e sessao os de toda a execução
+    dados = dict.fromkeys(CAMPOS_MEDIDA)
+    ref_time = ticks_ms()
+    while True:
+        await asyncio.sleep_ms(
+            INTERVALO_BPM_S * 1000 - ticks_diff(ticks_ms(), ref_time))
+        ref_time = ticks_ms()
+
+        perfil.start(ETAPA_BPM)
+        heart_rate = sinais.calculate_heart_rate()
+        indice_qualidade = qualidade.index()
+        qualidade.reset()
+        if heart_rate is None:
+            perfil.stop(ETAPA_BPM)
+            janela.reset()
+            print("Não há dados suficientes para calcular a frequência cardíaca.\n")
+            continue
+        if indice_qualidade < QUALIDADE_MINIMA:
+            # Sem dedo, movimento ou saturação: nada é enviado
+            perfil.stop(ETAPA_BPM)
+            janela.reset()
+            print("Sinal de baixa qualidade (índice {:.2f}): medida descartada.\n".format(indice_qualidade))
+            continue
+        print("Frequência Cardíaca: {:.0f} BPM".format(heart_rate))
+        media_bpm = janela.mean_heart_rate() or heart_rate
+        print("Média de BPM nos últimos {} segundos: {:.0f} BPM".format(INTERVALO_BPM_S, media_bpm))
+        rmssd = janela.rmssd()
+        if rmssd is not None:
+            print("RMSSD: {:.0f} ms, SDNN: {:.0f} ms".format(rmssd, janela.sdnn() or 0))
+
+        spo2 = sinais.calculate_spo2()
+        if spo2 is not None:
+            print("SpO2: {:.1f} %".format(spo2))
+
+        amostras_perdidas, estouros_fifo = sensor.get_overflow_stats()
+        heap_livre, heap_usado, fragmentacao = memoria.heap()
+        dados["instante"] = time()
+        dados["batimentos"] = media_bpm
+        dados["oximetria"] = arredonda(spo2)
+        dados["status"] = "Normal" if 50 <= media_bpm <= 100 else "Alerta"
+        dados["qualidade"] = round(indice_qualidade, 2)
+        dados["rmssd"] = arredonda(rmssd)
+        dados["sdnn"] = arredonda(janela.sdnn())
+        dados["bpm_min"] = arredonda(janela.min_heart_rate())
+        dados["bpm_max"] = arredonda(janela.max_heart_rate())
+        dados["bpm_medio_sessao"] = arredonda(sessao.mean_heart_rate())
+        dados["amostras_perdidas"] = amostras_perdidas
+        dados["estouros_fifo"] = estouros_fifo
+        dados["amostras_sobrescritas"] = sensor.get_storage_overwritten()
+        # Medidas ainda não enviadas e descartadas com a flash cheia
+        dados["medidas_pendentes"] = len(pendentes)
+        dados["medidas_descartadas"] = pendentes.evicted
+        # Heap (None fora do MicroPython) e coletas de lixo
+        dados["heap_livre"] = heap_livre
+        dados["heap_usado"] = heap_usado
+        dados["fragmentacao_heap"] = arredonda(fragmentacao, 3)
+        dados["gc_coletas"] = memoria.collections
+        dados["gc_pausa_max_us"] = memoria.pause_us_max
+        dados["gc_pausa_total_us"] = memoria.pause_us_total
+        perfil.stop(ETAPA_BPM)
+        # Tempos das etapas desde a última medida (None se desligado)
+        dados["perfil"] = perfil.summary()
+        if PERFIL_NO_CONSOLE:
+            perfil.dump()
+        perfil.reset()
+        pendentes.append(dados)
+        novos_dados.set()
+        janela.reset()
+
+
+def instante_de(ticks):
+    # Instante (relógio do dispositivo, s) de um momento dado em ticks_ms
+    return time() - ticks_diff(ticks_ms(), ticks) // 1000
+
+
+async def tarefa_presenca(presenca, pendentes, novos_dados, perfil):
+    # Episódios de movimento do HC-SR501 (bordas tratadas por interrupção):
+    # uma mensagem no início e outra no fim, com a duração e o número de
+    # acionamentos, enviadas no próximo lote
+    while True:
+        perfil.start(ETAPA_PRESENCA)
+        evento = presenca.poll()
+        if evento == MOTION_START:
+            print("Movimento detectado!")
+            ALERTA_MOVIMENTO["instante"] = instante_de(presenca.start_ms)
+            ALERTA_MOVIMENTO["episodio"] = presenca.episodes
+            pendentes.append(ALERTA_MOVIMENTO)
+            novos_dados.set()
+        elif evento == MOTION_END:
+            print("Fim do movimento: {:.0f} s, {} acionamentos".format(
+                presenca.duration_ms / 1000, presenca.triggers))
+            FIM_MOVIMENTO["instante"] = instante_de(presenca.end_ms)
+            FIM_MOVIMENTO["episodio"] = presenca.episodes
+            FIM_MOVIMENTO["duracao_s"] = round(presenca.duration_ms / 1000, 1)
+            FIM_MOVIMENTO["acionamentos"] = presenca.triggers
+            pendentes.append(FIM_MOVIMENTO)
+            novos_dados.set()
+        perfil.stop(ETAPA_PRESENCA)
+        await asyncio.sleep_ms(PERIODO_PRESENCA_MS)
+
+
+async def tarefa_envio(pendentes, novos_dados, memoria, perfil):
+    # Envia as mensagens guardadas sem bloquear as outras tarefas, em lotes
+    # (um JSON com a lista de mensagens) por uma conexão HTTP/1.1 mantida
+    # aberta. Sem servidor, as tentativas ficam cada vez mais espaçadas.
+    # Depois de cada envio, que deixa lixo (strings), o heap é coletado se
+    # já passou o período
+    uplink = AsyncUplink(SERVIDOR_IP, SERVIDOR_PORTA,
+                         timeout_ms=TIMEOUT_ENVIO_MS)
+    while True:
+        espera = pendentes.wait_ms()
+        if espera is None:
+            # Nada guardado: espera a próxima mensagem
+            novos_dados.clear()
+            await novos_dados.wait()
+            continue
+        if espera:
+            await asyncio.sleep_ms(espera)
+            continue
+        quantidade, corpo = pendentes.next_batch()
+        # Tempo total do envio, incluindo a espera pelo servidor (as outras
+        # tarefas seguem rodando nesse meio tempo)
+        perfil.start(ETAPA_ENVIO)
+        try:
+            status = (await uplink.send("/add", (corpo,)))[0]
+            pendentes.complete(quantidade, status)
+            if 200 <= status < 300:
+                print("Dados enviados com sucesso!\n")
+            else:
+                print("Falha ao enviar dados: HTTP {}\n".format(status))
+        except asyncio.TimeoutError:
+            pendentes.failed()
+            print("Servidor não respondeu em {} ms ({} mensagens guardadas)\n".format(TIMEOUT_ENVIO_MS, len(pendentes)))
+        except Exception as e:
+            pendentes.failed()
+            print("Erro ao conectar com o servidor: {} ({} mensagens guardadas)\n".format(e, len(pendentes)))
+        perfil.stop(ETAPA_ENVIO)
+        perfil.start(ETAPA_GC)
+        memoria.idle()
+        perfil.stop(ETAPA_GC)
 
-class HeartRateMonitor:
-    """A simple heart rate monitor that uses a moving window to smooth the signal and find peaks."""
-
-    def __init__(self, sample_rate=100, window_size=10, smoothing_window=5):
-        self.sample_rate = sample_rate
-        self.window_size = window_size
-        self.smoothing_window = smoothing_window
-        self.samples = []
-        self.timestamps = []
-        self.filtered_samples = []
-
-    def add_sample(self, sample):
-        """Add a new sample to the monitor."""
-        timestamp = ticks_ms()
-        self.samples.append(sample)
-        self.timestamps.append(timestamp)
-
-        # Apply smoothing
-        if len(self.samples) >= self.smoothing_window:
-            smoothed_sample = (
-                sum(self.samples[-self.smoothing_window :]) / self.smoothing_window
-            )
-            self.filtered_samples.append(smoothed_sample)
-        else:
-            self.filtered_samples.append(sample)
-
-        # Maintain the size of samples and timestamps
-        if len(self.samples) > self.window_size:
-            self.samples.pop(0)
-            self.timestamps.pop(0)
-            self.filtered_samples.pop(0)
-
-    def find_peaks(self):
-        """Find peaks in the filtered samples."""
-        peaks = []
-
-        if len(self.filtered_samples) < 3:  # Need at least three samples to find a peak
-            return peaks
-
-        # Calculate dynamic threshold based on the min and max of the recent window of filtered samples
-        recent_samples = self.filtered_samples[-self.window_size :]
-        min_val = min(recent_samples)
-        max_val = max(recent_samples)
-        threshold = (
-            min_val + (max_val - min_val) * 0.5
-        )  # 50% between min and max as a threshold
-
-        for i in range(1, len(self.filtered_samples) - 1):
-            if (
-                self.filtered_samples[i] > threshold
-                and self.filtered_samples[i - 1] < self.filtered_samples[i]
-                and self.filtered_samples[i] > self.filtered_samples[i + 1]
-            ):
-                peak_time = self.timestamps[i]
-                peaks.append((peak_time, self.filtered_samples[i]))
-
-        return peaks
-
-    def calculate_heart_rate(self):
-        """Calculate the heart rate in beats per minute (BPM)."""
-        peaks = self.find_peaks()
-
-        if len(peaks) < 2:
-            return None  # Not enough peaks to calculate heart rate
-
-        # Calculate the average interval between peaks in milliseconds
-        intervals = []
-        for i in range(1, len(peaks)):
-            interval = ticks_diff(peaks[i][0], peaks[i - 1][0])
-            intervals.append(interval)
-
-        average_interval = sum(intervals) / len(intervals)
-
-        # Convert intervals to heart rate in beats per minute (BPM)
-        heart_rate = (
-            60000 / average_interval
-        )  # 60 seconds per minute * 1000 ms per second
-
-        return heart_rate
 
 def main():
     # Configuração do Wi-Fi
@@ -96,9 +288,17 @@ def main():
         sleep(1)
     print("Conectado à rede Wi-Fi:", wlan.ifconfig())
 
+    # Acerta o relógio, para que as mensagens guardadas durante uma queda da
+    # conexão cheguem com o instante em que foram feitas
+    try:
+        import ntptime
+        ntptime.settime()
+    except Exception as e:
+        print("Relógio não sincronizado:", e)
+
     # Configuração do sensor MAX30102
     i2c = SoftI2C(sda=Pin(16), scl=Pin(17), freq=400000)
-    sensor = MAX30102(i2c=i2c)
+    sensor = MAX30102(i2c=i2c, storage_size=TAMANHO_ARMAZENAMENTO)
 
     if sensor.i2c_address not in i2c.scan():
         print("Sensor não encontrado.")
@@ -116,88 +316,61 @@ def main():
     sensor.set_fifo_average(sensor_fifo_average)
     sensor.set_active_leds_amplitude(MAX30105_PULSE_AMP_MEDIUM)
 
+    # Sinalizada a cada lote de amostras guardado pelo driver
+    novas_amostras = asyncio.ThreadSafeFlag()
+    if MODO_INTERRUPCAO:
+        # A FIFO passa a ser lida pela interrupção, mesmo durante os envios
+        sensor.enable_interrupt_acquisition(
+            Pin(PINO_INT_MAX30102, Pin.IN, Pin.PULL_UP),
+            on_data=novas_amostras.set)
+
     actual_acquisition_rate = int(sensor_sample_rate / sensor_fifo_average)
     sleep(1)
     print("Iniciando aquisição de dados do MAX30102...")
 
+    # Sinal filtrado (linha de base e passa-faixa 0,5-4 Hz): janela de 2 s
     hr_monitor = HeartRateMonitor(
         sample_rate=actual_acquisition_rate,
-        window_size=int(actual_acquisition_rate * 3),
+        window_size=int(actual_acquisition_rate * 2),
+        prefilter=PPGFilter(actual_acquisition_rate),
     )
-
-    hr_compute_interval = 15  # segundos
-    ref_time = ticks_ms()
-
-    # Variáveis para acumular os valores de BPM
-    bpm_acumulados = []
-    numero_de_medidas = 0
-
-    # Configuração do sensor HC-SR501
-    sensor_presenca_pin = Pin(20, Pin.IN)  # Ajuste para o GPIO conectado ao HC-SR501
-
-    while True:
-        # Leitura do MAX30102
-        sensor.check()
-        if sensor.available():
-            red_reading = sensor.pop_red_from_storage()
-            ir_reading = sensor.pop_ir_from_storage()
-            hr_monitor.add_sample(ir_reading)
-
-        # Calcula BPM a cada intervalo
-        if ticks_diff(ticks_ms(), ref_time) / 1000 > hr_compute_interval:
-            heart_rate = hr_monitor.calculate_heart_rate()
-            if heart_rate is not None:
-                print("Frequência Cardíaca: {:.0f} BPM".format(heart_rate))
-                bpm_acumulados.append(heart_rate)
-                numero_de_medidas += 1
-
-                media_bpm = sum(bpm_acumulados) / len(bpm_acumulados)
-                print("Média de BPM nos últimos {} segundos: {:.0f} BPM".format(hr_compute_interval, media_bpm))
-
-                # Envia dados para o servidor
-                server_ip = "172.20.10.3"
-                server_port = 5000
-                url = f"http://{server_ip}:{server_port}/add"
-                dados_para_enviar = {
-                    "batimentos": media_bpm,
-                    "oximetria": 95.0,
-                    "status": "Normal" if 50 <= media_bpm <= 100 else "Alerta"
-                }
-                try:
-                    resposta = urequests.put(url, json=dados_para_enviar)
-                    if resposta.status_code == 200:
-                        print("Dados enviados com sucesso!\n")
-                    else:
-                        print(f"Falha ao enviar dados: {resposta.text}\n")
-                except Exception as e:
-                    print(f"Erro ao conectar com o servidor: {e}\n")
-
-                bpm_acumulados = []
-                numero_de_medidas = 0
-            else:
-                print("Não há dados suficientes para calcular a frequência cardíaca.\n")
-
-            ref_time = ticks_ms()
-
-        # Leitura do HC-SR501
-        if sensor_presenca_pin.value():
-            print("Movimento detectado!")
-            # Opcional: Enviar alerta de presença
-            url = f"http://{server_ip}:{server_port}/add"
-            dados_presenca = {
-                "evento": "Movimento detectado",
-                "status": "Alerta"
-            }
-            try:
-                resposta = urequests.put(url, json=dados_presenca)
-                if resposta.status_code == 200:
-                    print("Alerta de presença enviado com sucesso!")
-                else:
-                    print(f"Falha ao enviar alerta de presença: {resposta.text}")
-            except Exception as e:
-                print(f"Erro ao enviar alerta de presença: {e}")
-
-        sleep(0.1)  # Pequena pausa para evitar sobrecarga
+    # Estatísticas R-R do intervalo de envio e da sessão, em memória constante
+    janela = HRVStats()
+    sessao = HRVStats()
+    # Qualidade do sinal: sem contato as amostras não são analisadas
+    qualidade = SignalQuality(actual_acquisition_rate, sensor.get_adc_ceiling())
+    sinais = VitalSignsMonitor(
+        hr_monitor, SpO2Estimator(actual_acquisition_rate),
+        rr_stats=(janela, sessao), quality=qualidade)
+    # Mensagens aguardando envio, inclusive as de antes de um reinício, e o
+    # aviso de que há novas
+    pendentes = Outbox(ARQUIVO_PENDENTES, capacity=CAPACIDADE_PENDENTES,
+                       max_batch_bytes=TAMANHO_LOTE_ENVIO,
+                       min_interval_ms=INTERVALO_ENVIO_MS)
+    if len(pendentes):
+        print("Mensagens guardadas aguardando envio: {}".format(len(pendentes)))
+    novos_dados = asyncio.Event()
+    # Sensor de presença: bordas de subida e descida por interrupção
+    presenca = MotionEpisodes(
+        Pin(PINO_PRESENCA, Pin.IN), debounce_ms=DEBOUNCE_PRESENCA_MS,
+        gap_ms=FIM_PRESENCA_MS, min_interval_ms=INTERVALO_PRESENCA_MS)
+    # Coleta de lixo depois dos envios, com medida das pausas
+    memoria = HeapMonitor(probe_period_ms=PERIODO_FRAGMENTACAO_MS)
+    # Tempo de cada etapa e travamentos do laço de eventos
+    perfil = Profiler(ETAPAS, enabled=PERFILAMENTO)
+
+    tarefas = [
+        tarefa_amostras(sensor, sinais, novas_amostras, perfil),
+        tarefa_bpm(sensor, sinais, janela, sessao, qualidade, memoria,
+                   perfil, pendentes, novos_dados),
+        tarefa_presenca(presenca, pendentes, novos_dados, perfil),
+        tarefa_envio(pendentes, novos_dados, memoria, perfil),
+    ]
+    if not MODO_INTERRUPCAO:
+        tarefas.append(tarefa_aquisicao(sensor, novas_amostras))
+    if PERFILAMENTO:
+        tarefas.append(tarefa_perfil(perfil))
+    asyncio.run(asyncio.gather(*tarefas))
 
 if __name__ == "__main__":
     main()
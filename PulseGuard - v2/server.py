@@ -8,7 +8,11 @@ dados = []  # Lista para armazenar os dados enviados pelo PulseGuard
 def receber_dados():
     global dados
     novo_dado = request.get_json()
-    dados.append(novo_dado)
+    if isinstance(novo_dado, list):
+        # Lote de medidas guardadas no PulseGuard enquanto estava sem conexão
+        dados.extend(novo_dado)
+    else:
+        dados.append(novo_dado)
     return "Dados recebidos", 200
 
 @app.route('/', methods=['GET'])
@@ -0,0 +1,71 @@
+# Host-side benchmarks of the PulseGuard firmware, built on the emulator of
+# the host package. Each benchmark prints (or writes) a JSON report so that
+# results can be compared across releases:
+#
+#   python -m bench.driver --output driver.json
+#   python -m bench.dual_core --output dual_core.json
+#   python -m bench.filters --output filters.json
+#   python -m bench.kernels --output kernels.json
+#   python -m bench.outbox --output outbox.json
+
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import host
+from host.clock import VirtualClock
+
+
+def new_environment(realtime=False, **signal):
+    # Fresh emulated board with a MAX30102 on the bus; returns the
+    # environment and the emulated sensor. Benchmarks that use threads need
+    # the real-time clock.
+    env = host.install(host.Environment(VirtualClock(realtime)))
+    emulator = env.add_max30102(**signal)
+    return env, emulator
+
+
+def metadata():
+    try:
+        revision = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=host.FIRMWARE_PATH, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'python': platform.python_implementation() + ' ' +
+        platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def time_per_call(func, repeat):
+    # Mean CPU time of func() in microseconds
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000000 / repeat
+
+
+def peak_memory(func):
+    # Peak Python heap allocated while running func(), in bytes
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def write_report(report, output=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
@@ -0,0 +1,261 @@
+# HeartRateMonitor accuracy and throughput over a corpus of PPG traces.
+#
+#   python -m bench.accuracy [--seconds 30] [--csv trace.csv ...]
+#                            [--output accuracy.json]
+#
+# Every trace of the corpus is played at 25, 50, 100 and 400 Hz through a
+# HeartRateMonitor (with the PPGFilter stage, as in the main scripts) for
+# each window / smoothing combination. Reports, as JSON, per configuration:
+# - mae_bpm / max_error_bpm: error of calculate_heart_rate(), read every
+#   second, against the ground truth (mean of the same number of true R-R
+#   intervals), over all the traces;
+# - valid_fraction: share of the readings that were not None;
+# - first_valid_s: mean time to the first reading (null if one trace never
+#   gave any);
+# - us_per_sample: CPU time of add_sample() on the host;
+# - peak_memory_bytes: Python heap allocated by the monitor and its first
+#   window of samples;
+# and, per sample rate, the configuration with the lowest error.
+#
+# The synthetic corpus comes from host.ppg.PPGSignal. Recorded traces are
+# CSV files with a header and the columns time_s, ir and bpm (reference
+# heart rate, e.g. from a chest strap); they are linearly resampled to each
+# rate.
+
+import argparse
+import csv
+import os
+import time
+
+import bench
+
+SAMPLE_RATES = (25, 50, 100, 400)
+WINDOW_SECONDS = (1, 2, 3, 5)
+SMOOTHING_WINDOWS = (1, 3, 5, 9)
+# Name and PPGSignal parameters of the synthetic traces
+SYNTHETIC = (
+    ('rest_60', {'bpm': 60, 'noise': 0.02}),
+    ('normal_72', {'bpm': 72, 'noise': 0.05}),
+    ('bradycardia_45', {'bpm': 45, 'noise': 0.05}),
+    ('exercise_120', {'bpm': 120, 'noise': 0.05}),
+    ('tachycardia_160', {'bpm': 160, 'noise': 0.05}),
+    ('noisy_90', {'bpm': 90, 'noise': 0.15}),
+    ('low_perfusion_72', {'bpm': 72, 'noise': 0.05, 'perfusion': 0.005}),
+    ('motion_80', {'bpm': 80, 'noise': 0.05, 'motion': 0.5}),
+)
+# Heart rate readings are compared once per second
+READING_PERIOD_S = 1.0
+# Intervals averaged by the monitor (HeartRateMonitor's rr_intervals)
+RR_INTERVALS = 16
+
+
+class Trace(object):
+    # IR samples at a given rate, their timestamps (ms) and a function
+    # giving the reference heart rate (BPM) at a time (s), or None
+    def __init__(self, name, sample_rate, samples, reference):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.samples = samples
+        self.timestamps = [i * 1000 // sample_rate
+                           for i in range(len(samples))]
+        self.reference = reference
+
+
+def synthetic_trace(name, sample_rate, seconds, params):
+    from host.ppg import PPGSignal
+    signal = PPGSignal(seed=1, **params)
+    n = int(seconds * sample_rate)
+    samples = [int(signal.sample(i / sample_rate)[1]) for i in range(n)]
+    beats = signal.beats_between(0.0, seconds)
+
+    def reference(t):
+        past = [b for b in beats if b <= t][-(RR_INTERVALS + 1):]
+        if len(past) < 2:
+            return None
+        return 60.0 * (len(past) - 1) / (past[-1] - past[0])
+
+    return Trace(name, sample_rate, samples, reference)
+
+
+def load_csv(path):
+    times, ir, bpm = [], [], []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            times.append(float(row['time_s']))
+            ir.append(float(row['ir']))
+            bpm.append(float(row['bpm']))
+    return times, ir, bpm
+
+
+def resample(times, values, t):
+    # Linear interpolation of values at t; times are sorted
+    lo, hi = 0, len(times) - 1
+    if t <= times[lo]:
+        return values[lo]
+    if t >= times[hi]:
+        return values[hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if times[mid] <= t:
+            lo = mid
+        else:
+            hi = mid
+    w = (t - times[lo]) / (times[hi] - times[lo])
+    return values[lo] + (values[hi] - values[lo]) * w
+
+
+def recorded_trace(path, sample_rate, seconds=None):
+    times, ir, bpm = load_csv(path)
+    duration = times[-1] - times[0]
+    if seconds is not None:
+        duration = min(duration, seconds)
+    n = int(duration * sample_rate)
+    samples = [int(resample(times, ir, times[0] + i / sample_rate))
+               for i in range(n)]
+
+    def reference(t):
+        return resample(times, bpm, times[0] + t)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return Trace(name, sample_rate, samples, reference)
+
+
+def new_monitor(sample_rate, window_s, smoothing, filtered):
+    from pulseguard.filters import PPGFilter
+    from pulseguard.heart_rate import HeartRateMonitor
+    return HeartRateMonitor(
+        sample_rate=sample_rate, window_size=int(sample_rate * window_s),
+        smoothing_window=smoothing, rr_intervals=RR_INTERVALS,
+        prefilter=PPGFilter(sample_rate) if filtered else None)
+
+
+def run_trace(trace, window_s, smoothing, filtered):
+    monitor = new_monitor(trace.sample_rate, window_s, smoothing, filtered)
+    samples = trace.samples
+    timestamps = trace.timestamps
+    step = int(trace.sample_rate * READING_PERIOD_S)
+    errors = []
+    readings = 0
+    first_valid = None
+    cpu = 0.0
+    for start in range(0, len(samples), step):
+        end = min(start + step, len(samples))
+        t0 = time.perf_counter()
+        for i in range(start, end):
+            monitor.add_sample(samples[i], timestamps[i])
+        cpu += time.perf_counter() - t0
+        t = end / trace.sample_rate
+        heart_rate = monitor.calculate_heart_rate()
+        readings += 1
+        if heart_rate is None:
+            continue
+        if first_valid is None:
+            first_valid = t
+        reference = trace.reference(t)
+        if reference is not None:
+            errors.append(abs(heart_rate - reference))
+    return {
+        'errors': errors,
+        'readings': readings,
+        'first_valid_s': first_valid,
+        'us_per_sample': cpu * 1000000 / max(len(samples), 1),
+    }
+
+
+def window_memory(sample_rate, window_s, smoothing, filtered, trace):
+    def fill():
+        monitor = new_monitor(sample_rate, window_s, smoothing, filtered)
+        for i in range(min(monitor.window_size, len(trace.samples))):
+            monitor.add_sample(trace.samples[i], trace.timestamps[i])
+
+    return bench.peak_memory(fill)
+
+
+def evaluate(traces, sample_rate, window_s, smoothing, filtered):
+    errors = []
+    readings = 0
+    first_valid = []
+    cpu = []
+    per_trace = {}
+    for trace in traces:
+        result = run_trace(trace, window_s, smoothing, filtered)
+        errors += result['errors']
+        readings += result['readings']
+        first_valid.append(result['first_valid_s'])
+        cpu.append(result['us_per_sample'])
+        per_trace[trace.name] = (
+            round(sum(result['errors']) / len(result['errors']), 2)
+            if result['errors'] else None)
+    return {
+        'sample_rate': sample_rate,
+        'window_s': window_s,
+        'smoothing_window': smoothing,
+        'mae_bpm': round(sum(errors) / len(errors), 2) if errors else None,
+        'max_error_bpm': round(max(errors), 1) if errors else None,
+        'valid_fraction': round(len(errors) / max(readings, 1), 3),
+        'first_valid_s': (round(sum(first_valid) / len(first_valid), 2)
+                          if None not in first_valid else None),
+        'us_per_sample': round(sum(cpu) / len(cpu), 3),
+        'peak_memory_bytes': window_memory(sample_rate, window_s, smoothing,
+                                           filtered, traces[0]),
+        'mae_bpm_per_trace': per_trace,
+    }
+
+
+def best_configurations(results):
+    # Lowest error per sample rate; ties go to the cheaper configuration
+    best = {}
+    for result in results:
+        if result['mae_bpm'] is None:
+            continue
+        key = str(result['sample_rate'])
+        current = best.get(key)
+        score = (result['mae_bpm'], -result['valid_fraction'],
+                 result['us_per_sample'])
+        if current is None or score < (current['mae_bpm'],
+                                       -current['valid_fraction'],
+                                       current['us_per_sample']):
+            best[key] = result
+    return dict((rate, {'window_s': r['window_s'],
+                        'smoothing_window': r['smoothing_window'],
+                        'mae_bpm': r['mae_bpm']})
+                for rate, r in best.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=30.0,
+                        help='duration of each synthetic trace')
+    parser.add_argument('--csv', action='append', default=[],
+                        help='recorded trace (time_s, ir, bpm columns)')
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help='run the monitor without the PPGFilter stage')
+    parser.add_argument('--output', help='JSON file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    bench.new_environment()
+    filtered = not args.no_prefilter
+    results = []
+    for sample_rate in SAMPLE_RATES:
+        traces = [synthetic_trace(name, sample_rate, args.seconds, params)
+                  for name, params in SYNTHETIC]
+        traces += [recorded_trace(path, sample_rate) for path in args.csv]
+        for window_s in WINDOW_SECONDS:
+            for smoothing in SMOOTHING_WINDOWS:
+                results.append(evaluate(traces, sample_rate, window_s,
+                                        smoothing, filtered))
+
+    report = {
+        'benchmark': 'accuracy',
+        'metadata': bench.metadata(),
+        'prefilter': filtered,
+        'seconds': args.seconds,
+        'traces': [name for name, _ in SYNTHETIC] + args.csv,
+        'results': results,
+        'best': best_configurations(results),
+    }
+    bench.write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+# Driver and pipeline benchmark suite.
+#
+#   python -m bench.driver [--seconds 2] [--output report.json]
+#
+# Reports, as JSON:
+# - i2c: transactions, bytes and bus time per sample for every
+#   set_sample_rate() / set_fifo_average() combination, polling the sensor
+#   and with the interrupt-driven drain, plus the samples lost;
+# - decode: decode_fifo() throughput;
+# - add_sample: HeartRateMonitor.add_sample() cost per sample, without and
+#   with the PPGFilter stage;
+# - analysis: find_peaks() / calculate_heart_rate() latency and peak memory
+#   for several window sizes.
+# CPU times are measured on the host and only meaningful relative to each
+# other (and to previous runs on the same machine).
+
+import argparse
+from array import array
+
+import bench
+
+SAMPLE_RATES = (50, 100, 200, 400, 800, 1000, 1600, 3200)
+SAMPLE_AVERAGES = (1, 2, 4, 8, 16, 32)
+WINDOW_SECONDS = (1, 3, 5, 10)
+INT_PIN = 19
+
+
+def setup_sensor(env, sample_rate, sample_avg):
+    from machine import SoftI2C
+    from max30102 import MAX30102
+
+    sensor = MAX30102(SoftI2C(freq=400000), storage_size=1024)
+    sensor.setup_sensor(sample_rate=sample_rate, sample_avg=sample_avg)
+    env.bus.stats.reset()
+    return sensor
+
+
+def measure_i2c(sample_rate, sample_avg, seconds, interrupt):
+    env, emulator = bench.new_environment(bpm=72, noise=0.05)
+    if interrupt:
+        emulator.attach_int_pin(env.pin(INT_PIN))
+    sensor = setup_sensor(env, sample_rate, sample_avg)
+    ir = array('i', [0] * 256)
+    red = array('i', [0] * 256)
+    consumed = 0
+    deadline = env.clock.now_us() + int(seconds * 1000000)
+
+    if interrupt:
+        from machine import Pin, idle
+        sensor.enable_interrupt_acquisition(Pin(INT_PIN, Pin.IN, Pin.PULL_UP))
+        env.bus.stats.reset()
+        while env.clock.now_us() < deadline:
+            if not sensor.data_ready():
+                idle()
+                continue
+            while sensor.available():
+                consumed += sensor.read_storage(red, ir)
+    else:
+        while env.clock.now_us() < deadline:
+            sensor.check()
+            while sensor.available():
+                consumed += sensor.read_storage(red, ir)
+
+    # Collect what is left in the FIFO so that both modes are comparable
+    sensor.check()
+    while sensor.available():
+        consumed += sensor.read_storage(red, ir)
+
+    stats = env.bus.stats
+    dropped, overruns = sensor.get_overflow_stats()
+    per_sample = max(consumed, 1)
+    return {
+        'sample_rate': sample_rate,
+        'sample_avg': sample_avg,
+        'acquisition_hz': sample_rate / sample_avg,
+        'mode': 'interrupt' if interrupt else 'polling',
+        'samples': consumed,
+        'samples_generated': emulator.samples_generated,
+        'dropped_samples': dropped,
+        'counted_overflows': sensor.get_counted_overflows(),
+        'overrun_events': overruns,
+        'transactions': stats.transactions,
+        'transactions_per_sample': round(stats.transactions / per_sample, 3),
+        'bytes_per_sample': round(
+            (stats.bytes_read + stats.bytes_written) / per_sample, 2),
+        'bus_busy_fraction': round(stats.busy_us / (seconds * 1000000), 4),
+    }
+
+
+def bench_i2c(seconds):
+    results = []
+    for sample_rate in SAMPLE_RATES:
+        for sample_avg in SAMPLE_AVERAGES:
+            for interrupt in (False, True):
+                results.append(
+                    measure_i2c(sample_rate, sample_avg, seconds, interrupt))
+    return results
+
+
+def bench_decode():
+    env, _ = bench.new_environment()
+    sensor = setup_sensor(env, 400, 8)
+    for i in range(len(sensor._fifo_buffer)):
+        sensor._fifo_buffer[i] = (i * 37) & 0xFF
+    results = {}
+    for leds in (1, 2, 3):
+        sensor.set_led_mode(leds)
+        us = bench.time_per_call(lambda: sensor.decode_fifo(32), 2000)
+        results['leds_{0}'.format(leds)] = {
+            'us_per_burst': round(us, 2),
+            'samples_per_s': round(32 * 1000000 / us),
+        }
+    return results
+
+
+def synthetic_ir(n, sample_rate, bpm=72):
+    from host.ppg import PPGSignal
+    signal = PPGSignal(bpm=bpm, noise=0.05, seed=1)
+    return [int(signal.sample(i / sample_rate)[1]) for i in range(n)]
+
+
+def new_monitor(sample_rate, window_s, filtered=False):
+    from pulseguard.filters import PPGFilter
+    from pulseguard.heart_rate import HeartRateMonitor
+    return HeartRateMonitor(
+        sample_rate=sample_rate, window_size=int(sample_rate * window_s),
+        prefilter=PPGFilter(sample_rate) if filtered else None)
+
+
+def add_sample_cost(sample_rate, window_s, filtered):
+    monitor = new_monitor(sample_rate, window_s, filtered)
+    samples = synthetic_ir(sample_rate * window_s * 2, sample_rate)
+    period = 1000 // sample_rate
+    # Fill the window first: the steady state is what matters
+    for i, value in enumerate(samples):
+        monitor.add_sample(value, i * period)
+    position = [len(samples)]
+
+    def add():
+        i = position[0]
+        monitor.add_sample(samples[i % len(samples)], i * period)
+        position[0] = i + 1
+
+    return monitor, bench.time_per_call(add, 5000)
+
+
+def bench_add_sample():
+    bench.new_environment()
+    results = []
+    for sample_rate in (25, 50, 100, 400):
+        for window_s in WINDOW_SECONDS:
+            monitor, us = add_sample_cost(sample_rate, window_s, False)
+            _, us_filtered = add_sample_cost(sample_rate, window_s, True)
+            results.append({
+                'sample_rate': sample_rate,
+                'window_s': window_s,
+                'window_size': monitor.window_size,
+                'us_per_sample': round(us, 3),
+                'us_per_sample_filtered': round(us_filtered, 3),
+            })
+    return results
+
+
+def bench_analysis():
+    bench.new_environment()
+    results = []
+    for sample_rate in (25, 50, 100, 400):
+        for window_s in WINDOW_SECONDS:
+            monitor = new_monitor(sample_rate, window_s)
+            samples = synthetic_ir(monitor.window_size, sample_rate)
+            period = 1000 // sample_rate
+
+            def fill():
+                for i, value in enumerate(samples):
+                    monitor.add_sample(value, i * period)
+
+            memory = bench.peak_memory(fill)
+            repeat = max(10, 20000 // monitor.window_size)
+            results.append({
+                'sample_rate': sample_rate,
+                'window_s': window_s,
+                'window_size': monitor.window_size,
+                'find_peaks_us': round(
+                    bench.time_per_call(monitor.find_peaks, repeat), 2),
+                'calculate_heart_rate_us': round(
+                    bench.time_per_call(monitor.calculate_heart_rate,
+                                        repeat), 2),
+                'peak_memory_bytes': memory,
+                'heart_rate': monitor.calculate_heart_rate(),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='simulated acquisition time per I2C scenario')
+    parser.add_argument('--output', help='JSON file (default: stdout)')
+    parser.add_argument('--skip-i2c', action='store_true',
+                        help='skip the sample rate / averaging sweep')
+    args = parser.parse_args(argv)
+
+    report = {'benchmark': 'driver', 'metadata': bench.metadata()}
+    if not args.skip_i2c:
+        report['i2c'] = bench_i2c(args.seconds)
+    report['decode'] = bench_decode()
+    report['add_sample'] = bench_add_sample()
+    report['analysis'] = bench_analysis()
+    bench.write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Single-core vs dual-core acquisition under upload stalls.
+#
+#   python -m bench.dual_core [--seconds 3] [--output report.json]
+#
+# The main thread plays core 0: it feeds a HeartRateMonitor and makes a
+# blocking upload (urequests.put) every second, which holds it for the
+# server latency. In 'single' mode it also drains the sensor, as
+# codigo_principal.py does with MODO_INTERRUPCAO = False; in 'dual' mode a
+# DualCoreAcquisition thread drains it and the main thread only reads the
+# ring. The runs use the real-time clock (threads share it), so the numbers
+# depend on the host load; samples lost in the sensor FIFO or in the ring
+# are what to compare.
+
+import argparse
+from array import array
+
+import bench
+
+# (sample rate, averaging): 50, 400 and 1600 Hz of acquisition
+CONFIGURATIONS = ((400, 8), (400, 1), (1600, 1))
+LATENCIES_MS = (0, 300, 1500)
+UPLOAD_PERIOD_MS = 1000
+BATCH = 64
+
+
+def measure(sample_rate, sample_avg, latency_ms, seconds, dual):
+    env, emulator = bench.new_environment(realtime=True, bpm=72, noise=0.05)
+    env.server.latency_ms = latency_ms
+    from machine import SoftI2C
+    from max30102 import MAX30102
+    from pulseguard.acquisition import DualCoreAcquisition
+    from pulseguard.heart_rate import HeartRateMonitor
+    from utime import sleep_ms, ticks_diff, ticks_ms
+    import urequests
+
+    sensor = MAX30102(SoftI2C(freq=400000), storage_size=256)
+    sensor.setup_sensor(sample_rate=sample_rate, sample_avg=sample_avg)
+    rate = sample_rate / sample_avg
+    monitor = HeartRateMonitor(sample_rate=int(rate),
+                               window_size=int(rate * 3))
+    red = array('i', [0] * BATCH)
+    ir = array('i', [0] * BATCH)
+    timestamps = array('i', [0] * BATCH)
+    acquisition = None
+    if dual:
+        acquisition = DualCoreAcquisition(sensor, ring_size=1024)
+    env.bus.stats.reset()
+    generated = emulator.samples_generated
+    consumed = 0
+    uploads = 0
+
+    if acquisition is not None:
+        acquisition.start()
+    start = last_upload = ticks_ms()
+    while ticks_diff(ticks_ms(), start) < seconds * 1000:
+        if acquisition is not None:
+            n = acquisition.read(red, ir, timestamps)
+            for i in range(n):
+                monitor.add_sample(ir[i], timestamps[i])
+        else:
+            sensor.check()
+            n = 0
+            while sensor.available():
+                seq = sensor.get_storage_sequence()
+                k = sensor.read_storage(red, ir)
+                for i in range(k):
+                    monitor.add_sample(ir[i], sensor.sample_timestamp(seq + i))
+                n += k
+        consumed += n
+        if ticks_diff(ticks_ms(), last_upload) >= UPLOAD_PERIOD_MS:
+            last_upload = ticks_ms()
+            urequests.put('http://server/add', json={'n': consumed})
+            uploads += 1
+        if not n:
+            sleep_ms(1)
+
+    # The last upload may overrun the duration: collect what was acquired
+    elapsed_ms = ticks_diff(ticks_ms(), start)
+    if acquisition is not None:
+        acquisition.stop()
+        while True:
+            n = acquisition.read(red, ir, timestamps)
+            if not n:
+                break
+            consumed += n
+    # Once the thread has stopped the sensor is back to the main thread
+    sensor.check()
+    while sensor.available():
+        consumed += sensor.read_storage(red, ir)
+    dropped, overruns = sensor.get_overflow_stats()
+    lost_ring = acquisition.ring.dropped if acquisition is not None else 0
+    return {
+        'mode': 'dual' if dual else 'single',
+        'acquisition_hz': rate,
+        'latency_ms': latency_ms,
+        'uploads': uploads,
+        'samples_generated': emulator.samples_generated - generated,
+        'samples': consumed,
+        'throughput_hz': round(consumed * 1000 / elapsed_ms, 1),
+        'fifo_dropped': dropped,
+        'fifo_counted': sensor.get_counted_overflows(),
+        'fifo_overruns': overruns,
+        'ring_dropped': lost_ring,
+        'storage_overwritten': sensor.get_storage_overwritten(),
+        'drains': acquisition.drains if acquisition is not None else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Single-core vs dual-core acquisition benchmark')
+    parser.add_argument('--seconds', type=float, default=3.0,
+                        help='wall-clock duration of each scenario')
+    parser.add_argument('--output', help='JSON file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    results = []
+    for sample_rate, sample_avg in CONFIGURATIONS:
+        for latency_ms in LATENCIES_MS:
+            for dual in (False, True):
+                results.append(measure(sample_rate, sample_avg, latency_ms,
+                                       args.seconds, dual))
+    bench.write_report({'benchmark': 'dual_core', 'metadata': bench.metadata(),
+                        'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
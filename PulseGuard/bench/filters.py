@@ -0,0 +1,136 @@
+# Frequency response of the PPGFilter band-pass at each acquisition rate.
+#
+#   python -m bench.filters [--output filters.json]
+#
+# For every effective rate the driver can be configured for, sine waves
+# are played through pulseguard.filters.band_pass() (the integer section,
+# as on the board) and the measured gain is compared with the
+# floating-point design: below, at the edges of, inside and above the
+# 0.5-4 Hz band. A constant input gives the residual DC output. Rates at
+# which band_pass() refuses the design (its coefficients degenerate) are
+# listed separately and must raise ValueError. Any gain off by more than
+# GAIN_TOLERANCE, a DC output above OFFSET_TOLERANCE or any rate accepted
+# or refused unexpectedly is a failure, and the exit status is 1.
+
+import argparse
+import cmath
+import math
+import sys
+
+import bench
+
+# Effective rates (sample rate / averaging) up to 800 Hz, where the design
+# holds; band_pass() must refuse the faster ones
+SUPPORTED_RATES = (25, 50, 100, 200, 400, 800)
+REFUSED_RATES = (1000, 1600, 3200)
+LOW_HZ = 0.5
+HIGH_HZ = 4.0
+FREQUENCIES_HZ = (0.1, 0.5, 1.4, 4.0, 10.0)
+AMPLITUDE = 4000
+# The first seconds are left out, until the section has settled
+SETTLE_S = 20
+PERIODS = 6
+GAIN_TOLERANCE = 0.1
+OFFSET_TOLERANCE = 1.0
+
+
+def design_gain(sample_rate, frequency):
+    # Magnitude of the floating-point design at the given frequency
+    f0 = math.sqrt(LOW_HZ * HIGH_HZ)
+    q = f0 / (HIGH_HZ - LOW_HZ)
+    w0 = 2 * math.pi * f0 / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    a0 = 1 + alpha
+    z1 = cmath.exp(-2j * math.pi * frequency / sample_rate)
+    numerator = alpha / a0 * (1 - z1 * z1)
+    denominator = (1 - 2 * math.cos(w0) / a0 * z1 +
+                   (1 - alpha) / a0 * z1 * z1)
+    return abs(numerator / denominator)
+
+
+def settled_outputs(sample_rate, frequency, n):
+    # n outputs for a sine (a constant for 0 Hz) once the section settled
+    from pulseguard.filters import band_pass
+    section = band_pass(sample_rate, LOW_HZ, HIGH_HZ)
+    settle = int(sample_rate * SETTLE_S)
+    outputs = []
+    for k in range(settle + n):
+        x = int(round(AMPLITUDE * math.cos(
+            2 * math.pi * frequency * k / sample_rate)))
+        y = section.process(x)
+        if k >= settle:
+            outputs.append(y)
+    return outputs
+
+
+def measured_gain(sample_rate, frequency):
+    n = int(sample_rate * max(PERIODS / frequency, 2))
+    outputs = settled_outputs(sample_rate, frequency, n)
+    mean = sum(outputs) / n
+    power = sum((y - mean) ** 2 for y in outputs) / n
+    return math.sqrt(2 * power) / AMPLITUDE
+
+
+def dc_output(sample_rate):
+    outputs = settled_outputs(sample_rate, 0, sample_rate)
+    return sum(outputs) / len(outputs)
+
+
+def check_rate(sample_rate):
+    points = []
+    failures = 0
+    for frequency in FREQUENCIES_HZ:
+        if frequency >= sample_rate / 2:
+            continue
+        gain = measured_gain(sample_rate, frequency)
+        expected = design_gain(sample_rate, frequency)
+        ok = abs(gain - expected) <= GAIN_TOLERANCE
+        failures += not ok
+        points.append({
+            'frequency_hz': frequency,
+            'gain': round(gain, 3),
+            'design_gain': round(expected, 3),
+            'ok': ok,
+        })
+    offset = dc_output(sample_rate)
+    failures += abs(offset) > OFFSET_TOLERANCE
+    return {'sample_rate': sample_rate, 'response': points,
+            'dc_output': round(offset, 2)}, failures
+
+
+def refused(sample_rate):
+    from pulseguard.filters import band_pass
+    try:
+        band_pass(sample_rate, LOW_HZ, HIGH_HZ)
+    except ValueError:
+        return True
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', help='JSON file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    bench.new_environment()
+    results = []
+    failures = 0
+    for sample_rate in SUPPORTED_RATES:
+        if refused(sample_rate):
+            results.append({'sample_rate': sample_rate, 'refused': True})
+            failures += 1
+            continue
+        result, rate_failures = check_rate(sample_rate)
+        results.append(result)
+        failures += rate_failures
+    refusals = dict((str(rate), refused(rate)) for rate in REFUSED_RATES)
+    failures += list(refusals.values()).count(False)
+    bench.write_report({'benchmark': 'filters', 'metadata': bench.metadata(),
+                        'results': results, 'refused': refusals,
+                        'failures': failures}, args.output)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# Parity and speed of the compiled kernels against their pure-Python
+# versions.
+#
+#   python -m bench.kernels [--output kernels.json]    (host)
+#   mpremote run bench/kernels.py                       (board)
+#
+# The kernels selected by max30102.kernels and pulseguard.kernels (viper on
+# the board) and their pure-Python versions are run over random inputs and
+# compared with straightforward reference code; any mismatch is reported
+# and the exit status is 1. On the host both sides are the pure-Python
+# versions, so only the reference check is meaningful there. The report
+# also gives the time per call of each version, and of
+# HeartRateMonitor.add_sample() as a whole. The script only needs the
+# max30102 and pulseguard folders, so that it also runs on the board.
+
+import json
+import math
+import random
+import sys
+from array import array
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+
+if MICROPYTHON:
+    from time import ticks_diff, ticks_us
+
+    def elapsed_us(func, repeat):
+        start = ticks_us()
+        for _ in range(repeat):
+            func()
+        return ticks_diff(ticks_us(), start) / repeat
+else:
+    import host
+    host.install()
+    from bench import time_per_call as elapsed_us
+
+from max30102 import kernels as driver_kernels
+from pulseguard import filters, kernels
+from pulseguard.heart_rate import HeartRateMonitor
+
+CASES = 300
+# Values pushed into each deque
+PUSHES = 200
+# Samples fed to the monitor, and their rate
+STREAM = 1000
+STREAM_RATE = 100
+
+
+def decode_reference(src, n, offset, stride, shift):
+    values = []
+    for _ in range(n):
+        value = (src[offset] << 16) | (src[offset + 1] << 8) | src[offset + 2]
+        values.append((value & 0x3FFFF) >> shift)
+        offset += stride
+    return values
+
+
+def maxima_reference(values, start, n, size, threshold2):
+    ring = [values[(start + k) % size] for k in range(n)]
+    return [(start + k) % size for k in range(1, n - 1)
+            if 2 * ring[k] > threshold2 and ring[k - 1] < ring[k] > ring[k + 1]]
+
+
+def check_decode(rng):
+    src = bytearray(rng.getrandbits(8) for _ in range(32 * 9))
+    out = array('i', [0] * 32)
+    out_py = array('i', [0] * 32)
+    mismatches = 0
+    for _ in range(CASES):
+        stride = 3 * (1 + rng.getrandbits(8) % 3)
+        offset = 3 * (rng.getrandbits(8) % (stride // 3))
+        shift = rng.getrandbits(2)
+        n = 1 + rng.getrandbits(5)
+        params = array('i', [offset, stride, shift])
+        driver_kernels.decode_channel(src, out, n, params)
+        driver_kernels.decode_channel_py(src, out_py, n, params)
+        expected = decode_reference(src, n, offset, stride, shift)
+        if list(out[:n]) != expected or list(out_py[:n]) != expected:
+            mismatches += 1
+    return mismatches
+
+
+def check_maxima(rng):
+    mismatches = 0
+    for _ in range(CASES):
+        size = 3 + rng.getrandbits(8)
+        # A narrow range of values produces plateaus and ties
+        span = 1 << (2 + rng.getrandbits(3) % 18)
+        values = array('i', [rng.getrandbits(20) % span - span // 2
+                             for _ in range(size)])
+        start = rng.getrandbits(8) % size
+        n = 3 + rng.getrandbits(8) % (size - 2)
+        threshold2 = min(values) + max(values)
+        params = array('i', [start, n, size, threshold2])
+        out = array('i', [0] * size)
+        out_py = array('i', [0] * size)
+        count = kernels.local_maxima(values, out, params)
+        count_py = kernels.local_maxima_py(values, out_py, params)
+        expected = maxima_reference(values, start, n, size, threshold2)
+        if list(out[:count]) != expected or list(out_py[:count_py]) != expected:
+            mismatches += 1
+    return mismatches
+
+
+def check_deque(rng):
+    mismatches = 0
+    for _ in range(CASES):
+        size = 1 + rng.getrandbits(6)
+        span = 1 << (1 + rng.getrandbits(3) % 16)
+        # Start near the end of the position range, so that it wraps
+        position = kernels.POSITION_MASK - rng.getrandbits(8)
+        rings = [array('i', [0] * (2 * (size + 1))) for _ in range(2)]
+        states = [array('i', [0, 0, size]) for _ in range(2)]
+        window = []
+        for _ in range(PUSHES):
+            value = rng.getrandbits(20) % span - span // 2
+            kernels.deque_push(rings[0], states[0], position, value)
+            kernels.deque_push_py(rings[1], states[1], position, value)
+            window = (window + [value])[-size:]
+            expected = max(window)
+            fronts = [rings[k][size + 1 + states[k][0]] for k in (0, 1)]
+            if fronts != [expected, expected] or states[0] != states[1]:
+                mismatches += 1
+                break
+            position = (position + 1) & kernels.POSITION_MASK
+    return mismatches
+
+
+def ppg_stream(rng, baseline, amplitude):
+    # (value, timestamp) of a noisy 72 BPM pulse over a baseline
+    stream = []
+    for i in range(STREAM):
+        phase = 2 * math.pi * 1.2 * i / STREAM_RATE
+        value = baseline + int(amplitude * math.sin(phase) ** 3)
+        stream.append((value + rng.getrandbits(6) - 32,
+                       i * 1000 // STREAM_RATE))
+    return stream
+
+
+def add_sample_speed(stream, repeat):
+    monitor = HeartRateMonitor(
+        sample_rate=STREAM_RATE, window_size=2 * STREAM_RATE,
+        prefilter=filters.PPGFilter(STREAM_RATE))
+    position = [0]
+
+    def add():
+        i = position[0]
+        value, timestamp = stream[i % STREAM]
+        monitor.add_sample(value, timestamp + (i // STREAM) * 10000)
+        position[0] = i + 1
+
+    return elapsed_us(add, repeat)
+
+
+def speed(rng, repeat):
+    src = bytearray(rng.getrandbits(8) for _ in range(32 * 6))
+    out = array('i', [0] * 32)
+    decode_params = array('i', [3, 6, 0])
+    size = 200
+    values = array('i', [rng.getrandbits(16) for _ in range(size)])
+    peaks = array('i', [0] * size)
+    maxima_params = array('i', [17, size, size, min(values) + max(values)])
+    ring = array('i', [0] * (2 * (size + 1)))
+    state = array('i', [0, 0, size])
+    position = [0]
+
+    def push(deque_push):
+        i = position[0]
+        deque_push(ring, state, i, values[i % size])
+        position[0] = (i + 1) & kernels.POSITION_MASK
+
+    times = {
+        'decode_32_us': elapsed_us(
+            lambda: driver_kernels.decode_channel(src, out, 32, decode_params),
+            repeat),
+        'decode_32_us_py': elapsed_us(
+            lambda: driver_kernels.decode_channel_py(src, out, 32,
+                                                     decode_params), repeat),
+        'local_maxima_200_us': elapsed_us(
+            lambda: kernels.local_maxima(values, peaks, maxima_params),
+            repeat),
+        'local_maxima_200_us_py': elapsed_us(
+            lambda: kernels.local_maxima_py(values, peaks, maxima_params),
+            repeat),
+        'deque_push_us': elapsed_us(
+            lambda: push(kernels.deque_push), repeat),
+        'deque_push_us_py': elapsed_us(
+            lambda: push(kernels.deque_push_py), repeat),
+        'add_sample_us': add_sample_speed(ppg_stream(rng, 100000, 3000),
+                                          repeat),
+    }
+    return times
+
+
+def main(argv=None):
+    output = None
+    repeat = 200
+    if not MICROPYTHON:
+        import argparse
+        parser = argparse.ArgumentParser(description=__doc__)
+        parser.add_argument('--repeat', type=int, default=2000)
+        parser.add_argument('--output', help='write the report to this file')
+        args = parser.parse_args(argv)
+        output = args.output
+        repeat = args.repeat
+    if MICROPYTHON:
+        random.seed(1)
+        rng = random
+    else:
+        rng = random.Random(1)
+    mismatches = {
+        'decode_channel': check_decode(rng),
+        'local_maxima': check_maxima(rng),
+        'deque_push': check_deque(rng),
+    }
+    report = {
+        'compiled': driver_kernels.decode_channel
+        is not driver_kernels.decode_channel_py,
+        'mismatches': mismatches,
+        'speed': speed(rng, repeat),
+    }
+    if MICROPYTHON:
+        print(json.dumps(report))
+    else:
+        import bench
+        report['metadata'] = bench.metadata()
+        bench.write_report(report, output)
+    if any(report['mismatches'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Recovery check and cost of pulseguard.outbox.Outbox.
+#
+#   python -m bench.outbox [--output outbox.json]
+#
+# Readings are appended to small ring files (so that they wrap and evict
+# often), batches are delivered (with any 2xx status) and the file is
+# reopened, as after a reboot, every few operations. After each step the
+# queue must hold the most recent readings not yet delivered, oldest first
+# and without gaps, and reopening must find exactly the same queue. The
+# fixed scenarios include a record chain that ends less than one record
+# header before the end of the file. Any mismatch is a failure, and the exit status is 1.
+# The report also gives the cost of append() and next_batch().
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import bench
+
+# (capacity, JSON length of each reading): 420 / 100-byte records leaves
+# 4 bytes at the end of the file, less than a record header
+FIXED_SCENARIOS = ((420, 92), (424, 92), (116, 92), (200, 30), (1000, 7))
+RANDOM_SCENARIOS = 200
+# Statuses of a delivered batch
+SUCCESS_STATUSES = (200, 201, 202, 204)
+OPERATIONS = 300
+
+
+def reading(i, length):
+    # JSON string of exactly `length` bytes carrying its index
+    return '{0:06d}'.format(i).ljust(length - 2, 'x')
+
+
+class Checker:
+
+    def __init__(self, path, capacity):
+        from pulseguard.outbox import Outbox
+        self.new_outbox = lambda: Outbox(path, capacity=capacity,
+                                         max_batch_bytes=capacity)
+        self.outbox = self.new_outbox()
+        self.appended = []
+        self.first = 0
+        self.errors = []
+
+    def pending(self):
+        outbox = self.outbox
+        count, body = outbox.next_batch()
+        try:
+            values = json.loads(body)
+        except ValueError:
+            self.errors.append('corrupt batch {0!r}'.format(body[:40]))
+            return []
+        if count != len(outbox) or len(values) != count:
+            self.errors.append('count {0} for {1} queued'.format(
+                count, len(outbox)))
+        return values
+
+    def check(self, step):
+        values = self.pending()
+        start = len(self.appended) - len(values)
+        if start < self.first or values != self.appended[start:]:
+            self.errors.append('{0}: queue {1} after {2}'.format(
+                step, [v[:6] for v in values],
+                [v[:6] for v in self.appended[self.first:]]))
+        else:
+            self.first = start
+        return values
+
+    def append(self, value):
+        self.outbox.append(value)
+        self.appended.append(value)
+        if not self.check('append'):
+            self.errors.append('append: reading not queued')
+
+    def deliver(self, count, status):
+        count = min(count, len(self.outbox))
+        self.outbox.complete(count, status)
+        self.first += count
+        self.check('deliver')
+
+    def reopen(self):
+        before = self.pending()
+        self.outbox.close()
+        self.outbox = self.new_outbox()
+        if self.pending() != before:
+            self.errors.append('reopen: {0} readings instead of {1}'.format(
+                len(self.outbox), len(before)))
+        self.check('reopen')
+
+
+def run_scenario(directory, capacity, lengths, seed):
+    path = os.path.join(directory, 'outbox.bin')
+    if os.path.exists(path):
+        os.remove(path)
+    checker = Checker(path, capacity)
+    rng = random.Random(seed)
+    for i in range(OPERATIONS):
+        checker.append(reading(i, rng.choice(lengths)))
+        if rng.random() < 0.1:
+            checker.deliver(rng.randint(1, 3), rng.choice(SUCCESS_STATUSES))
+        if rng.random() < 0.3:
+            checker.reopen()
+        if checker.errors:
+            break
+    checker.outbox.close()
+    return {'capacity': capacity, 'lengths': list(lengths), 'seed': seed,
+            'evicted': checker.outbox.evicted,
+            'errors': checker.errors[:3]}
+
+
+def check_recovery(directory):
+    results = []
+    for capacity, length in FIXED_SCENARIOS:
+        results.append(run_scenario(directory, capacity, (length,), 0))
+    rng = random.Random(1)
+    for seed in range(RANDOM_SCENARIOS):
+        capacity = rng.randint(40, 600)
+        lengths = [rng.randint(2, capacity - 40) for _ in range(3)]
+        results.append(run_scenario(directory, capacity, lengths, seed))
+    return results
+
+
+def bench_costs(directory):
+    from pulseguard.outbox import Outbox
+    path = os.path.join(directory, 'cost.bin')
+    outbox = Outbox(path, capacity=64 * 1024)
+    value = {'bpm': 72, 'spo2': 98, 'timestamp': 123456789}
+    append_us = bench.time_per_call(lambda: outbox.append(value), 2000)
+    batch_us = bench.time_per_call(outbox.next_batch, 200)
+    result = {'append_us': round(append_us, 2),
+              'next_batch_us': round(batch_us, 2), 'queued': len(outbox),
+              'batch_readings': outbox.next_batch()[0]}
+    outbox.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', help='JSON file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    bench.new_environment()
+    directory = tempfile.mkdtemp()
+    try:
+        results = check_recovery(directory)
+        costs = bench_costs(directory)
+    finally:
+        shutil.rmtree(directory)
+    failures = [r for r in results if r['errors']]
+    bench.write_report({'benchmark': 'outbox', 'metadata': bench.metadata(),
+                        'scenarios': len(results), 'failures': failures,
+                        'costs': costs}, args.output)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,91 +1,86 @@
 # main.py
 import network
-import urequests
+from array import array
 
-from machine import SoftI2C, Pin
-from utime import ticks_diff, ticks_us, ticks_ms, sleep 
+from machine import SoftI2C, Pin, idle
+from utime import ticks_diff, ticks_us, ticks_ms, sleep, time
 from max30102 import MAX30102, MAX30105_PULSE_AMP_MEDIUM
-
-
-class HeartRateMonitor:
-    """A simple heart rate monitor that uses a moving window to smooth the signal and find peaks."""
-
-    def __init__(self, sample_rate=100, window_size=10, smoothing_window=5):
-        self.sample_rate = sample_rate
-        self.window_size = window_size
-        self.smoothing_window = smoothing_window
-        self.samples = []
-        self.timestamps = []
-        self.filtered_samples = []
-
-    def add_sample(self, sample):
-        """Add a new sample to the monitor."""
-        timestamp = ticks_ms()
-        self.samples.append(sample)
-        self.timestamps.append(timestamp)
-
-        # Apply smoothing
-        if len(self.samples) >= self.smoothing_window:
-            smoothed_sample = (
-                sum(self.samples[-self.smoothing_window:]) / self.smoothing_window
-            )
-            self.filtered_samples.append(smoothed_sample)
-        else:
-            self.filtered_samples.append(sample)
-
-        # Maintain the size of samples and timestamps
-        if len(self.samples) > self.window_size:
-            self.samples.pop(0)
-            self.timestamps.pop(0)
-            self.filtered_samples.pop(0)
-
-    def find_peaks(self):
-        """Find peaks in the filtered samples."""
-        peaks = []
-
-        if len(self.filtered_samples) < 3:  # Need at least three samples to find a peak
-            return peaks
-
-        # Calculate dynamic threshold based on the min and max of the recent window of filtered samples
-        recent_samples = self.filtered_samples[-self.window_size:]
-        min_val = min(recent_samples)
-        max_val = max(recent_samples)
-        threshold = (
-            min_val + (max_val - min_val) * 0.5
-        )  # 50% between min and max as a threshold
-
-        for i in range(1, len(self.filtered_samples) - 1):
-            if (
-                self.filtered_samples[i] > threshold
-                and self.filtered_samples[i - 1] < self.filtered_samples[i]
-                and self.filtered_samples[i] > self.filtered_samples[i + 1]
-            ):
-                peak_time = self.timestamps[i]
-                peaks.append((peak_time, self.filtered_samples[i]))
-
-        return peaks
-
-    def calculate_heart_rate(self):
-        """Calculate the heart rate in beats per minute (BPM)."""
-        peaks = self.find_peaks()
-
-        if len(peaks) < 2:
-            return None  # Not enough peaks to calculate heart rate
-
-        # Calculate the average interval between peaks in milliseconds
-        intervals = []
-        for i in range(1, len(peaks)):
-            interval = ticks_diff(peaks[i][0], peaks[i - 1][0])
-            intervals.append(interval)
-
-        average_interval = sum(intervals) / len(intervals)
-
-        # Convert intervals to heart rate in beats per minute (BPM)
-        heart_rate = (
-            60000 / average_interval
-        )  # 60 seconds per minute * 1000 ms per second
-
-        return heart_rate
+from pulseguard.acquisition import DualCoreAcquisition
+from pulseguard.filters import PPGFilter
+from pulseguard.heart_rate import HeartRateMonitor
+from pulseguard.hrv import HRVStats
+from pulseguard.memory import HeapMonitor
+from pulseguard.outbox import Outbox
+from pulseguard.pipeline import VitalSignsMonitor
+from pulseguard.profiling import Profiler
+from pulseguard.quality import SignalQuality
+from pulseguard.rate_control import RateController
+from pulseguard.spo2 import SpO2Estimator
+from pulseguard.uplink import Uplink
+
+# Aquisição por interrupção: o pino INT do MAX30102 (ativo em nível baixo)
+# avisa quando a FIFO está quase cheia. Com False, o sensor é sondado.
+MODO_INTERRUPCAO = True
+PINO_INT_MAX30102 = 19  # Ajuste para o GPIO conectado ao INT do MAX30102
+# Amostras na FIFO que disparam a interrupção (17 a 32)
+LIMIAR_FIFO = 17
+
+# Aquisição no segundo núcleo: o núcleo 1 lê a FIFO continuamente e passa as
+# amostras ao núcleo 0 (análise, Wi-Fi e HTTP) por um anel sem trava.
+# Tem prioridade sobre MODO_INTERRUPCAO.
+MODO_DOIS_NUCLEOS = False
+# Amostras que o anel entre os núcleos guarda (~5 s a 50 Hz)
+TAMANHO_ANEL = 256
+
+# Amostras guardadas pelo driver enquanto o laço está ocupado (~5 s a 50 Hz)
+TAMANHO_ARMAZENAMENTO = 256
+# Amostras retiradas do armazenamento por chamada
+TAMANHO_LOTE = 64
+
+# Índice de qualidade do sinal (0 a 1) abaixo do qual a janela é descartada:
+# sem dedo, com movimento ou saturação nada é enviado ao servidor
+QUALIDADE_MINIMA = 0.5
+
+# Tempo máximo de um envio (conexão incluída): um servidor lento não segura
+# o laço além disso
+TIMEOUT_ENVIO_MS = 2000
+
+# As medidas são guardadas num arquivo circular na flash e enviadas em lotes:
+# sem servidor, nada se perde até o arquivo encher (~5 h de medidas a cada
+# 5 s com 256 KB; metade com o perfil); cheio, as mais antigas são descartadas
+ARQUIVO_PENDENTES = "medidas_pendentes.bin"
+CAPACIDADE_PENDENTES = 256 * 1024
+# JSON enviado por lote e intervalo mínimo entre lotes: o acumulado é
+# esvaziado aos poucos, sem segurar o laço nem o rádio
+TAMANHO_LOTE_ENVIO = 4096
+INTERVALO_ENVIO_MS = 1000
+
+# Taxa de aquisição adaptativa: sobe quando o laço tem folga e desce antes
+# que amostras sejam perdidas (ver pulseguard.rate_control.PROFILES). Não se
+# aplica a MODO_DOIS_NUCLEOS, em que o sensor pertence ao núcleo 1.
+CONTROLE_DE_TAXA = True
+# Perfil inicial: 400 amostras/s com média de 8, ou seja, 50 Hz
+PERFIL_INICIAL = 1
+
+# Fragmentação do heap: medida por alocações de teste, cada uma seguida de uma
+# coleta (alguns ms no total), no máximo uma vez por período e só nos momentos
+# ociosos (modo de interrupção ou de dois núcleos). None desliga a medida.
+PERIODO_FRAGMENTACAO_MS = 60000
+
+# Medida do tempo gasto em cada etapa do laço (histogramas de latência, laços
+# por segundo e travamentos), enviada junto com os dados. Desligada, custa
+# uma chamada vazia por etapa.
+PERFILAMENTO = True
+# Imprime também as medidas no console a cada envio
+PERFIL_NO_CONSOLE = False
+# Etapas medidas (índices em ETAPAS)
+ETAPA_SENSOR, ETAPA_AMOSTRAS, ETAPA_BPM, ETAPA_ENVIO, ETAPA_GC = range(5)
+ETAPAS = ("sensor", "amostras", "bpm", "envio", "gc")
+
+
+def arredonda(valor, casas=1):
+    # None (null no JSON) enquanto a estatística não tem dados suficientes
+    return round(valor, casas) if valor is not None else None
 
 
 def main():
@@ -98,6 +93,14 @@ def main():
         sleep(1)
     print("Conectado à rede Wi-Fi:", wlan.ifconfig())
 
+    # Acerta o relógio, para que as medidas guardadas durante uma queda da
+    # conexão cheguem com o instante em que foram feitas
+    try:
+        import ntptime
+        ntptime.settime()
+    except Exception as e:
+        print("Relógio não sincronizado:", e)
+
     # I2C software instance
     i2c = SoftI2C(
         sda=Pin(16),  # SDA pin
@@ -106,7 +109,7 @@ def main():
     )  # I2C frequency
 
     # Sensor instance
-    sensor = MAX30102(i2c=i2c)  # An I2C instance is required
+    sensor = MAX30102(i2c=i2c, storage_size=TAMANHO_ARMAZENAMENTO)  # An I2C instance is required
 
     # Scan I2C bus to ensure that the sensor is connected
     if sensor.i2c_address not in i2c.scan():
@@ -123,18 +126,42 @@ def main():
     print("Configurando o sensor com a configuração padrão.\n")
     sensor.setup_sensor()
 
-    # Set the sample rate to 400: 400 samples/s are collected by the sensor
-    sensor_sample_rate = 400
+    # Acquisition profile chosen by the rate controller, from the FIFO fill
+    # level at each drain, the age of the samples when they are processed
+    # and the samples lost
+    controle = RateController(
+        initial=PERFIL_INICIAL, capacity=TAMANHO_ARMAZENAMENTO,
+        fifo_threshold=LIMIAR_FIFO if MODO_INTERRUPCAO else 0)
+    sensor_sample_rate, sensor_fifo_average = controle.profile()
+
+    # Set the sample rate: sensor_sample_rate samples/s are collected by the sensor
     sensor.set_sample_rate(sensor_sample_rate)
 
     # Set the number of samples to be averaged per each reading
-    sensor_fifo_average = 8
     sensor.set_fifo_average(sensor_fifo_average)
 
     # Set LED brightness to a medium value
     sensor.set_active_leds_amplitude(MAX30105_PULSE_AMP_MEDIUM)
 
-    # Expected acquisition rate: 400 Hz / 8 = 50 Hz
+    # Tempo de cada etapa do laço. No modo de dois núcleos o sensor é lido
+    # pelo núcleo 1, e a etapa "sensor" não é medida nem enviada
+    if MODO_DOIS_NUCLEOS:
+        perfil = Profiler((None,) + ETAPAS[1:], enabled=PERFILAMENTO)
+    else:
+        perfil = Profiler(ETAPAS, enabled=PERFILAMENTO)
+
+    # Drain the FIFO when it is almost full instead of polling it
+    if MODO_INTERRUPCAO and not MODO_DOIS_NUCLEOS:
+        # A leitura é feita fora do laço (agendada pela interrupção): o
+        # driver informa a duração de cada uma para a etapa "sensor"
+        def mede_leitura(duracao_us):
+            perfil.record(ETAPA_SENSOR, duracao_us)
+
+        sensor.enable_interrupt_acquisition(
+            Pin(PINO_INT_MAX30102, Pin.IN, Pin.PULL_UP),
+            almost_full=LIMIAR_FIFO, on_drain=mede_leitura)
+
+    # Expected acquisition rate, e.g. 400 Hz / 8 = 50 Hz
     actual_acquisition_rate = int(sensor_sample_rate / sensor_fifo_average)
 
     sleep(1)
@@ -150,73 +177,223 @@ def main():
         # Select a sample rate that matches the sensor's acquisition rate
         sample_rate=actual_acquisition_rate,
         # Select a significant window size to calculate the heart rate (2-5 seconds)
-        window_size=int(actual_acquisition_rate * 3),
+        window_size=int(actual_acquisition_rate * 2),
+        # Baseline removal and 0.5-4 Hz band-pass before the peak detection:
+        # with the cleaner signal a 2-second window is enough
+        prefilter=PPGFilter(actual_acquisition_rate),
     )
-
-    # Setup to calculate the heart rate every 15 seconds
-    hr_compute_interval = 15  # segundos
+    # Heart rate and SpO2 from the same pass over the red and IR readings:
+    # each beat found on the IR channel closes an SpO2 window and feeds its
+    # R-R interval to the statistics of the report window and the session
+    janela = HRVStats()
+    sessao = HRVStats()
+    # Qualidade do sinal (contato, perfusão, saturação do ADC e regularidade
+    # dos batimentos): sem contato as amostras não são analisadas
+    qualidade = SignalQuality(actual_acquisition_rate, sensor.get_adc_ceiling())
+    sinais = VitalSignsMonitor(
+        hr_monitor, SpO2Estimator(actual_acquisition_rate),
+        rr_stats=(janela, sessao), quality=qualidade)
+
+    # Setup to report the heart rate every 5 seconds (beats are detected as
+    # the samples arrive, so the value is always up to date)
+    hr_compute_interval = 5  # segundos
+    # Em milissegundos, calculado uma vez: o teste do laço fica só com inteiros
+    intervalo_bpm_ms = hr_compute_interval * 1000
     ref_time = ticks_ms()  # Reference time
 
-    # Variáveis para acumular os valores de BPM
-    bpm_acumulados = []
-    numero_de_medidas = 0
+    # Buffers preenchidos em lote a partir do armazenamento do driver
+    red_lote = array('i', [0] * TAMANHO_LOTE)
+    ir_lote = array('i', [0] * TAMANHO_LOTE)
+    tempos_lote = array('i', [0] * TAMANHO_LOTE)
+
+    # Envia os dados para o servidor
+    # Destaque: Mude o endereço IP abaixo para o IP do seu servidor Flask
+    server_ip = "172.20.10.3"  # Alterar para o IP do servidor
+    server_port = 5000
+    # Uma única conexão HTTP/1.1 mantida aberta entre os envios (keep-alive),
+    # reaberta automaticamente se o servidor a fechar
+    uplink = Uplink(server_ip, server_port, timeout_ms=TIMEOUT_ENVIO_MS)
+    # Medidas aguardando envio, inclusive as de antes de um reinício
+    pendentes = Outbox(ARQUIVO_PENDENTES, capacity=CAPACIDADE_PENDENTES,
+                       max_batch_bytes=TAMANHO_LOTE_ENVIO,
+                       min_interval_ms=INTERVALO_ENVIO_MS)
+    if len(pendentes):
+        print("Medidas guardadas aguardando envio: {}\n".format(len(pendentes)))
+    # JSON alocado uma única vez: no laço só os valores mudam, para não
+    # fragmentar o heap ao longo de dias de funcionamento
+    dados_para_enviar = dict.fromkeys((
+        "instante", "batimentos", "oximetria", "status", "qualidade",
+        "taxa_aquisicao", "rmssd", "sdnn", "bpm_min", "bpm_max",
+        "bpm_medio_sessao", "amostras_perdidas", "estouros_fifo",
+        "amostras_sobrescritas", "medidas_pendentes", "medidas_descartadas",
+        "heap_livre", "heap_usado", "fragmentacao_heap", "gc_coletas",
+        "gc_pausa_max_us", "gc_pausa_total_us", "perfil"))
+
+    # Coleta de lixo nos momentos ociosos, com medida das pausas
+    memoria = HeapMonitor(probe_period_ms=PERIODO_FRAGMENTACAO_MS)
+
+    # A partir daqui o sensor pertence ao núcleo 1
+    aquisicao = None
+    if MODO_DOIS_NUCLEOS:
+        aquisicao = DualCoreAcquisition(sensor, ring_size=TAMANHO_ANEL)
+        aquisicao.start()
 
     while True:
-        # O método check() precisa ser continuamente sondado para verificar se há novas leituras na fila FIFO do sensor.
-        sensor.check()
-
-        # Verifica se há amostras disponíveis
-        if sensor.available():
-            # Acessa a fila FIFO e coleta as leituras (inteiros)
-            red_reading = sensor.pop_red_from_storage()
-            ir_reading = sensor.pop_ir_from_storage()
-
-            # Adiciona a leitura IR ao monitor de frequência cardíaca
-            hr_monitor.add_sample(ir_reading)
+        perfil.loop()
+        if aquisicao is not None:
+            # O núcleo 1 lê a FIFO; aqui só se retiram as amostras do anel,
+            # já com o instante de aquisição de cada uma
+            n = aquisicao.read(red_lote, ir_lote, tempos_lote)
+            if not n:
+                memoria.idle()
+                idle()
+                continue
+            perfil.start(ETAPA_AMOSTRAS)
+            for i in range(n):
+                sinais.add_sample(red_lote[i], ir_lote[i], tempos_lote[i])
+            perfil.stop(ETAPA_AMOSTRAS)
+        else:
+            if MODO_INTERRUPCAO:
+                # A FIFO é lida pela interrupção; dorme até haver novas leituras
+                if not sensor.data_ready():
+                    memoria.idle()
+                    idle()
+                    continue
+            else:
+                # O método check() precisa ser continuamente sondado para verificar se há novas leituras na fila FIFO do sensor.
+                perfil.start(ETAPA_SENSOR)
+                sensor.check()
+                perfil.stop(ETAPA_SENSOR)
+
+            # Idade da amostra mais antiga ainda não processada
+            atraso_ms = None
+            if sensor.available():
+                atraso_ms = ticks_diff(ticks_ms(), sensor.sample_timestamp(sensor.get_storage_sequence()))
+
+            # Consome todas as amostras armazenadas, em lotes
+            perfil.start(ETAPA_AMOSTRAS)
+            while sensor.available():
+                # Acessa o armazenamento e coleta as leituras (inteiros)
+                seq = sensor.get_storage_sequence()
+                n = sensor.read_storage(red_lote, ir_lote)
+
+                # Adiciona as leituras RED e IR aos monitores (frequência
+                # cardíaca e SpO2), com o instante em que cada amostra foi
+                # adquirida pelo sensor
+                for i in range(n):
+                    sinais.add_sample(red_lote[i], ir_lote[i], sensor.sample_timestamp(seq + i))
+            perfil.stop(ETAPA_AMOSTRAS)
+
+            # Medidas de folga a cada leitura nova do sensor
+            if CONTROLE_DE_TAXA and atraso_ms is not None:
+                # Contadores lidos como inteiros, sem criar tuplas
+                controle.record_drain(
+                    sensor.get_batch_count(), atraso_ms,
+                    sensor.dropped_samples + sensor.get_storage_overwritten())
+                if controle.update():
+                    # Novo perfil: os monitores passam a usar a nova taxa
+                    sensor_sample_rate, sensor_fifo_average = controle.profile()
+                    sensor.configure(sample_rate=sensor_sample_rate,
+                                     sample_avg=sensor_fifo_average)
+                    actual_acquisition_rate = controle.rate()
+                    sinais.set_sample_rate(actual_acquisition_rate)
+                    print("Taxa de aquisição: {} Hz\n".format(actual_acquisition_rate))
 
         # Calcula periodicamente a frequência cardíaca a cada hr_compute_interval segundos
-        if ticks_diff(ticks_ms(), ref_time) / 1000 > hr_compute_interval:
+        if ticks_diff(ticks_ms(), ref_time) > intervalo_bpm_ms:
             # Calcula a frequência cardíaca
-            heart_rate = hr_monitor.calculate_heart_rate()
-            if heart_rate is not None:
+            perfil.start(ETAPA_BPM)
+            heart_rate = sinais.calculate_heart_rate()
+            indice_qualidade = qualidade.index()
+            if heart_rate is not None and indice_qualidade < QUALIDADE_MINIMA:
+                perfil.stop(ETAPA_BPM)
+                print("Sinal de baixa qualidade (índice {:.2f}): medida descartada.\n".format(indice_qualidade))
+            elif heart_rate is not None:
                 print("Frequência Cardíaca: {:.0f} BPM".format(heart_rate))
-                bpm_acumulados.append(heart_rate)
-                numero_de_medidas += 1
 
-                # Calcula a média dos BPMs
-                media_bpm = sum(bpm_acumulados) / len(bpm_acumulados)
+                # Média dos batimentos da janela (sem batimentos na janela,
+                # vale o valor atual, que cobre os últimos intervalos R-R)
+                media_bpm = janela.mean_heart_rate() or heart_rate
                 print("Média de BPM nos últimos {} segundos: {:.0f} BPM".format(hr_compute_interval, media_bpm))
-
-                # Envia os dados para o servidor
-                # Destaque: Mude o endereço IP abaixo para o IP do seu servidor Flask
-                server_ip = "172.20.10.3"  # Alterar para o IP do servidor
-                server_port = 5000
-                url = f"http://{server_ip}:{server_port}/add"
-
-                # Prepara o JSON a ser enviado
-                dados_para_enviar = {
-                    "batimentos": media_bpm,
-                    "oximetria": 95.0,  # Substitua pelo valor real de oximetria, se disponível
-                    "status": "Normal" if 50 <= media_bpm <= 100 else "Alerta"
-                }
-
-                try:
-                    resposta = urequests.put(url, json=dados_para_enviar)
-                    if resposta.status_code == 200:
-                        print("Dados enviados com sucesso!\n")
-                    else:
-                        print(f"Falha ao enviar dados: {resposta.text}\n")
-                except Exception as e:
-                    print(f"Erro ao conectar com o servidor: {e}\n")
-
-                # Reseta as variáveis de acumulação
-                bpm_acumulados = []
-                numero_de_medidas = 0
+                rmssd = janela.rmssd()
+                if rmssd is not None:
+                    print("RMSSD: {:.0f} ms, SDNN: {:.0f} ms".format(rmssd, janela.sdnn() or 0))
+
+                # Saturação de oxigênio pela razão das razões (RED/IR)
+                spo2 = sinais.calculate_spo2()
+                if spo2 is not None:
+                    print("SpO2: {:.1f} %".format(spo2))
+
+                # Amostras perdidas desde o início (FIFO do sensor e armazenamento do driver)
+                amostras_perdidas, estouros_fifo = sensor.get_overflow_stats()
+                heap_livre, heap_usado, fragmentacao = memoria.heap()
+
+                # Atualiza o JSON a ser enviado
+                dados_para_enviar["instante"] = time()
+                dados_para_enviar["batimentos"] = media_bpm
+                # None (null) até que alguns batimentos tenham sido medidos
+                dados_para_enviar["oximetria"] = arredonda(spo2)
+                dados_para_enviar["status"] = "Normal" if 50 <= media_bpm <= 100 else "Alerta"
+                dados_para_enviar["qualidade"] = round(indice_qualidade, 2)
+                dados_para_enviar["taxa_aquisicao"] = actual_acquisition_rate
+                # Variabilidade e extremos da janela, média da sessão
+                dados_para_enviar["rmssd"] = arredonda(rmssd)
+                dados_para_enviar["sdnn"] = arredonda(janela.sdnn())
+                dados_para_enviar["bpm_min"] = arredonda(janela.min_heart_rate())
+                dados_para_enviar["bpm_max"] = arredonda(janela.max_heart_rate())
+                dados_para_enviar["bpm_medio_sessao"] = arredonda(sessao.mean_heart_rate())
+                dados_para_enviar["amostras_perdidas"] = amostras_perdidas
+                dados_para_enviar["estouros_fifo"] = estouros_fifo
+                dados_para_enviar["amostras_sobrescritas"] = (
+                    aquisicao.get_overwritten() if aquisicao is not None
+                    else sensor.get_storage_overwritten())
+                # Medidas ainda não enviadas e descartadas com a flash cheia
+                dados_para_enviar["medidas_pendentes"] = len(pendentes)
+                dados_para_enviar["medidas_descartadas"] = pendentes.evicted
+                # Heap (None fora do MicroPython) e coletas de lixo
+                dados_para_enviar["heap_livre"] = heap_livre
+                dados_para_enviar["heap_usado"] = heap_usado
+                dados_para_enviar["fragmentacao_heap"] = arredonda(fragmentacao, 3)
+                dados_para_enviar["gc_coletas"] = memoria.collections
+                dados_para_enviar["gc_pausa_max_us"] = memoria.pause_us_max
+                dados_para_enviar["gc_pausa_total_us"] = memoria.pause_us_total
+                perfil.stop(ETAPA_BPM)
+                # Tempos das etapas desde a última medida (None se desligado)
+                dados_para_enviar["perfil"] = perfil.summary()
+                if PERFIL_NO_CONSOLE:
+                    perfil.dump()
+                perfil.reset()
+
+                # Guarda a medida na flash; o envio é feito em lotes, abaixo
+                pendentes.append(dados_para_enviar)
             else:
+                perfil.stop(ETAPA_BPM)
                 print("Não há dados suficientes para calcular a frequência cardíaca.\n")
             
-            # Reseta o tempo de referência
+            # Reseta o tempo de referência e as estatísticas da janela
             ref_time = ticks_ms()
+            janela.reset()
+            qualidade.reset()
+
+        # Envia as medidas guardadas, em lotes com intervalo mínimo; sem
+        # servidor, as tentativas ficam cada vez mais espaçadas
+        if pendentes.wait_ms() == 0:
+            perfil.start(ETAPA_ENVIO)
+            try:
+                status = pendentes.flush(uplink, "/add")
+                if 200 <= status < 300:
+                    print("Dados enviados com sucesso!\n")
+                else:
+                    print(f"Falha ao enviar dados: HTTP {status}\n")
+            except Exception as e:
+                print(f"Erro ao conectar com o servidor: {e} ({len(pendentes)} medidas guardadas)\n")
+            perfil.stop(ETAPA_ENVIO)
+
+            # O envio deixa lixo (strings, socket): coleta agora, enquanto
+            # as amostras esperam no armazenamento do driver
+            perfil.start(ETAPA_GC)
+            memoria.collect()
+            perfil.stop(ETAPA_GC)
 
 
 if __name__ == "__main__":
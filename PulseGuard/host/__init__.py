@@ -0,0 +1,220 @@
+# Host-side (CPython) environment for the PulseGuard firmware.
+#
+# Runs the max30102 driver, the pulseguard modules and the main scripts
+# unchanged on a PC: shims for the MicroPython modules (machine, utime,
+# micropython, network, urequests, ...) live in host/shims and talk to the
+# Environment below, which owns the simulated clock, the I2C bus, the GPIO
+# pins, the micropython.schedule() queue and an in-memory HTTP server.
+#
+# Typical use:
+#
+#     import host
+#     env = host.install()              # shims first on sys.path
+#     sensor = env.add_max30102(bpm=72)  # emulated sensor on the bus
+#     from max30102 import MAX30102     # imports the shims
+#
+# or run a main script with "python -m host.run codigo_principal.py".
+
+import os
+import sys
+
+from host.bus import I2CBus
+from host.clock import VirtualClock
+from host.emulator import MAX30102Emulator
+from host.ppg import PPGSignal
+
+SHIMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shims')
+FIRMWARE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pin.irq trigger values of the rp2 port
+IRQ_FALLING = 4
+IRQ_RISING = 8
+
+
+class PinState(object):
+    # Electrical state of a GPIO, shared by every machine.Pin on the same id
+    def __init__(self, env, pin_id):
+        self.env = env
+        self.id = pin_id
+        self.level = 0
+        self.driven = False
+        self.handler = None
+        self.trigger = 0
+        self.pin = None
+
+    def drive(self, level):
+        # Level imposed by the outside world (a sensor output)
+        self.driven = True
+        self.set_level(level)
+
+    def set_level(self, level):
+        level = 1 if level else 0
+        previous = self.level
+        self.level = level
+        if self.handler is None or previous == level:
+            return
+        if (level == 0 and self.trigger & IRQ_FALLING) or \
+                (level == 1 and self.trigger & IRQ_RISING):
+            # Hard IRQ: runs right away, like on the board
+            self.handler(self.pin)
+
+
+class PIRSensor(object):
+    # HC-SR501 output: high during the (start_s, end_s) periods of simulated
+    # time (retriggering mode: the output stays high while there is motion)
+    def __init__(self, clock, pin_state, periods):
+        self.clock = clock
+        self.pin = pin_state
+        self.periods = periods
+        self.pin.drive(0)
+
+    def update(self):
+        now_s = self.clock.now_us() / 1000000
+        level = any(start <= now_s < end for start, end in self.periods)
+        if level != self.pin.level:
+            self.pin.drive(level)
+
+
+class HTTPResponse(object):
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode()
+
+    def json(self):
+        import json
+        return json.loads(self.text)
+
+    def close(self):
+        pass
+
+
+class FakeServer(object):
+    # In-memory stand-in for the Flask server of server.py. Blocking requests
+    # (urequests) hold the caller for latency_ms of simulated time, while
+    # interrupts still run; connections opened through the socket-level shims
+    # answer after the same latency without blocking. With keep_alive_s set,
+    # idle keep-alive connections are dropped after that many seconds. The
+    # server cannot be reached while offline or during an outage, given as
+    # (start_s, end_s) periods of simulated time.
+    def __init__(self, env):
+        self.env = env
+        self.online = True
+        self.outages = []
+        self.latency_ms = 30
+        self.keep_alive_s = None
+        self.requests = []
+        self.connections = 0
+
+    def reachable(self):
+        if not self.online:
+            return False
+        now_s = self.env.clock.now_us() / 1000000
+        return not any(start <= now_s < end for start, end in self.outages)
+
+    def dispatch(self, method, url, payload):
+        self.requests.append((method, url, payload))
+        return HTTPResponse(200, 'Dados recebidos')
+
+    def handle(self, method, url, payload):
+        self.env.sleep_us(self.latency_ms * 1000)
+        if not self.reachable():
+            raise OSError(113, 'EHOSTUNREACH')
+        return self.dispatch(method, url, payload)
+
+    def connect(self):
+        # New TCP connection (the caller accounts for the connect time)
+        from host.http import ServerConnection
+        if not self.reachable():
+            raise OSError(113, 'EHOSTUNREACH')
+        self.connections += 1
+        return ServerConnection(self)
+
+
+class Environment(object):
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else VirtualClock()
+        self.bus = I2CBus(self.clock, on_transfer=self.run_scheduled)
+        self.pins = {}
+        self.devices = []
+        self.server = FakeServer(self)
+        self.wlan_connected = False
+        self._scheduled = []
+        self._in_scheduler = False
+
+    def pin(self, pin_id):
+        state = self.pins.get(pin_id)
+        if state is None:
+            state = self.pins[pin_id] = PinState(self, pin_id)
+        return state
+
+    def add_max30102(self, signal=None, int_pin=None, address=0x57, **kwargs):
+        # Attach an emulated sensor; kwargs configure the PPGSignal
+        if signal is None:
+            signal = PPGSignal(**kwargs)
+        sensor = MAX30102Emulator(self.clock, signal)
+        self.bus.attach(address, sensor)
+        self.devices.append(sensor)
+        if int_pin is not None:
+            sensor.attach_int_pin(self.pin(int_pin))
+        return sensor
+
+    def add_pir(self, pin_id, periods):
+        # Attach an emulated PIR sensor whose output is high during periods
+        sensor = PIRSensor(self.clock, self.pin(pin_id), periods)
+        self.devices.append(sensor)
+        return sensor
+
+    # micropython.schedule() queue: callbacks run at the next safe point
+    # (bus transaction, sleep, idle), never nested
+    def schedule(self, func, arg):
+        if len(self._scheduled) >= 8:
+            raise RuntimeError('schedule queue full')
+        self._scheduled.append((func, arg))
+
+    def run_scheduled(self):
+        if self._in_scheduler:
+            return
+        self._in_scheduler = True
+        try:
+            while self._scheduled:
+                func, arg = self._scheduled.pop(0)
+                func(arg)
+        finally:
+            self._in_scheduler = False
+
+    def poll(self):
+        # Let the devices catch up with the clock (and raise interrupts)
+        for device in self.devices:
+            device.update()
+        self.run_scheduled()
+
+    def sleep_us(self, us, step_us=1000):
+        # Sleep in small steps so that interrupts fire on time
+        while us > 0:
+            step = step_us if us > step_us else us
+            self.clock.advance_us(step)
+            us -= step
+            self.poll()
+
+
+_environment = None
+
+
+def environment():
+    global _environment
+    if _environment is None:
+        _environment = Environment()
+    return _environment
+
+
+def install(env=None):
+    # Make the shims and the firmware importable and select the environment
+    global _environment
+    if env is not None:
+        _environment = env
+    for path in (FIRMWARE_PATH, SHIMS_PATH):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+    return environment()
@@ -0,0 +1,116 @@
+# Emulated I2C bus with transaction accounting.
+#
+# Implements the machine.I2C / machine.SoftI2C methods used by the driver.
+# Devices are objects exposing write(data) and read(n_bytes), where the first
+# byte of a write sets the register pointer (MAX3010x protocol). Every
+# transaction is counted and charged to the clock at the bus bit rate.
+
+import errno
+
+# Bits per byte on the wire (8 data bits + ACK)
+BITS_PER_BYTE = 9
+# START + address byte + STOP, in bits
+FRAME_BITS = 2 + BITS_PER_BYTE
+
+
+class BusStats(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.busy_us = 0.0
+
+    def as_dict(self):
+        return {
+            'transactions': self.transactions,
+            'bytes_written': self.bytes_written,
+            'bytes_read': self.bytes_read,
+            'busy_us': round(self.busy_us, 1),
+        }
+
+
+class I2CBus(object):
+    def __init__(self, clock, on_transfer=None):
+        self.clock = clock
+        self.devices = {}
+        self.stats = BusStats()
+        # Called after each transaction (used to run scheduled callbacks)
+        self.on_transfer = on_transfer
+
+    def attach(self, address, device):
+        self.devices[address] = device
+
+    def _device(self, address):
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise OSError(errno.ENODEV)
+
+    def _charge(self, freq, frames, n_written, n_read):
+        stats = self.stats
+        stats.transactions += 1
+        stats.bytes_written += n_written
+        stats.bytes_read += n_read
+        bits = frames * FRAME_BITS + (n_written + n_read) * BITS_PER_BYTE
+        busy_us = bits * 1000000.0 / freq
+        stats.busy_us += busy_us
+        self.clock.advance_us(busy_us)
+        if self.on_transfer is not None:
+            self.on_transfer()
+
+    def write(self, freq, address, data):
+        device = self._device(address)
+        device.write(bytes(data))
+        self._charge(freq, 1, len(data), 0)
+
+    def read(self, freq, address, n_bytes):
+        device = self._device(address)
+        data = device.read(n_bytes)
+        self._charge(freq, 1, 0, n_bytes)
+        return data
+
+    def read_mem(self, freq, address, register, n_bytes):
+        # Register write followed by a repeated START and a read
+        device = self._device(address)
+        device.write(bytes([register]))
+        data = device.read(n_bytes)
+        self._charge(freq, 2, 1, n_bytes)
+        return data
+
+    def write_mem(self, freq, address, register, data):
+        device = self._device(address)
+        device.write(bytes([register]) + bytes(data))
+        self._charge(freq, 1, 1 + len(data), 0)
+
+
+class I2CPort(object):
+    # What machine.SoftI2C(...) returns: a view on the shared bus running at
+    # its own frequency
+    def __init__(self, bus, freq=400000):
+        self.bus = bus
+        self.freq = freq
+
+    def scan(self):
+        return sorted(self.bus.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        self.bus.write(self.freq, addr, buf)
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self.bus.read(self.freq, addr, nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.bus.read(self.freq, addr, len(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        return self.bus.read_mem(self.freq, addr, memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.bus.read_mem(self.freq, addr, memaddr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self.bus.write_mem(self.freq, addr, memaddr, buf)
@@ -0,0 +1,63 @@
+# Simulated time base shared by the host shims (utime, machine) and by the
+# emulated devices.
+#
+# In virtual mode time only moves when the program sleeps, idles or uses the
+# I2C bus, which makes runs deterministic and much faster than real time.
+# In real-time mode the clock follows time.monotonic().
+
+import threading
+import time
+
+# MicroPython ticks wrap at 2**30 on every port
+TICKS_PERIOD = 1 << 30
+TICKS_MASK = TICKS_PERIOD - 1
+
+
+class SimulationEnd(KeyboardInterrupt):
+    # Raised when the clock reaches the configured duration. It derives from
+    # KeyboardInterrupt so that it stops the main loops like Ctrl+C does.
+    pass
+
+
+class VirtualClock(object):
+    def __init__(self, realtime=False, duration_s=None):
+        self.realtime = realtime
+        self._start = time.monotonic()
+        self._us = 0
+        self.deadline_us = None
+        if duration_s is not None:
+            self.deadline_us = int(duration_s * 1000000)
+
+    def now_us(self):
+        if self.realtime:
+            return int((time.monotonic() - self._start) * 1000000)
+        return self._us
+
+    def advance_us(self, us):
+        if us > 0:
+            if self.realtime:
+                time.sleep(us / 1000000)
+            else:
+                self._us += int(us)
+        if self.deadline_us is not None and self.now_us() >= self.deadline_us \
+                and threading.current_thread() is threading.main_thread():
+            # Raised once, in the main program (not in an acquisition
+            # thread): cleanup code may still use the clock afterwards
+            self.deadline_us = None
+            raise SimulationEnd()
+
+    def ticks_us(self):
+        return self.now_us() & TICKS_MASK
+
+    def ticks_ms(self):
+        return (self.now_us() // 1000) & TICKS_MASK
+
+
+def ticks_diff(ticks1, ticks2):
+    # Signed difference of two wrapping tick values (MicroPython semantics)
+    half = TICKS_PERIOD // 2
+    return ((ticks1 - ticks2 + half) & TICKS_MASK) - half
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MASK
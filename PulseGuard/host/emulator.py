@@ -0,0 +1,294 @@
+# Register-level model of the Maxim MAX30102 for host-side runs.
+#
+# Models what the driver relies on: the 32-sample FIFO with its write/read
+# pointers, overflow counter and rollover, register auto-increment (which
+# stops at FIFO_DATA), the interrupt status/enable registers and the
+# active-low INT line, soft reset, shutdown, part/revision ID and the die
+# temperature conversion. Samples are produced from a PPGSignal at the rate
+# configured in SPO2_CONFIG / FIFO_CONFIG, lazily, whenever the model is
+# accessed or polled.
+#
+# Accesses are serialized by a lock, so that the model can be shared by
+# threads (e.g. the dual-core acquisition running on a host thread while
+# the main thread polls the environment).
+
+import threading
+
+from host.ppg import PPGSignal
+
+REG_INT_STAT_1 = 0x00
+REG_INT_STAT_2 = 0x01
+REG_INT_ENABLE_1 = 0x02
+REG_INT_ENABLE_2 = 0x03
+REG_FIFO_WR_PTR = 0x04
+REG_OVF_COUNTER = 0x05
+REG_FIFO_RD_PTR = 0x06
+REG_FIFO_DATA = 0x07
+REG_FIFO_CONFIG = 0x08
+REG_MODE_CONFIG = 0x09
+REG_SPO2_CONFIG = 0x0A
+REG_LED1_PA = 0x0C
+REG_LED2_PA = 0x0D
+REG_LED3_PA = 0x0E
+REG_MULTI_LED_1 = 0x11
+REG_MULTI_LED_2 = 0x12
+REG_TEMP_INT = 0x1F
+REG_TEMP_FRAC = 0x20
+REG_TEMP_CONFIG = 0x21
+REG_REVISION_ID = 0xFE
+REG_PART_ID = 0xFF
+
+INT_A_FULL = 0x80
+INT_PPG_RDY = 0x40
+INT_ALC_OVF = 0x20
+INT_PROX = 0x10
+INT_PWR_RDY = 0x01
+INT_DIE_TEMP_RDY = 0x02
+
+FIFO_DEPTH = 32
+SAMPLE_RATES = (50, 100, 200, 400, 800, 1000, 1600, 3200)
+SAMPLE_AVERAGES = (1, 2, 4, 8, 16, 32, 32, 32)
+# ADC resolution (bits) per pulse width setting (69, 118, 215, 411us)
+RESOLUTIONS = (15, 16, 17, 18)
+ADC_RANGES = (2048, 4096, 8192, 16384)
+
+# Slot device codes (multi-LED mode)
+SLOT_RED = 1
+SLOT_IR = 2
+SLOT_GREEN = 3
+
+
+class MAX30102Emulator(object):
+    def __init__(self, clock, signal=None, part_id=0x15, revision_id=0x03,
+                 temperature=31.25):
+        self.clock = clock
+        self.signal = signal if signal is not None else PPGSignal()
+        self.part_id = part_id
+        self.revision_id = revision_id
+        self.temperature = temperature
+        # Pin state driven by the INT output (see attach_int_pin())
+        self.int_pin = None
+        self.regs = bytearray(256)
+        self._pointer = 0
+        self.samples_generated = 0
+        self._lock = threading.RLock()
+        self.reset()
+
+    # Power-on / soft reset state
+    def reset(self):
+        regs = self.regs
+        for i in range(len(regs)):
+            regs[i] = 0
+        regs[REG_INT_STAT_1] = INT_PWR_RDY
+        regs[REG_REVISION_ID] = self.revision_id
+        regs[REG_PART_ID] = self.part_id
+        self._fifo = [None] * FIFO_DEPTH
+        self._count = 0
+        self._byte_index = 0
+        self._last_sample_us = self.clock.now_us()
+        self._update_int_pin()
+
+    def attach_int_pin(self, pin_state):
+        self.int_pin = pin_state
+        self._update_int_pin()
+
+    # Configuration decoded from the registers
+    def sample_rate(self):
+        return SAMPLE_RATES[(self.regs[REG_SPO2_CONFIG] >> 2) & 0x07]
+
+    def sample_average(self):
+        return SAMPLE_AVERAGES[(self.regs[REG_FIFO_CONFIG] >> 5) & 0x07]
+
+    def acquisition_frequency(self):
+        return self.sample_rate() / self.sample_average()
+
+    def resolution(self):
+        return RESOLUTIONS[self.regs[REG_SPO2_CONFIG] & 0x03]
+
+    def adc_range(self):
+        return ADC_RANGES[(self.regs[REG_SPO2_CONFIG] >> 5) & 0x03]
+
+    def rollover(self):
+        return bool(self.regs[REG_FIFO_CONFIG] & 0x10)
+
+    def shutdown(self):
+        return bool(self.regs[REG_MODE_CONFIG] & 0x80)
+
+    def channels(self):
+        # LEDs stored in each FIFO sample, in order
+        mode = self.regs[REG_MODE_CONFIG] & 0x07
+        if mode == 0x02:
+            return (SLOT_RED,)
+        if mode == 0x03:
+            return (SLOT_RED, SLOT_IR)
+        if mode == 0x07:
+            slots = (self.regs[REG_MULTI_LED_1] & 0x07,
+                     (self.regs[REG_MULTI_LED_1] >> 4) & 0x07,
+                     self.regs[REG_MULTI_LED_2] & 0x07,
+                     (self.regs[REG_MULTI_LED_2] >> 4) & 0x07)
+            return tuple(s for s in slots if SLOT_RED <= s <= SLOT_GREEN)
+        return ()
+
+    def unread_samples(self):
+        return self._count
+
+    # Sample generation
+    def update(self):
+        with self._lock:
+            now = self.clock.now_us()
+            channels = self.channels()
+            if self.shutdown() or not channels:
+                self._last_sample_us = now
+                return
+            period_us = 1000000.0 / self.acquisition_frequency()
+            while self._last_sample_us + period_us <= now:
+                self._last_sample_us += period_us
+                self._push_sample(self._last_sample_us / 1000000.0, channels)
+
+    def _convert(self, level, led_amplitude):
+        # Photodiode level -> ADC code for the current configuration. The
+        # reference level corresponds to a 25.4mA drive (amplitude 0x7F).
+        counts = level * (led_amplitude / 0x7F) * (16384 / self.adc_range())
+        code = int(counts)
+        if code < 0:
+            code = 0
+        elif code > 0x3FFFF:
+            code = 0x3FFFF
+        # Lower resolutions leave the LSBs at zero
+        drop = 18 - self.resolution()
+        return (code >> drop) << drop
+
+    def _push_sample(self, t, channels):
+        red, ir = self.signal.sample(t)
+        data = bytearray()
+        for channel in channels:
+            if channel == SLOT_RED:
+                code = self._convert(red, self.regs[REG_LED1_PA])
+            elif channel == SLOT_IR:
+                code = self._convert(ir, self.regs[REG_LED2_PA])
+            else:
+                code = self._convert(ir * 0.5, self.regs[REG_LED3_PA])
+            data += bytes(((code >> 16) & 0x03, (code >> 8) & 0xFF,
+                           code & 0xFF))
+        self.samples_generated += 1
+
+        regs = self.regs
+        if self._count == FIFO_DEPTH:
+            # FIFO full: the sample is lost, or overwrites the oldest one
+            # when rollover is enabled
+            if regs[REG_OVF_COUNTER] < 0x1F:
+                regs[REG_OVF_COUNTER] += 1
+            if not self.rollover():
+                return
+            regs[REG_FIFO_RD_PTR] = (regs[REG_FIFO_RD_PTR] + 1) % FIFO_DEPTH
+            self._count -= 1
+            self._byte_index = 0
+        self._fifo[regs[REG_FIFO_WR_PTR]] = bytes(data)
+        regs[REG_FIFO_WR_PTR] = (regs[REG_FIFO_WR_PTR] + 1) % FIFO_DEPTH
+        self._count += 1
+
+        status = INT_PPG_RDY
+        empty_slots = regs[REG_FIFO_CONFIG] & 0x0F
+        if self._count >= FIFO_DEPTH - empty_slots:
+            status |= INT_A_FULL
+        regs[REG_INT_STAT_1] |= status
+        self._update_int_pin()
+
+    # INT line
+    def int_asserted(self):
+        regs = self.regs
+        return bool(
+            (regs[REG_INT_STAT_1] & regs[REG_INT_ENABLE_1] & 0xF0)
+            or (regs[REG_INT_STAT_1] & INT_PWR_RDY)
+            or (regs[REG_INT_STAT_2] & regs[REG_INT_ENABLE_2]
+                & INT_DIE_TEMP_RDY))
+
+    def _update_int_pin(self):
+        if self.int_pin is not None:
+            # Open-drain, active-low output pulled up externally
+            self.int_pin.drive(0 if self.int_asserted() else 1)
+
+    # I2C interface (see host.bus)
+    def write(self, data):
+        with self._lock:
+            self.update()
+            self._pointer = data[0]
+            for value in data[1:]:
+                self._write_register(self._pointer, value)
+                if self._pointer != REG_FIFO_DATA:
+                    self._pointer = (self._pointer + 1) & 0xFF
+            self._update_int_pin()
+
+    def read(self, n_bytes):
+        with self._lock:
+            self.update()
+            out = bytearray(n_bytes)
+            for i in range(n_bytes):
+                if self._pointer == REG_FIFO_DATA:
+                    out[i] = self._read_fifo_byte()
+                else:
+                    out[i] = self._read_register(self._pointer)
+                    self._pointer = (self._pointer + 1) & 0xFF
+            self._update_int_pin()
+            return bytes(out)
+
+    def _read_register(self, register):
+        regs = self.regs
+        value = regs[register]
+        if register == REG_INT_STAT_1:
+            # Reading the status register clears the interrupts
+            regs[REG_INT_STAT_1] = 0
+        elif register == REG_INT_STAT_2:
+            regs[REG_INT_STAT_2] = 0
+        elif register == REG_TEMP_FRAC:
+            regs[REG_INT_STAT_2] &= ~INT_DIE_TEMP_RDY & 0xFF
+        return value
+
+    def _read_fifo_byte(self):
+        regs = self.regs
+        if self._count == 0:
+            return 0
+        sample = self._fifo[regs[REG_FIFO_RD_PTR]]
+        value = sample[self._byte_index]
+        self._byte_index += 1
+        if self._byte_index == len(sample):
+            # A whole sample has been read: pop it
+            self._byte_index = 0
+            self._count -= 1
+            regs[REG_FIFO_RD_PTR] = (regs[REG_FIFO_RD_PTR] + 1) % FIFO_DEPTH
+            regs[REG_OVF_COUNTER] = 0
+        return value
+
+    def _write_register(self, register, value):
+        regs = self.regs
+        if register in (REG_INT_STAT_1, REG_INT_STAT_2, REG_REVISION_ID,
+                        REG_PART_ID, REG_TEMP_INT, REG_TEMP_FRAC):
+            # Read-only
+            return
+        if register == REG_MODE_CONFIG and value & 0x40:
+            # Soft reset: completes immediately, the bit self-clears
+            self.reset()
+            return
+        if register == REG_TEMP_CONFIG:
+            if value & 0x01:
+                self._convert_temperature()
+            return
+        if register == REG_FIFO_WR_PTR or register == REG_FIFO_RD_PTR:
+            regs[register] = value & 0x1F
+            self._count = (regs[REG_FIFO_WR_PTR]
+                           - regs[REG_FIFO_RD_PTR]) % FIFO_DEPTH
+            self._byte_index = 0
+            return
+        if register == REG_OVF_COUNTER:
+            regs[register] = value & 0x1F
+            return
+        if register in (REG_FIFO_CONFIG, REG_SPO2_CONFIG, REG_MODE_CONFIG):
+            # Sampling parameters change from now on
+            self._last_sample_us = self.clock.now_us()
+        regs[register] = value
+
+    def _convert_temperature(self):
+        integer = int(self.temperature // 1)
+        self.regs[REG_TEMP_INT] = integer & 0xFF
+        self.regs[REG_TEMP_FRAC] = int((self.temperature - integer) * 16) & 0x0F
+        self.regs[REG_INT_STAT_2] |= INT_DIE_TEMP_RDY
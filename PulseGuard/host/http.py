@@ -0,0 +1,131 @@
+# Server side of a TCP connection to the in-memory HTTP server, used by the
+# socket-level shims (uasyncio streams).
+#
+# Bytes sent by the firmware are parsed into HTTP/1.x requests, which may be
+# pipelined; each response becomes readable latency_ms after the request is
+# complete. The server closes the connection after a response when the
+# request asked for it (or by default on HTTP/1.0), and, like most servers,
+# drops a keep-alive connection left idle for keep_alive_s: the next request
+# written to it is lost and the client reads the end of the stream.
+
+import json
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}
+
+
+def parse_request(buffer):
+    # -> (method, path, headers, body, request_length), or None while the
+    # request is incomplete
+    end = buffer.find(b'\r\n\r\n')
+    if end < 0:
+        return None
+    lines = bytes(buffer[:end]).decode().split('\r\n')
+    method, path, version = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    start = end + 4
+    if len(buffer) < start + length:
+        return None
+    headers[':version'] = version
+    return method, path, headers, bytes(buffer[start:start + length]), \
+        start + length
+
+
+def format_response(response, keep_alive):
+    body = response.content
+    head = 'HTTP/1.1 {0} {1}\r\nContent-Type: text/plain\r\n' \
+           'Content-Length: {2}\r\nConnection: {3}\r\n\r\n'.format(
+               response.status_code,
+               REASONS.get(response.status_code, 'Unknown'), len(body),
+               'keep-alive' if keep_alive else 'close')
+    return head.encode() + body
+
+
+class ServerConnection(object):
+    def __init__(self, server):
+        self.server = server
+        self.clock = server.env.clock
+        self._received = bytearray()
+        # (readable_at_us, bytes), in order
+        self._responses = []
+        self._pending = bytearray()
+        self.closed = False
+        self.requests = 0
+        self._last_us = self.clock.now_us()
+
+    def _expire(self):
+        keep_alive_s = self.server.keep_alive_s
+        if keep_alive_s is not None and not self.closed and \
+                not self._responses and not self._pending and \
+                self.clock.now_us() - self._last_us > keep_alive_s * 1000000:
+            self.closed = True
+
+    def send(self, data):
+        self._expire()
+        if self.closed:
+            if self.server.keep_alive_s is not None:
+                # Closed by the server: the write still succeeds locally
+                return
+            raise OSError(104, 'ECONNRESET')
+        if not self.server.reachable():
+            # Lost on the way: the client waits for an answer that never comes
+            return
+        self._last_us = self.clock.now_us()
+        self._received += data
+        while not self.closed:
+            request = parse_request(self._received)
+            if request is None:
+                break
+            method, path, headers, body, length = request
+            del self._received[:length]
+            self.requests += 1
+            payload = None
+            if body:
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    payload = body
+            response = self.server.dispatch(method, path, payload)
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection == 'keep-alive' or (
+                headers[':version'] == 'HTTP/1.1' and connection != 'close')
+            ready_us = self.clock.now_us() + self.server.latency_ms * 1000
+            if self._responses:
+                # Responses to pipelined requests come back in order
+                ready_us = max(ready_us, self._responses[-1][0])
+            self._responses.append(
+                (ready_us, format_response(response, keep_alive)))
+            if not keep_alive:
+                self.closed = True
+
+    def _collect(self):
+        now = self.clock.now_us()
+        while self._responses and self._responses[0][0] <= now:
+            self._pending += self._responses.pop(0)[1]
+            self._last_us = now
+
+    def readable(self):
+        # True when recv() would not block: data or end of stream
+        self._expire()
+        self._collect()
+        return bool(self._pending) or (self.closed and not self._responses)
+
+    def next_ready_us(self):
+        if self._responses:
+            return self._responses[0][0]
+        return None
+
+    def unread(self, data):
+        # Put back bytes read past what the client needed
+        self._pending[0:0] = data
+
+    def recv(self, n=-1):
+        self._collect()
+        if n < 0 or n > len(self._pending):
+            n = len(self._pending)
+        data = bytes(self._pending[:n])
+        del self._pending[:n]
+        return data
@@ -0,0 +1,118 @@
+# Synthetic photoplethysmogram (PPG) generator for the MAX30102 emulator.
+#
+# Each beat is modelled as a systolic wave plus a smaller dicrotic wave. The
+# arterial pulse absorbs light, so the detected DC level dips on every beat.
+# The red/IR modulation ratio follows the usual empirical calibration
+# SpO2 = 110 - 25 * R, with R = (AC_red / DC_red) / (AC_ir / DC_ir).
+
+import math
+import random
+
+
+class PPGSignal(object):
+    def __init__(self, bpm=72.0, spo2=97.0, noise=0.0, motion=0.0,
+                 perfusion=0.02, dc_ir=120000.0, dc_red=95000.0,
+                 hrv=0.03, respiration=0.25, finger_off=(), seed=0):
+        # bpm, spo2: ground truth of the simulated subject
+        # noise: white noise standard deviation, relative to the IR pulse
+        # motion: motion artifact amplitude, relative to the IR pulse
+        # perfusion: IR pulse amplitude relative to the IR DC level
+        # hrv: standard deviation of the beat-to-beat intervals (relative)
+        # respiration: respiratory rate (Hz) modulating the baseline
+        # finger_off: (start, end) periods (seconds) without a finger
+        self.bpm = bpm
+        self.spo2 = spo2
+        self.noise = noise
+        self.motion = motion
+        self.perfusion = perfusion
+        self.dc_ir = dc_ir
+        self.dc_red = dc_red
+        self.hrv = hrv
+        self.respiration = respiration
+        self.finger = True
+        self.finger_off = finger_off
+        self._random = random.Random(seed)
+        # Beat timeline, extended lazily as time moves forward
+        self.beat_times = [0.0]
+        self._next_beat = self._interval()
+        # Current motion burst: (start, end, frequency, phase)
+        self._motion_burst = None
+        self._next_motion_check = 0.0
+
+    def set_finger(self, present):
+        # Without a finger only ambient light reaches the photodiode
+        self.finger = present
+
+    def _finger_removed(self, t):
+        for start, end in self.finger_off:
+            if start <= t < end:
+                return True
+        return False
+
+    def _interval(self):
+        rr = 60.0 / self.bpm
+        if self.hrv:
+            rr *= 1.0 + self._random.gauss(0.0, self.hrv)
+        return max(rr, 0.25)
+
+    def _beat_phase(self, t):
+        while self._next_beat <= t:
+            self.beat_times.append(self._next_beat)
+            self._next_beat += self._interval()
+        last = self.beat_times[-1]
+        return (t - last) / (self._next_beat - last)
+
+    @staticmethod
+    def _pulse_shape(phase):
+        systolic = math.exp(-((phase - 0.18) / 0.07) ** 2)
+        dicrotic = 0.35 * math.exp(-((phase - 0.48) / 0.09) ** 2)
+        return systolic + dicrotic
+
+    def _motion(self, t):
+        if not self.motion:
+            return 0.0
+        if t >= self._next_motion_check:
+            # Once per second, 10% chance of starting a 1-4 s burst
+            self._next_motion_check = t + 1.0
+            if self._motion_burst is None and self._random.random() < 0.1:
+                self._motion_burst = (t, t + self._random.uniform(1.0, 4.0),
+                                      self._random.uniform(0.5, 3.0),
+                                      self._random.uniform(0.0, 6.28))
+        if self._motion_burst is None:
+            return 0.0
+        start, end, frequency, phase = self._motion_burst
+        if t > end:
+            self._motion_burst = None
+            return 0.0
+        return math.sin(2 * math.pi * frequency * (t - start) + phase)
+
+    def ratio(self):
+        return (110.0 - self.spo2) / 25.0
+
+    def sample(self, t):
+        # Returns the (red, ir) photodiode levels at time t (seconds), in
+        # ADC counts of an 18-bit conversion at the 16384nA range
+        if not self.finger or self._finger_removed(t):
+            ambient = 1500.0 + self._random.gauss(0.0, 40.0)
+            return ambient, ambient
+
+        pulse = self._pulse_shape(self._beat_phase(t))
+        ac_ir = self.dc_ir * self.perfusion
+        ac_red = self.dc_red * self.perfusion * self.ratio()
+        baseline = 0.3 * math.sin(2 * math.pi * self.respiration * t)
+        artifact = self.motion * self._motion(t) * 4.0
+        disturbance = baseline + artifact
+        if self.noise:
+            noise_ir = self._random.gauss(0.0, self.noise)
+            noise_red = self._random.gauss(0.0, self.noise)
+        else:
+            noise_ir = noise_red = 0.0
+
+        ir = self.dc_ir - ac_ir * (pulse - disturbance - noise_ir)
+        red = self.dc_red - ac_red * (pulse - disturbance - noise_red)
+        return red, ir
+
+    def beats_between(self, t0, t1):
+        # Ground-truth beat times in [t0, t1)
+        self._beat_phase(t1)
+        return [b for b in self.beat_times if t0 <= b < t1]
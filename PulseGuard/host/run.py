@@ -0,0 +1,108 @@
+# Runs a PulseGuard main script on the host against an emulated MAX30102.
+#
+#   python -m host.run codigo_principal.py --seconds 120 --bpm 75
+#
+# The script runs unchanged; the run stops after the given (simulated)
+# duration and a summary of the bus traffic and of the uploads is printed.
+# The script runs in a scratch directory standing for the board's flash
+# (--flash keeps it between runs).
+
+import argparse
+import json
+import os
+import runpy
+import sys
+import tempfile
+
+import host
+from host.clock import SimulationEnd, VirtualClock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', help='main script to run')
+    parser.add_argument('--seconds', type=float, default=60.0,
+                        help='simulated duration')
+    parser.add_argument('--realtime', action='store_true',
+                        help='follow the wall clock instead of virtual time')
+    parser.add_argument('--bpm', type=float, default=72.0)
+    parser.add_argument('--spo2', type=float, default=97.0)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--motion', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--finger-off', action='append', default=[],
+                        metavar='START:END',
+                        help='period (seconds) without a finger on the sensor')
+    parser.add_argument('--presence', action='append', default=[],
+                        metavar='START:END',
+                        help='period (seconds) with motion in front of the PIR')
+    parser.add_argument('--pir-pin', type=int, default=20,
+                        help='GPIO wired to the PIR output')
+    parser.add_argument('--int-pin', type=int, default=19,
+                        help='GPIO wired to the sensor INT output')
+    parser.add_argument('--latency-ms', type=int, default=30,
+                        help='time taken by each HTTP request')
+    parser.add_argument('--offline', action='store_true',
+                        help='the server is unreachable')
+    parser.add_argument('--outage', action='append', default=[],
+                        metavar='START:END',
+                        help='period (seconds) when the server is unreachable')
+    parser.add_argument('--keep-alive-s', type=float, default=None,
+                        help='the server drops connections idle this long')
+    parser.add_argument('--flash', default=None,
+                        help='directory used as the board filesystem')
+    args = parser.parse_args(argv)
+
+    env = host.Environment(VirtualClock(args.realtime, args.seconds))
+    host.install(env)
+    env.server.latency_ms = args.latency_ms
+    env.server.online = not args.offline
+    env.server.outages = [tuple(float(t) for t in p.split(':'))
+                          for p in args.outage]
+    env.server.keep_alive_s = args.keep_alive_s
+    sensor = env.add_max30102(int_pin=args.int_pin, bpm=args.bpm,
+                              spo2=args.spo2, noise=args.noise,
+                              motion=args.motion, seed=args.seed,
+                              finger_off=[tuple(float(t) for t in p.split(':'))
+                                          for p in args.finger_off])
+    env.add_pir(args.pir_pin, [tuple(float(t) for t in p.split(':'))
+                               for p in args.presence])
+
+    script = os.path.abspath(args.script)
+    scratch = None
+    flash = args.flash
+    if flash is None:
+        scratch = tempfile.TemporaryDirectory(prefix='pulseguard-flash-')
+        flash = scratch.name
+    os.makedirs(flash, exist_ok=True)
+    os.chdir(flash)
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SimulationEnd:
+        pass
+
+    uploads = []
+    for _, _, payload in env.server.requests:
+        # Batches (JSON arrays) hold several readings
+        if isinstance(payload, list):
+            uploads.extend(payload)
+        else:
+            uploads.append(payload)
+
+    summary = {
+        'simulated_s': env.clock.now_us() / 1000000,
+        'samples_generated': sensor.samples_generated,
+        'i2c': env.bus.stats.as_dict(),
+        'http_connections': env.server.connections,
+        'http_requests': len(env.server.requests),
+        'uploads': uploads,
+    }
+    json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write('\n')
+    if scratch is not None:
+        os.chdir('/')
+        scratch.cleanup()
+
+
+if __name__ == '__main__':
+    main()
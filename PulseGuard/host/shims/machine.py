@@ -0,0 +1,81 @@
+# machine module shim: GPIO, I2C and power management on the host environment
+
+import host
+from host.bus import I2CPort
+
+
+class Pin(object):
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = host.IRQ_FALLING
+    IRQ_RISING = host.IRQ_RISING
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self._state = host.environment().pin(id)
+        self._state.pin = self
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        state = self._state
+        if pull == Pin.PULL_UP and not state.driven:
+            state.level = 1
+        if value is not None:
+            state.set_level(value)
+
+    def value(self, x=None):
+        if x is None:
+            return self._state.level
+        self._state.set_level(x)
+
+    def on(self):
+        self._state.set_level(1)
+
+    def off(self):
+        self._state.set_level(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._state.handler = handler
+        self._state.trigger = trigger if handler is not None else 0
+
+    def __repr__(self):
+        return 'Pin({0})'.format(self._state.id)
+
+
+def SoftI2C(scl=None, sda=None, freq=400000, timeout=50000):
+    return I2CPort(host.environment().bus, freq)
+
+
+def I2C(id=0, scl=None, sda=None, freq=400000):
+    return I2CPort(host.environment().bus, freq)
+
+
+def idle():
+    # Wait for the next interrupt: at most one 1ms system tick
+    host.environment().sleep_us(1000)
+
+
+def lightsleep(time_ms=None):
+    host.environment().sleep_us(1000 * (time_ms or 1))
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def unique_id():
+    return b'\x00\x00\x00\x00\x00\x00\x00\x01'
+
+
+def reset():
+    raise SystemExit('machine.reset()')
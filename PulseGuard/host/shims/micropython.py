@@ -0,0 +1,27 @@
+# micropython module shim
+
+import host
+
+
+def const(expr):
+    return expr
+
+
+def native(func):
+    return func
+
+
+def schedule(func, arg):
+    host.environment().schedule(func, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=None):
+    print('mem_info: not available on the host')
@@ -0,0 +1,31 @@
+# network module shim: a Wi-Fi station that connects instantly
+
+import host
+
+STA_IF = 0
+AP_IF = 1
+
+
+class WLAN(object):
+    def __init__(self, interface_id=STA_IF):
+        self._active = False
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+
+    def connect(self, ssid=None, key=None):
+        host.environment().wlan_connected = True
+
+    def disconnect(self):
+        host.environment().wlan_connected = False
+
+    def isconnected(self):
+        return host.environment().wlan_connected
+
+    def status(self, param=None):
+        return 3 if self.isconnected() else 0
+
+    def ifconfig(self):
+        return ('192.168.0.42', '255.255.255.0', '192.168.0.1', '8.8.8.8')
@@ -0,0 +1,377 @@
+# uasyncio module shim: a small cooperative scheduler on the environment's
+# clock.
+#
+# Covers the part of uasyncio used by the firmware: tasks (create_task, run,
+# gather, current_task, Task.cancel), sleep/sleep_ms, wait_for/wait_for_ms,
+# Event, ThreadSafeFlag, Lock and open_connection() streams connected to the
+# in-memory HTTP server. When every task is waiting, the environment sleeps
+# in small steps, so pin interrupts and micropython.schedule() callbacks
+# keep running and may wake tasks (ThreadSafeFlag.set()).
+
+import heapq
+import traceback
+from collections import deque
+from types import coroutine
+
+import host
+
+# Longest sleep step while idle: the resolution of ThreadSafeFlag wake-ups
+IDLE_STEP_US = 1000
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+@coroutine
+def _suspend(command):
+    # Hand a command to the scheduler: ('sleep', wake_us), ('wait', obj) or
+    # None to yield to the other ready tasks
+    return (yield command)
+
+
+class Task(object):
+    def __init__(self, coro):
+        self.coro = coro
+        self.data = None
+        self.exc = None
+        self.finished = False
+        # Tasks awaiting this one
+        self.waiting = []
+        # 'ready', 'sleep', 'wait', 'running' or 'done'
+        self.state = 'ready'
+        self._blocked_on = None
+        self._sleep_key = None
+        self._cancel_pending = False
+
+    def done(self):
+        return self.finished
+
+    def cancel(self):
+        if self.finished:
+            return False
+        _scheduler.cancel(self)
+        return True
+
+    def __await__(self):
+        if not self.finished:
+            yield ('wait', self)
+        if self.exc is not None:
+            raise self.exc
+        return self.data
+
+
+class _Scheduler(object):
+    def __init__(self):
+        self.ready = deque()
+        self.sleeping = []
+        self.current = None
+        self._order = 0
+
+    def now_us(self):
+        return host.environment().clock.now_us()
+
+    def push(self, task, exc=None):
+        task.state = 'ready'
+        self.ready.append((task, exc))
+
+    def wake(self, task):
+        if task.state == 'wait':
+            task._blocked_on = None
+            self.push(task)
+
+    def cancel(self, task):
+        if task.state == 'sleep':
+            task._sleep_key = None
+            self.push(task, CancelledError())
+        elif task.state == 'wait':
+            task._blocked_on.waiting.remove(task)
+            task._blocked_on = None
+            self.push(task, CancelledError())
+        else:
+            # Ready or running: thrown at its next step
+            task._cancel_pending = True
+
+    def _finish(self, task, data, exc):
+        task.state = 'done'
+        task.finished = True
+        task.data = data
+        task.exc = exc
+        waiting = task.waiting
+        task.waiting = []
+        for other in waiting:
+            self.wake(other)
+        if exc is not None and not waiting and \
+                not isinstance(exc, CancelledError):
+            # Nobody will await it: report like uasyncio's exception handler
+            print('Task exception wasn\'t retrieved')
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+    def step(self, task, exc):
+        if task._cancel_pending and exc is None:
+            exc = CancelledError()
+        task._cancel_pending = False
+        task.state = 'running'
+        self.current = task
+        try:
+            if exc is not None:
+                command = task.coro.throw(exc)
+            else:
+                command = task.coro.send(None)
+        except StopIteration as stop:
+            self._finish(task, stop.value, None)
+            return
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except BaseException as error:
+            self._finish(task, None, error)
+            return
+        finally:
+            self.current = None
+
+        if task._cancel_pending:
+            task._cancel_pending = False
+            self.push(task, CancelledError())
+        elif command is None:
+            self.push(task)
+        elif command[0] == 'sleep':
+            task.state = 'sleep'
+            self._order += 1
+            task._sleep_key = self._order
+            heapq.heappush(self.sleeping, (command[1], self._order, task))
+        elif command[0] == 'wait':
+            task.state = 'wait'
+            task._blocked_on = command[1]
+            command[1].waiting.append(task)
+        else:
+            raise RuntimeError('bad command {0!r}'.format(command))
+
+    def _wake_sleepers(self, now):
+        sleeping = self.sleeping
+        while sleeping and sleeping[0][0] <= now:
+            _, key, task = heapq.heappop(sleeping)
+            if task._sleep_key == key:
+                task._sleep_key = None
+                self.push(task)
+
+    def run_until_complete(self, main):
+        env = host.environment()
+        while not main.finished:
+            env.run_scheduled()
+            if self.ready:
+                task, exc = self.ready.popleft()
+                self.step(task, exc)
+                continue
+            now = env.clock.now_us()
+            self._wake_sleepers(now)
+            if self.ready:
+                continue
+            # Idle: let time pass (interrupts run) until the next wake-up
+            step = IDLE_STEP_US
+            if self.sleeping:
+                step = min(step, max(1, self.sleeping[0][0] - now))
+            env.sleep_us(step)
+        if main.exc is not None:
+            raise main.exc
+        return main.data
+
+
+_scheduler = _Scheduler()
+
+
+def create_task(coro):
+    task = Task(coro)
+    _scheduler.push(task)
+    return task
+
+
+def current_task():
+    return _scheduler.current
+
+
+def run(coro):
+    return _scheduler.run_until_complete(create_task(coro))
+
+
+async def sleep_ms(ms):
+    if ms <= 0:
+        await _suspend(None)
+    else:
+        await _suspend(('sleep', _scheduler.now_us() + int(ms * 1000)))
+
+
+async def sleep(seconds):
+    await sleep_ms(seconds * 1000)
+
+
+async def wait_for(aw, timeout):
+    if timeout is None:
+        return await aw
+    task = aw if isinstance(aw, Task) else create_task(aw)
+    expired = [False]
+
+    async def watchdog():
+        await sleep(timeout)
+        expired[0] = True
+        task.cancel()
+
+    dog = create_task(watchdog())
+    try:
+        return await task
+    except CancelledError:
+        if expired[0]:
+            raise TimeoutError()
+        # The caller was cancelled: so is the awaited task
+        task.cancel()
+        raise
+    finally:
+        dog.cancel()
+
+
+async def wait_for_ms(aw, timeout):
+    return await wait_for(aw, None if timeout is None else timeout / 1000)
+
+
+async def gather(*aws, return_exceptions=False):
+    tasks = [aw if isinstance(aw, Task) else create_task(aw) for aw in aws]
+    results = []
+    for task in tasks:
+        try:
+            results.append(await task)
+        except Exception as error:
+            if not return_exceptions:
+                raise
+            results.append(error)
+    return results
+
+
+class Event(object):
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        waiting = self.waiting
+        self.waiting = []
+        for task in waiting:
+            _scheduler.wake(task)
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await _suspend(('wait', self))
+        return True
+
+
+class ThreadSafeFlag(Event):
+    # Set from IRQ / scheduled context; wait() clears it
+    async def wait(self):
+        if not self.state:
+            await _suspend(('wait', self))
+        self.state = False
+
+
+class Lock(object):
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def locked(self):
+        return self.state
+
+    async def acquire(self):
+        while self.state:
+            await _suspend(('wait', self))
+        self.state = True
+        return True
+
+    def release(self):
+        if not self.state:
+            raise RuntimeError('Lock not acquired')
+        self.state = False
+        if self.waiting:
+            _scheduler.wake(self.waiting.pop(0))
+
+    async def __aenter__(self):
+        return await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class Stream(object):
+    # Client side of a TCP connection; reader and writer are the same object
+    def __init__(self, connection):
+        self.connection = connection
+        self._out = bytearray()
+
+    def write(self, buf):
+        self._out += buf
+
+    async def drain(self):
+        data = bytes(self._out)
+        self._out = bytearray()
+        self.connection.send(data)
+        await _suspend(None)
+
+    async def _wait_readable(self):
+        connection = self.connection
+        while not connection.readable():
+            ready_us = connection.next_ready_us()
+            if ready_us is None:
+                # Nothing outstanding: the server will not send anything
+                await sleep_ms(IDLE_STEP_US / 1000)
+            else:
+                await _suspend(('sleep', ready_us))
+
+    async def read(self, n=-1):
+        await self._wait_readable()
+        return self.connection.recv(n)
+
+    async def readexactly(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = await self.read(n - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    async def readline(self):
+        line = b''
+        while not line.endswith(b'\n'):
+            await self._wait_readable()
+            pending = self.connection.recv()
+            if not pending:
+                break
+            index = pending.find(b'\n')
+            if index >= 0:
+                # Give back what follows the line
+                self.connection.unread(pending[index + 1:])
+                pending = pending[:index + 1]
+            line += pending
+        return line
+
+    def close(self):
+        self.connection.closed = True
+
+    async def wait_closed(self):
+        await _suspend(None)
+
+
+async def open_connection(host_name, port):
+    server = host.environment().server
+    # TCP handshake: one round trip
+    await sleep_ms(server.latency_ms)
+    stream = Stream(server.connect())
+    return stream, stream
@@ -0,0 +1,28 @@
+# urequests module shim: requests are served by the environment's
+# in-memory server (host.FakeServer)
+
+import json as _json
+
+import host
+
+
+def request(method, url, data=None, json=None, headers=None, timeout=None):
+    if json is not None:
+        payload = _json.loads(_json.dumps(json))
+    elif data is not None:
+        payload = data
+    else:
+        payload = None
+    return host.environment().server.handle(method, url, payload)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
@@ -0,0 +1,100 @@
+# usocket module shim: blocking TCP sockets connected to the environment's
+# in-memory HTTP server (host.FakeServer, host.http.ServerConnection).
+#
+# Waiting (connect, reads) sleeps on the simulated clock in small steps, so
+# pin interrupts and micropython.schedule() callbacks keep running while a
+# request is in flight, like on the board. settimeout() bounds each wait;
+# an expired wait raises OSError(ETIMEDOUT), as MicroPython does.
+
+import errno
+
+import host
+
+AF_INET = 2
+SOCK_STREAM = 1
+IPPROTO_TCP = 6
+
+# Longest sleep step while waiting for the server
+WAIT_STEP_US = 1000
+
+
+def getaddrinfo(host_name, port, af=0, type=0, proto=0, flags=0):
+    return [(AF_INET, SOCK_STREAM, IPPROTO_TCP, '', (host_name, port))]
+
+
+class socket(object):
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=IPPROTO_TCP):
+        self._connection = None
+        self._timeout_us = None
+
+    def settimeout(self, value):
+        self._timeout_us = None if value is None else int(value * 1000000)
+
+    def _sleep(self, us, waited_us):
+        # Sleep us, or until the timeout expires (then raise)
+        env = host.environment()
+        if self._timeout_us is not None and waited_us + us > self._timeout_us:
+            env.sleep_us(self._timeout_us - waited_us)
+            raise OSError(errno.ETIMEDOUT, 'ETIMEDOUT')
+        env.sleep_us(us)
+        return waited_us + us
+
+    def connect(self, address):
+        server = host.environment().server
+        # TCP handshake: one round trip
+        self._sleep(server.latency_ms * 1000, 0)
+        self._connection = server.connect()
+
+    def _check(self):
+        if self._connection is None:
+            raise OSError(errno.ENOTCONN, 'ENOTCONN')
+
+    def write(self, data):
+        self._check()
+        self._connection.send(bytes(data))
+        return len(data)
+
+    send = write
+    sendall = write
+
+    def _wait_readable(self):
+        connection = self._connection
+        clock = host.environment().clock
+        waited = 0
+        while not connection.readable():
+            ready_us = connection.next_ready_us()
+            step = WAIT_STEP_US
+            if ready_us is not None:
+                step = max(ready_us - clock.now_us(), 1)
+            waited = self._sleep(step, waited)
+
+    def recv(self, n):
+        self._check()
+        self._wait_readable()
+        return self._connection.recv(n)
+
+    def read(self, n=-1):
+        self._check()
+        self._wait_readable()
+        return self._connection.recv(n)
+
+    def readline(self):
+        self._check()
+        line = b''
+        while not line.endswith(b'\n'):
+            self._wait_readable()
+            pending = self._connection.recv()
+            if not pending:
+                break
+            index = pending.find(b'\n')
+            if index >= 0:
+                # Give back what follows the line
+                self._connection.unread(pending[index + 1:])
+                pending = pending[:index + 1]
+            line += pending
+        return line
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.closed = True
+            self._connection = None
@@ -0,0 +1,32 @@
+# utime module shim backed by the host environment's clock
+
+import host
+from host.clock import ticks_add, ticks_diff  # noqa: F401
+
+
+def ticks_ms():
+    return host.environment().clock.ticks_ms()
+
+
+def ticks_us():
+    return host.environment().clock.ticks_us()
+
+
+def ticks_cpu():
+    return host.environment().clock.ticks_us()
+
+
+def sleep(seconds):
+    host.environment().sleep_us(int(seconds * 1000000))
+
+
+def sleep_ms(ms):
+    host.environment().sleep_us(int(ms * 1000))
+
+
+def sleep_us(us):
+    host.environment().sleep_us(int(us))
+
+
+def time():
+    return host.environment().clock.now_us() // 1000000
@@ -14,11 +14,14 @@
 # This driver aims at giving almost full access to Maxim MAX30102 functionalities.
 #                                                                          n-elia
 
-from machine import SoftI2C
-from ustruct import unpack
-from utime import sleep_ms, ticks_diff, ticks_ms
+from array import array
+
+import micropython
+from machine import Pin, SoftI2C
+from utime import sleep_ms, ticks_add, ticks_diff, ticks_ms, ticks_us
 
 from max30102.circular_buffer import CircularBuffer
+from max30102.kernels import decode_channel
 
 # I2C address (7-bit address)
 MAX3010X_I2C_ADDRESS = 0x57  # Right-shift of 0xAE, 0xAF
@@ -152,16 +155,34 @@ SLOT_GREEN_PILOT = 0x07
 
 MAX_30105_EXPECTED_PART_ID = 0x15
 
-# Size of the queued readings
-STORAGE_QUEUE_SIZE = 4
+# Configuration registers mirrored by the driver's shadow copy, grouped in
+# runs of contiguous addresses that can be written with a single transaction
+# (register addresses auto-increment, but must not cross the FIFO registers
+# nor the reserved ones)
+SHADOW_REGISTER_RUNS = (
+    (MAX30105_INT_ENABLE_1, MAX30105_INT_ENABLE_2),
+    (MAX30105_FIFO_CONFIG, MAX30105_PARTICLE_CONFIG),
+    (MAX30105_LED1_PULSE_AMP, MAX30105_LED3_PULSE_AMP),
+    (MAX30105_LED_PROX_AMP, MAX30105_MULTI_LED_CONFIG_2),
+)
+
+# Depth of the sensor's FIFO (datasheet pag. 15)
+MAX30105_FIFO_DEPTH = 32
+# Highest value of OVF_COUNTER: the counter saturates there
+MAX30105_OVF_COUNTER_MAX = 0x1F
+# Max bytes per FIFO sample (3 bytes per active LED, up to 3 LEDs)
+MAX30105_MAX_SAMPLE_BYTES = 9
+
+# Size of the queued readings: a whole FIFO burst must fit in the queue
+STORAGE_QUEUE_SIZE = MAX30105_FIFO_DEPTH
 
 
 # Data structure to hold the last readings
 class SensorData:
-    def __init__(self):
-        self.red = CircularBuffer(STORAGE_QUEUE_SIZE)
-        self.IR = CircularBuffer(STORAGE_QUEUE_SIZE)
-        self.green = CircularBuffer(STORAGE_QUEUE_SIZE)
+    def __init__(self, size=STORAGE_QUEUE_SIZE):
+        self.red = CircularBuffer(size)
+        self.IR = CircularBuffer(size)
+        self.green = CircularBuffer(size)
 
 
 # Sensor class
@@ -169,6 +190,7 @@ class MAX30102(object):
     def __init__(self,
                  i2c: SoftI2C,
                  i2c_hex_address=MAX3010X_I2C_ADDRESS,
+                 storage_size=STORAGE_QUEUE_SIZE,
                  ):
         self.i2c_address = i2c_hex_address
         self._i2c = i2c
@@ -180,8 +202,62 @@ class MAX30102(object):
         self._sample_avg = None
         self._acq_frequency = None
         self._acq_frequency_inv = None
-        # Circular buffer of readings from the sensor
-        self.sense = SensorData()
+        self._acq_period_us = None
+        # Shadow copy of the configuration registers (see sync_shadow()) and
+        # bitmask of the registers modified inside a configuration transaction
+        self._shadow = {}
+        self._in_transaction = False
+        self._dirty = 0
+        # Circular buffer of readings from the sensor: make it larger than
+        # the FIFO when the consumer may fall behind for a while
+        self.sense = SensorData(storage_size)
+        # Preallocated buffer able to hold the whole FIFO, so that it can be
+        # drained with a single I2C transaction
+        self._fifo_buffer = bytearray(
+            MAX30105_FIFO_DEPTH * MAX30105_MAX_SAMPLE_BYTES)
+        self._fifo_view = memoryview(self._fifo_buffer)
+        # Views of the FIFO buffer indexed by number of samples, rebuilt when
+        # the sample size changes (see set_led_mode())
+        self._fifo_views = None
+        # Buffer for the FIFO_WR_PTR, OVF_COUNTER and FIFO_RD_PTR registers
+        self._pointers_buffer = bytearray(3)
+        # FIFO overflow accounting (see drain()): estimated losses, drains
+        # that found the FIFO overflowed, sum of OVF_COUNTER (a lower bound)
+        # and tick of the last drain, when the FIFO was left empty
+        self.dropped_samples = 0
+        self.overrun_events = 0
+        self.counted_overflows = 0
+        self._drain_tick = ticks_ms()
+        # Acquisition clock: sequence number of the next sample taken by the
+        # sensor, and sequence/tick of the last sample of the last batch
+        self._sample_seq = 0
+        self._batch_seq = 0
+        self._batch_count = 0
+        self._batch_tick = ticks_ms()
+        # Sequence number, tick and period (us) of the last sample taken
+        # before the last change of acquisition rate (see configure())
+        self._rate_change_seq = -1
+        self._rate_change_tick = 0
+        self._rate_change_period_us = 0
+        # Interrupt-driven acquisition state (see
+        # enable_interrupt_acquisition())
+        self._int_buffer = bytearray(1)
+        self._irq_pending = False
+        self._data_ready = False
+        self._on_data = None
+        self._on_drain = None
+        self._scheduled_drain_ref = self._scheduled_drain
+        # Set while the main program modifies the storage: a scheduled drain
+        # would corrupt it, so it is deferred until the storage is released
+        self._storage_busy = False
+        self._drain_deferred = False
+        # Preallocated storage for the decoded samples of a burst, one array
+        # per channel, so that decoding does not allocate on the heap
+        self._red_batch = array('i', [0] * MAX30105_FIFO_DEPTH)
+        self._ir_batch = array('i', [0] * MAX30105_FIFO_DEPTH)
+        self._green_batch = array('i', [0] * MAX30105_FIFO_DEPTH)
+        # Channel offset, sample size and shift passed to decode_channel()
+        self._decode_params = array('i', [0, 0, 0])
 
     # Sensor setup method
     def setup_sensor(self, led_mode=2, adc_range=16384, sample_rate=400,
@@ -190,34 +266,77 @@ class MAX30102(object):
         # Reset the sensor's registers from previous configurations
         self.soft_reset()
 
-        # Set the number of samples to be averaged by the chip to 8
-        self.set_fifo_average(sample_avg)
-
-        # Allow FIFO queues to wrap/roll over
-        self.enable_fifo_rollover()
-
-        # Set the LED mode to the default value of 2 (RED + IR)
-        # Note: the 3rd mode is available only with MAX30105
-        self.set_led_mode(led_mode)
-
-        # Set the ADC range to default value of 16384
-        self.set_adc_range(adc_range)
-
-        # Set the sample rate to the default value of 400
-        self.set_sample_rate(sample_rate)
-
-        # Set the Pulse Width to the default value of 411
-        self.set_pulse_width(pulse_width)
-
-        # Set the LED brightness to the default value of 'low'
-        self.set_pulse_amplitude_red(led_power)
-        self.set_pulse_amplitude_it(led_power)
-        self.set_pulse_amplitude_green(led_power)
-        self.set_pulse_amplitude_proximity(led_power)
+        # Apply the whole profile with the fewest possible writes: the
+        # defaults are 8 averaged samples, FIFO rollover, RED + IR LEDs
+        # (the 3rd mode is available only with MAX30105), ADC range of
+        # 16384, 400 samples/s, pulse width of 411us and medium brightness
+        self.configure(led_mode=led_mode, adc_range=adc_range,
+                       sample_rate=sample_rate, led_power=led_power,
+                       sample_avg=sample_avg, pulse_width=pulse_width,
+                       fifo_rollover=True, proximity_power=led_power)
 
         # Clears the FIFO
         self.clear_fifo()
 
+    # Applies a configuration profile in a single transaction: arguments
+    # left to None are not modified. When the acquisition rate of a running
+    # sensor changes, the samples taken at the old rate are drained first
+    # and keep timestamps computed with the old period (see
+    # sample_timestamp())
+    def configure(self, led_mode=None, adc_range=None, sample_rate=None,
+                  led_power=None, sample_avg=None, pulse_width=None,
+                  fifo_rollover=None, proximity_power=None):
+        period_us = self._acq_period_us
+        running = (sample_rate is not None or sample_avg is not None) and \
+            period_us is not None and self._fifo_views is not None
+        if running:
+            # No scheduled drain may slip in between
+            self._storage_busy = True
+        try:
+            if running:
+                self.drain()
+            self._configure(led_mode, adc_range, sample_rate, led_power,
+                            sample_avg, pulse_width, fifo_rollover,
+                            proximity_power)
+            if running and self._acq_period_us != period_us:
+                self._rate_change_seq = self._batch_seq + self._batch_count - 1
+                self._rate_change_tick = self._batch_tick
+                self._rate_change_period_us = period_us
+        finally:
+            if running:
+                self._release_storage()
+
+    def _configure(self, led_mode, adc_range, sample_rate, led_power,
+                   sample_avg, pulse_width, fifo_rollover, proximity_power):
+        self.begin_configuration()
+        try:
+            if sample_avg is not None:
+                self.set_fifo_average(sample_avg)
+            if fifo_rollover is not None:
+                if fifo_rollover:
+                    self.enable_fifo_rollover()
+                else:
+                    self.disable_fifo_rollover()
+            if led_mode is not None:
+                self.set_led_mode(led_mode)
+            if adc_range is not None:
+                self.set_adc_range(adc_range)
+            if sample_rate is not None:
+                self.set_sample_rate(sample_rate)
+            if pulse_width is not None:
+                self.set_pulse_width(pulse_width)
+            if led_power is not None:
+                self.set_pulse_amplitude_red(led_power)
+                self.set_pulse_amplitude_it(led_power)
+                self.set_pulse_amplitude_green(led_power)
+            if proximity_power is not None:
+                self.set_pulse_amplitude_proximity(proximity_power)
+        except Exception:
+            # Nothing has been written yet: restore the shadow from the IC
+            self.abort_configuration()
+            raise
+        self.commit_configuration()
+
     def __del__(self):
         self.shutdown()
 
@@ -280,12 +399,19 @@ class MAX30102(object):
         # and data registers are reset to their power-on-state through
         # a power-on reset. The RESET bit is cleared automatically back to zero
         # after the reset sequence is completed. (datasheet pag. 19)
-        self.set_bitmask(MAX30105_MODE_CONFIG, MAX30105_RESET_MASK, MAX30105_RESET)
+        # The shadow copy is bypassed: every register is about to change
+        curr_status = ord(self.i2c_read_register(MAX30105_MODE_CONFIG))
+        self._i2c.writeto(self.i2c_address, bytearray(
+            [MAX30105_MODE_CONFIG,
+             (curr_status & MAX30105_RESET_MASK) | MAX30105_RESET]))
         curr_status = -1
         while not ((curr_status & MAX30105_RESET) == 0):
             sleep_ms(10)
             curr_status = ord(self.i2c_read_register(MAX30105_MODE_CONFIG))
 
+        # Registers are back to their power-on state: re-sync the shadow
+        self.sync_shadow()
+
     # Power states methods
     def shutdown(self):
         # Put IC into low power mode (datasheet pg. 19)
@@ -323,6 +449,8 @@ class MAX30102(object):
         # FIFO buffer in multiLED mode: a sample is made of 3 bytes
         self._active_leds = LED_mode
         self._multi_led_read_mode = LED_mode * 3
+        self._fifo_views = [self._fifo_view[:n * self._multi_led_read_mode]
+                            for n in range(MAX30105_FIFO_DEPTH + 1)]
 
     # ADC Configuration
     def set_adc_range(self, ADC_range):
@@ -457,16 +585,25 @@ class MAX30102(object):
             # Compute the time interval to wait before taking a good measure
             # (see note in setSampleRate() method)
             self._acq_frequency_inv = int(ceil(1000 / self._acq_frequency))
+            # Exact sample period, used to reconstruct sample timestamps
+            self._acq_period_us = int(1000000 / self._acq_frequency)
 
     def get_acquisition_frequency(self):
         return self._acq_frequency
 
+    # Highest value of a reading with the current pulse width: readings at
+    # this value are clipped, the photocurrent exceeds the full scale
+    # selected with set_adc_range()
+    def get_adc_ceiling(self):
+        return 0x3FFFF >> self._pulse_width
+
     def clear_fifo(self):
         # Resets all points to start in a known state
         # Datasheet page 15 recommends clearing FIFO before beginning a read
         self.i2c_set_register(MAX30105_FIFO_WRITE_PTR, 0)
         self.i2c_set_register(MAX30105_FIFO_OVERFLOW, 0)
         self.i2c_set_register(MAX30105_FIFO_READ_PTR, 0)
+        self._drain_tick = ticks_ms()
 
     def enable_fifo_rollover(self):
         # FIFO rollover: enable to allow FIFO tro wrap/roll over
@@ -563,24 +700,101 @@ class MAX30102(object):
         return self._i2c.readfrom(self.i2c_address, n_bytes)
 
     def i2c_set_register(self, REGISTER, VALUE):
+        if REGISTER in self._shadow:
+            if self._shadow[REGISTER] == VALUE:
+                # The register already holds this value
+                return
+            self._shadow[REGISTER] = VALUE
+            if self._in_transaction:
+                # Deferred to commit_configuration()
+                self._dirty |= 1 << REGISTER
+                return
         self._i2c.writeto(self.i2c_address, bytearray([REGISTER, VALUE]))
         return
 
+    # Reads a configuration register, from the shadow copy when available
+    def read_config_register(self, REGISTER):
+        value = self._shadow.get(REGISTER)
+        if value is None:
+            value = ord(self.i2c_read_register(REGISTER))
+        return value
+
     # Given a register, read it, mask it, and then set the thing
     def set_bitmask(self, REGISTER, MASK, NEW_VALUES):
-        newCONTENTS = (ord(self.i2c_read_register(REGISTER)) & MASK) | NEW_VALUES
+        newCONTENTS = (self.read_config_register(REGISTER) & MASK) | NEW_VALUES
         self.i2c_set_register(REGISTER, newCONTENTS)
         return
 
     # Given a register, read it and mask it
     def bitmask(self, reg, slotMask, thing):
-        originalContents = ord(self.i2c_read_register(reg))
+        originalContents = self.read_config_register(reg)
         originalContents = originalContents & slotMask
         self.i2c_set_register(reg, originalContents | thing)
 
-    def fifo_bytes_to_int(self, fifo_bytes):
-        value = unpack(">i", b'\x00' + fifo_bytes)
-        return (value[0] & 0x3FFFF) >> self._pulse_width
+    # Register shadow copy: the configuration registers are read once and
+    # then kept in memory, so that setters don't need a read-modify-write
+    # round-trip on the bus
+    def sync_shadow(self):
+        self._shadow = {}
+        for first, last in SHADOW_REGISTER_RUNS:
+            values = self.i2c_read_register(first, last - first + 1)
+            for i in range(len(values)):
+                self._shadow[first + i] = values[i]
+        self._dirty = 0
+
+    def begin_configuration(self):
+        # Setters called from now on only update the shadow copy
+        if not self._shadow:
+            self.sync_shadow()
+        self._in_transaction = True
+        self._dirty = 0
+
+    def commit_configuration(self):
+        # Write the modified registers, one transaction per contiguous run
+        self._in_transaction = False
+        dirty = self._dirty
+        self._dirty = 0
+        for first, last in SHADOW_REGISTER_RUNS:
+            # Narrow the run down to its first and last modified register
+            while first <= last and not dirty & (1 << first):
+                first += 1
+            while last >= first and not dirty & (1 << last):
+                last -= 1
+            if first > last:
+                continue
+            data = bytearray(last - first + 2)
+            data[0] = first
+            for reg in range(first, last + 1):
+                data[reg - first + 1] = self._shadow[reg]
+            self._i2c.writeto(self.i2c_address, data)
+
+    def abort_configuration(self):
+        self._in_transaction = False
+        self.sync_shadow()
+
+    def fifo_bytes_to_int(self, fifo_bytes, offset=0):
+        # Each channel is a 3-byte big-endian word; only 18 bits are valid
+        value = ((fifo_bytes[offset] << 16) | (fifo_bytes[offset + 1] << 8)
+                 | fifo_bytes[offset + 2])
+        return (value & 0x3FFFF) >> self._pulse_width
+
+    # Decodes a burst of samples from the FIFO buffer into the batch arrays,
+    # one channel at a time (viper-compiled on MicroPython, see kernels.py)
+    def decode_fifo(self, number_of_samples):
+        params = self._decode_params
+        params[1] = self._multi_led_read_mode
+        params[2] = self._pulse_width
+        params[0] = 0
+        decode_channel(self._fifo_view, self._red_batch, number_of_samples,
+                       params)
+        if self._active_leds > 1:
+            params[0] = 3
+            decode_channel(self._fifo_view, self._ir_batch, number_of_samples,
+                           params)
+        if self._active_leds > 2:
+            params[0] = 6
+            decode_channel(self._fifo_view, self._green_batch,
+                           number_of_samples, params)
 
     # Returns how many samples are available
     def available(self):
@@ -618,73 +832,205 @@ class MAX30102(object):
     # methods of the SparkFun library
     # Pops the next red value in storage (if available)
     def pop_red_from_storage(self):
-        if len(self.sense.red) == 0:
-            return 0
-        else:
-            return self.sense.red.pop()
+        return self._pop_from_storage(self.sense.red)
 
     # Pops the next IR value in storage (if available)
     def pop_ir_from_storage(self):
-        if len(self.sense.IR) == 0:
-            return 0
-        else:
-            return self.sense.IR.pop()
+        return self._pop_from_storage(self.sense.IR)
 
     # Pops the next green value in storage (if available)
     def pop_green_from_storage(self):
-        if len(self.sense.green) == 0:
-            return 0
-        else:
-            return self.sense.green.pop()
+        return self._pop_from_storage(self.sense.green)
+
+    def _pop_from_storage(self, channel):
+        self._storage_busy = True
+        try:
+            return channel.pop() if len(channel) else 0
+        finally:
+            self._release_storage()
+
+    # Bulk versions of the above: pop up to len(buf) values into an
+    # array('i') and return how many were copied
+    def read_red_from_storage(self, buf):
+        return self._read_from_storage(self.sense.red, buf)
+
+    def read_ir_from_storage(self, buf):
+        return self._read_from_storage(self.sense.IR, buf)
+
+    def read_green_from_storage(self, buf):
+        return self._read_from_storage(self.sense.green, buf)
+
+    def _read_from_storage(self, channel, buf):
+        self._storage_busy = True
+        try:
+            return channel.readinto(buf)
+        finally:
+            self._release_storage()
+
+    # Pops the same samples from every given channel at once, so that a
+    # drain cannot slip in between; returns how many samples were copied
+    def read_storage(self, red_buf, ir_buf=None, green_buf=None):
+        self._storage_busy = True
+        try:
+            n = self.sense.red.readinto(red_buf)
+            if ir_buf is not None:
+                self.sense.IR.readinto(ir_buf, n)
+            if green_buf is not None:
+                self.sense.green.readinto(green_buf, n)
+        finally:
+            self._release_storage()
+        return n
+
+    def _release_storage(self):
+        # Run the drains deferred while the storage was busy
+        self._storage_busy = False
+        while self._drain_deferred:
+            self._drain_deferred = False
+            self._storage_busy = True
+            try:
+                self.drain_pending()
+            finally:
+                self._storage_busy = False
+
+    # Number of stored readings lost because the consumer fell behind
+    def get_storage_overwritten(self):
+        return self.sense.red.overwritten
+
+    # Sequence number of the next sample popped from storage. If samples
+    # were lost while older ones were still stored, the stored ones are
+    # numbered as if they preceded the newest batch contiguously.
+    def get_storage_sequence(self):
+        self._storage_busy = True
+        try:
+            return self._sample_seq - len(self.sense.red)
+        finally:
+            self._release_storage()
+
+    # Sequence number of the first sample, drain tick and size of the
+    # last drained batch
+    def get_batch_info(self):
+        return self._batch_seq, self._batch_tick, self._batch_count
+
+    # Size of the last drained batch (get_batch_info()[2], without the tuple)
+    def get_batch_count(self):
+        return self._batch_count
+
+    # Acquisition time (ticks_ms) of the sample with the given sequence
+    # number, derived from the last batch timestamp and the sample period;
+    # samples taken before the last change of rate are placed from the
+    # last of them, with their own period
+    def sample_timestamp(self, seq):
+        if seq <= self._rate_change_seq:
+            return ticks_add(self._rate_change_tick,
+                             -((self._rate_change_seq - seq)
+                               * self._rate_change_period_us // 1000))
+        last_seq = self._batch_seq + self._batch_count - 1
+        return ticks_add(self._batch_tick,
+                         -((last_seq - seq) * self._acq_period_us // 1000))
+
+    # Samples lost in the sensor's FIFO and number of drains that found it
+    # overflowed, cumulated since the last reset. The losses are estimated
+    # from the elapsed time when OVF_COUNTER saturated (see drain())
+    def get_overflow_stats(self):
+        return self.dropped_samples, self.overrun_events
+
+    # Samples lost in the FIFO as counted by OVF_COUNTER: a lower bound,
+    # since the counter saturates at 31 per drain
+    def get_counted_overflows(self):
+        return self.counted_overflows
+
+    def reset_overflow_stats(self):
+        self.dropped_samples = 0
+        self.overrun_events = 0
+        self.counted_overflows = 0
 
     # (useless - for comparison purposes only)
     def next_sample(self):
         if self.available():
-            # With respect to the SparkFun library, using a deque object
-            # allows us to avoid manually advancing of the tail
+            # With respect to the SparkFun library, the ring buffer
+            # advances its own tail when popping
             return True
 
     # Polls the sensor for new data
     def check(self):
         # Call continuously to poll the sensor for new data.
-        read_pointer = ord(self.get_read_pointer())
-        write_pointer = ord(self.get_write_pointer())
+        # Returns True if at least one new sample has been stored.
+        self._storage_busy = True
+        try:
+            return self.drain() > 0
+        finally:
+            self._release_storage()
+
+    # Reads every pending sample with a single burst transaction
+    def drain(self):
+        # FIFO_WR_PTR, OVF_COUNTER and FIFO_RD_PTR are contiguous registers:
+        # read them with a single transaction into a preallocated buffer
+        pointers = self._pointers_buffer
+        self._i2c.readfrom_mem_into(self.i2c_address, MAX30105_FIFO_WRITE_PTR,
+                                    pointers)
+        now = ticks_ms()
+        write_pointer = pointers[0]
+        overflow_counter = pointers[1]
+        read_pointer = pointers[2]
+        elapsed_ms = ticks_diff(now, self._drain_tick)
+        self._drain_tick = now
 
         # Do we have new data?
-        if read_pointer != write_pointer:
+        if read_pointer == write_pointer:
+            if not overflow_counter:
+                return 0
+            # Pointers are equal with lost samples: the FIFO is full
+            number_of_samples = MAX30105_FIFO_DEPTH
+        else:
             # Calculate the number of readings we need to get from sensor
             number_of_samples = write_pointer - read_pointer
 
             # Wrap condition (return to the beginning of 32 samples)
             if number_of_samples < 0:
-                number_of_samples += 32
-
-            for i in range(number_of_samples):
-                # Read a number of bytes equal to activeLEDs*3 (= 1 sample)
-                fifo_bytes = self.i2c_read_register(MAX30105_FIFO_DATA,
-                                                    self._multi_led_read_mode)
-
-                # Convert the readings from bytes to integers, depending
-                # on the number of active LEDs
-                if self._active_leds > 0:
-                    self.sense.red.append(
-                        self.fifo_bytes_to_int(fifo_bytes[0:3])
-                    )
-
-                if self._active_leds > 1:
-                    self.sense.IR.append(
-                        self.fifo_bytes_to_int(fifo_bytes[3:6])
-                    )
-
-                if self._active_leds > 2:
-                    self.sense.green.append(
-                        self.fifo_bytes_to_int(fifo_bytes[6:9])
-                    )
-
-                return True
+                number_of_samples += MAX30105_FIFO_DEPTH
+
+        # OVF_COUNTER counts the samples lost because the FIFO was full; it
+        # is cleared when a sample is read (datasheet pag. 16) but saturates
+        # at 0x1F: past that, the loss is estimated as the samples taken
+        # since the last drain, which left the FIFO empty, minus those read
+        if overflow_counter:
+            lost = overflow_counter
+            if overflow_counter == MAX30105_OVF_COUNTER_MAX and \
+                    self._acq_frequency:
+                estimate = (int(elapsed_ms * self._acq_frequency) // 1000
+                            - number_of_samples)
+                if estimate > lost:
+                    lost = estimate
+            self.counted_overflows += overflow_counter
+            self.dropped_samples += lost
+            self.overrun_events += 1
+            # With rollover the oldest samples are the lost ones: keep their
+            # sequence numbers so that the timeline shows the gap
+            self._sample_seq += lost
+
+        # The FIFO_DATA register does not auto-increment: reading
+        # activeLEDs*3*N bytes from it pops N samples in a row
+        self._i2c.readfrom_mem_into(self.i2c_address, MAX30105_FIFO_DATA,
+                                    self._fifo_views[number_of_samples])
+
+        # One timestamp per batch: the newest sample was taken at most one
+        # period ago, the others are spaced by the acquisition period
+        self._batch_tick = now
+        self._batch_seq = self._sample_seq
+        self._batch_count = number_of_samples
+        self._sample_seq += number_of_samples
+
+        # Convert the readings from bytes to integers, depending on the
+        # number of active LEDs, then queue them
+        self.decode_fifo(number_of_samples)
+        if self._active_leds > 0:
+            self.sense.red.extend(self._red_batch, number_of_samples)
+        if self._active_leds > 1:
+            self.sense.IR.extend(self._ir_batch, number_of_samples)
+        if self._active_leds > 2:
+            self.sense.green.extend(self._green_batch, number_of_samples)
 
-        else:
-            return False
+        return number_of_samples
 
     # Check for new data but give up after a certain amount of time
     def safe_check(self, max_time_to_check):
@@ -697,3 +1043,86 @@ class MAX30102(object):
                 # new data found
                 return True
             sleep_ms(1)
+
+    # Interrupt-driven acquisition
+    def enable_interrupt_acquisition(self, int_pin, almost_full=17,
+                                     data_ready=False, on_data=None,
+                                     on_drain=None):
+        # Drain the FIFO from the sensor's INT line instead of polling.
+        # The INT pin is open-drain and active-low: int_pin must be an input
+        # with a pull-up. The A_FULL interrupt fires when 'almost_full'
+        # samples (17 to 32) are waiting in the FIFO; optionally the
+        # PPG_RDY interrupt fires on every new sample.
+        # on_data, if given, is called without arguments (in scheduler
+        # context) whenever a drain stored new samples, e.g. the set() of a
+        # uasyncio.ThreadSafeFlag that wakes the consumer task. on_drain, if
+        # given, is called with the duration (us) of every such drain, e.g.
+        # to profile the acquisition.
+        if not 17 <= almost_full <= MAX30105_FIFO_DEPTH:
+            raise ValueError(
+                'Wrong almost full threshold:{0}!'.format(almost_full))
+        # FIFO_A_FULL holds the number of empty slots left (datasheet pag. 17)
+        self.set_fifo_almost_full(MAX30105_FIFO_DEPTH - almost_full)
+        self.enable_a_full()
+        if data_ready:
+            self.enable_data_rdy()
+        else:
+            self.disable_data_rdy()
+
+        self._irq_pending = False
+        self._data_ready = False
+        self._on_data = on_data
+        self._on_drain = on_drain
+        int_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_handler)
+
+        # Reading the status register releases the INT line, so that the
+        # next interrupt produces a falling edge
+        self.drain_pending()
+
+    def disable_interrupt_acquisition(self, int_pin):
+        int_pin.irq(handler=None)
+        self.disable_a_full()
+        self.disable_data_rdy()
+        self._irq_pending = False
+        self._on_data = None
+        self._on_drain = None
+
+    def _irq_handler(self, pin):
+        # Hard IRQ context: no I2C nor allocation here, defer the drain to
+        # the scheduler (the bound method is created once in __init__)
+        if self._irq_pending:
+            return
+        self._irq_pending = True
+        try:
+            micropython.schedule(self._scheduled_drain_ref, 0)
+        except RuntimeError:
+            # Schedule queue full: the next edge will retry
+            self._irq_pending = False
+
+    def _scheduled_drain(self, _):
+        self._irq_pending = False
+        if self._storage_busy:
+            # The main program is using the storage: it will drain when done
+            self._drain_deferred = True
+        else:
+            self.drain_pending()
+
+    def drain_pending(self):
+        # Clear the interrupt status (releasing the INT line) and drain
+        start = ticks_us()
+        self._i2c.readfrom_mem_into(self.i2c_address, MAX30105_INT_STAT_1,
+                                    self._int_buffer)
+        number_of_samples = self.drain()
+        if self._on_drain is not None:
+            self._on_drain(ticks_diff(ticks_us(), start))
+        if number_of_samples > 0:
+            self._data_ready = True
+            if self._on_data is not None:
+                self._on_data()
+
+    def data_ready(self):
+        # True (once) if samples were stored since the last call
+        if self._data_ready:
+            self._data_ready = False
+            return True
+        return False
@@ -1,41 +1,135 @@
-from ucollections import deque
+from array import array
 
 
 class CircularBuffer(object):
-    ''' Very simple implementation of a circular buffer based on deque '''
-    def __init__(self, max_size):
-        self.data = deque((), max_size, True)
+    ''' Fixed-capacity ring buffer backed by a preallocated array.
+
+    push/pop are O(1); when the buffer is full the oldest item is
+    overwritten and counted in 'overwritten'. Bulk transfers (extend,
+    readinto, peek_window) copy item by item and do not allocate.
+    '''
+    def __init__(self, max_size, typecode='i'):
+        self.data = array(typecode, [0] * max_size)
+        self.typecode = typecode
         self.max_size = max_size
+        # Index of the oldest item and number of stored items
+        self._tail = 0
+        self._count = 0
+        # Items lost because the consumer fell behind
+        self.overwritten = 0
 
     def __len__(self):
-        return len(self.data)
+        return self._count
 
     def is_empty(self):
-        return not bool(self.data)
+        return self._count == 0
+
+    def is_full(self):
+        return self._count == self.max_size
 
     def append(self, item):
-        try:
-            self.data.append(item)
-        except IndexError:
-            # deque full, popping 1st item out
-            self.data.popleft()
-            self.data.append(item)
+        head = self._tail + self._count
+        if head >= self.max_size:
+            head -= self.max_size
+        self.data[head] = item
+        if self._count == self.max_size:
+            # Buffer full, the 1st item has been overwritten
+            self._tail = head + 1 if head + 1 < self.max_size else 0
+            self.overwritten += 1
+        else:
+            self._count += 1
 
-    def pop(self):
-        return self.data.popleft()
+    def extend(self, items, n=None):
+        # Append the first n items of an array (all of them by default).
+        # Items are copied one by one: slicing would create memoryview
+        # objects on the heap at every call
+        if n is None:
+            n = len(items)
+        size = self.max_size
+        first = 0
+        if n > size:
+            # Only the newest max_size items can be kept
+            self.overwritten += n - size
+            first = n - size
+        data = self.data
+        head = self._tail + self._count
+        if head >= size:
+            head -= size
+        for i in range(first, n):
+            data[head] = items[i]
+            head += 1
+            if head == size:
+                head = 0
+        n -= first
+        free = size - self._count
+        if n > free:
+            self.overwritten += n - free
+            self._tail += n - free
+            if self._tail >= size:
+                self._tail -= size
+            self._count = size
+        else:
+            self._count += n
 
-    def clear(self):
-        self.data = deque((), self.max_size, True)
+    def pop(self):
+        # Pops the oldest item
+        if self._count == 0:
+            raise IndexError('pop from empty buffer')
+        item = self.data[self._tail]
+        self._tail += 1
+        if self._tail == self.max_size:
+            self._tail = 0
+        self._count -= 1
+        return item
 
     def pop_head(self):
-        buffer_size = len(self.data)
-        temp = self.data
-        if buffer_size == 1:
-            pass
-        elif buffer_size > 1:
-            self.data.clear()
-            for x in range(buffer_size - 1):
-                self.data = temp.popleft()
-        else:
+        # Pops the newest item, discarding the older ones
+        if self._count == 0:
             return 0
-        return temp.popleft()
\ No newline at end of file
+        head = self._tail + self._count - 1
+        if head >= self.max_size:
+            head -= self.max_size
+        item = self.data[head]
+        self.clear()
+        return item
+
+    def clear(self):
+        self._tail = 0
+        self._count = 0
+
+    def _copy_out(self, dst, start, n):
+        # Copy n items starting at 'start' (0 = oldest) into dst[0:n]
+        size = self.max_size
+        data = self.data
+        index = self._tail + start
+        if index >= size:
+            index -= size
+        for i in range(n):
+            dst[i] = data[index]
+            index += 1
+            if index == size:
+                index = 0
+
+    def readinto(self, buf, n=None):
+        # Pops the oldest items into buf, at most n of them (len(buf) by
+        # default); returns how many were copied
+        if n is None or n > len(buf):
+            n = len(buf)
+        if n > self._count:
+            n = self._count
+        if n:
+            self._copy_out(buf, 0, n)
+            self._tail += n
+            if self._tail >= self.max_size:
+                self._tail -= self.max_size
+            self._count -= n
+        return n
+
+    def peek_window(self, n, out=None):
+        # Returns a view of the newest n items (oldest first) without
+        # consuming them; 'out' is reused as storage when given
+        n = min(n, self._count)
+        if out is None:
+            out = array(self.typecode, [0] * n)
+        self._copy_out(out, self._count - n, n)
+        return memoryview(out)[:n]
@@ -0,0 +1,28 @@
+# Inner loop of the FIFO decoding, as a standalone function over buffers.
+# On MicroPython the viper version (max30102/kernels_viper.py) is used; on
+# other implementations, or on ports built without the viper emitter, the
+# pure-Python version below, which gives identical results.
+import sys
+
+
+# Decodes n samples of one channel from the FIFO bytes in src into out.
+# params holds the offset of the channel in a sample, the sample size and
+# the right shift of the pulse width setting. Each channel is a 3-byte
+# big-endian word; only 18 bits are valid.
+def decode_channel_py(src, out, n, params):
+    offset = params[0]
+    stride = params[1]
+    shift = params[2]
+    for i in range(n):
+        out[i] = (((src[offset] << 16) | (src[offset + 1] << 8)
+                   | src[offset + 2]) & 0x3FFFF) >> shift
+        offset += stride
+
+
+if sys.implementation.name == 'micropython':
+    try:
+        from max30102.kernels_viper import decode_channel
+    except (ImportError, SyntaxError):
+        decode_channel = decode_channel_py
+else:
+    decode_channel = decode_channel_py
@@ -0,0 +1,16 @@
+# Viper versions of the kernels of max30102/kernels.py (MicroPython only:
+# the pointer annotations are not valid Python).
+import micropython
+
+
+@micropython.viper
+def decode_channel(src: ptr8, out: ptr32, n: int, params: ptr32):
+    offset = params[0]
+    stride = params[1]
+    shift = params[2]
+    i = 0
+    while i < n:
+        out[i] = (((src[offset] << 16) | (src[offset + 1] << 8)
+                   | src[offset + 2]) & 0x3FFFF) >> shift
+        offset += stride
+        i += 1
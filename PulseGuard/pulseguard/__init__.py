@@ -0,0 +1,3 @@
+# PulseGuard signal processing and application services, shared by
+# codigo_principal.py and main_bpm_presenca.py. Copy this folder to the
+# board next to the max30102 driver.
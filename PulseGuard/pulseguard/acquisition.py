@@ -0,0 +1,155 @@
+# Dual-core acquisition: the MAX30102 drain loop runs on the second core
+# (core 1 of the RP2040, started with _thread) and hands the samples to the
+# main core through a single-producer/single-consumer ring, so that Wi-Fi,
+# HTTP and the analysis on core 0 never delay the FIFO reads.
+import _thread
+from array import array
+
+from utime import sleep_ms, ticks_diff, ticks_ms
+
+# Samples moved from the driver storage per copy on core 1
+BATCH_SIZE = 32
+
+
+class SampleRing:
+    """Lock-free single-producer/single-consumer ring of IR/red samples.
+
+    Each sample carries its acquisition time (ticks_ms). Only the producer
+    writes head and only the consumer writes tail, and each side publishes
+    its index after touching the data, so the two cores need no lock.
+    Indexes run modulo 2*size to tell a full ring from an empty one. When
+    the ring is full the producer drops the new samples and counts them in
+    dropped.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.red = array('i', [0] * size)
+        self.ir = array('i', [0] * size)
+        self.timestamps = array('i', [0] * size)
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        n = self.head - self.tail
+        return n + 2 * self.size if n < 0 else n
+
+    # Producer side (core 1)
+    def put(self, red, ir, timestamp):
+        """Append a sample; return False (and count it) if the ring is full."""
+        head = self.head
+        n = head - self.tail
+        if n < 0:
+            n += 2 * self.size
+        if n == self.size:
+            self.dropped += 1
+            return False
+        i = head if head < self.size else head - self.size
+        self.red[i] = red
+        self.ir[i] = ir
+        self.timestamps[i] = timestamp
+        # Publish only once the sample is in place
+        head += 1
+        self.head = head if head < 2 * self.size else 0
+        return True
+
+    # Consumer side (core 0)
+    def read(self, red_buf, ir_buf, timestamp_buf):
+        """Pop up to len(red_buf) samples into the given arrays.
+
+        Returns how many samples were copied.
+        """
+        tail = self.tail
+        n = self.head - tail
+        if n < 0:
+            n += 2 * self.size
+        if n > len(red_buf):
+            n = len(red_buf)
+        size = self.size
+        red = self.red
+        ir = self.ir
+        timestamps = self.timestamps
+        i = tail if tail < size else tail - size
+        for k in range(n):
+            red_buf[k] = red[i]
+            ir_buf[k] = ir[i]
+            timestamp_buf[k] = timestamps[i]
+            i += 1
+            if i == size:
+                i = 0
+        # Release the slots only once they have been copied
+        tail += n
+        self.tail = tail if tail < 2 * size else tail - 2 * size
+        return n
+
+
+class DualCoreAcquisition:
+    """Drains a configured MAX30102 from a second thread (core 1).
+
+    Once started, the sensor belongs to core 1: core 0 only calls read(),
+    get_overflow_stats() and get_overwritten(). The thread polls the FIFO
+    every poll_ms, by default the time the sensor takes to fill half of it.
+    """
+
+    def __init__(self, sensor, ring_size=256, poll_ms=None):
+        self.sensor = sensor
+        self.ring = SampleRing(ring_size)
+        if poll_ms is None:
+            poll_ms = int(16 * 1000 / sensor.get_acquisition_frequency())
+        self.poll_ms = max(1, poll_ms)
+        self.running = False
+        self.stopped = True
+        # Drains that found new samples, samples handed to core 0
+        self.drains = 0
+        self.samples = 0
+        self._red = array('i', [0] * BATCH_SIZE)
+        self._ir = array('i', [0] * BATCH_SIZE)
+
+    def start(self):
+        self.running = True
+        self.stopped = False
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self, timeout_ms=1000):
+        """Ask the thread to finish and wait for it (at most timeout_ms)."""
+        self.running = False
+        start = ticks_ms()
+        while not self.stopped:
+            if ticks_diff(ticks_ms(), start) > timeout_ms:
+                return False
+            sleep_ms(1)
+        return True
+
+    def _run(self):
+        # Core 1: no allocation in the loop, the heap is shared with core 0
+        sensor = self.sensor
+        ring = self.ring
+        red = self._red
+        ir = self._ir
+        try:
+            while self.running:
+                if sensor.check():
+                    self.drains += 1
+                    while sensor.available():
+                        seq = sensor.get_storage_sequence()
+                        n = sensor.read_storage(red, ir)
+                        for i in range(n):
+                            ring.put(red[i], ir[i],
+                                     sensor.sample_timestamp(seq + i))
+                        self.samples += n
+                sleep_ms(self.poll_ms)
+        finally:
+            self.stopped = True
+
+    def read(self, red_buf, ir_buf, timestamp_buf):
+        """Pop the samples acquired by core 1 (see SampleRing.read)."""
+        return self.ring.read(red_buf, ir_buf, timestamp_buf)
+
+    def get_overflow_stats(self):
+        """Samples lost in the sensor's FIFO and overflowed drains."""
+        return self.sensor.get_overflow_stats()
+
+    def get_overwritten(self):
+        """Samples lost because core 0 fell behind (ring or storage full)."""
+        return self.ring.dropped + self.sensor.get_storage_overwritten()
@@ -0,0 +1,114 @@
+# uasyncio uplink for the application tasks: AsyncUplink sends HTTP PUTs
+# over one persistent HTTP/1.1 connection without blocking the event loop
+# (unlike urequests), so acquisition keeps running while a request is in
+# flight (see pulseguard.uplink).
+import errno
+import json
+
+import uasyncio as asyncio
+
+from pulseguard.uplink import encode_requests, parse_header, parse_status
+
+
+class AsyncUplink:
+    """uasyncio version of pulseguard.uplink.Uplink.
+
+    Same keep-alive, pipelining and reconnection rules; put_json(),
+    put_many() and send() are coroutines, and asyncio.TimeoutError is raised when a
+    call takes longer than timeout_ms (the connection is then closed).
+    """
+
+    def __init__(self, host, port, timeout_ms=5000, max_pipeline=4,
+                 method="PUT"):
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.max_pipeline = max_pipeline
+        self.method = method
+        # Connections opened, requests answered and transparent reconnects
+        self.connections = 0
+        self.requests = 0
+        self.reconnects = 0
+        self._reader = None
+        self._writer = None
+
+    def connected(self):
+        return self._writer is not None
+
+    def close(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except OSError:
+                pass
+            self._reader = self._writer = None
+
+    async def put_json(self, path, payload):
+        return (await self.put_many(path, (payload,)))[0]
+
+    async def put_many(self, path, payloads):
+        return await self.send(path, [json.dumps(payload).encode()
+                                      for payload in payloads])
+
+    async def send(self, path, bodies):
+        statuses = []
+        try:
+            await asyncio.wait_for_ms(
+                self._exchange(path, bodies, statuses), self.timeout_ms)
+        except asyncio.TimeoutError:
+            self.close()
+            raise
+        return statuses
+
+    async def _exchange(self, path, bodies, statuses):
+        retried = False
+        while len(statuses) < len(bodies):
+            reused = self._writer is not None
+            try:
+                if not reused:
+                    self._reader, self._writer = await asyncio.open_connection(
+                        self.host, self.port)
+                    self.connections += 1
+                await self._pipeline(path, bodies, statuses)
+            except (OSError, EOFError):
+                self.close()
+                if not reused or retried:
+                    raise
+                retried = True
+                self.reconnects += 1
+
+    async def _pipeline(self, path, bodies, statuses):
+        first = len(statuses)
+        last = min(first + self.max_pipeline, len(bodies))
+        self._writer.write(encode_requests(
+            self.method, path, self.host, self.port, bodies[first:last]))
+        await self._writer.drain()
+        for _ in range(first, last):
+            status, keep_alive = await self._read_response()
+            statuses.append(status)
+            self.requests += 1
+            if not keep_alive:
+                self.close()
+                return
+
+    async def _readline(self):
+        line = await self._reader.readline()
+        if not line:
+            raise OSError(errno.ECONNRESET, "connection closed")
+        return line
+
+    async def _read_response(self):
+        status, keep_alive = parse_status(await self._readline())
+        length = 0
+        while True:
+            line = await self._readline()
+            if line == b"\r\n":
+                break
+            name, value = parse_header(line)
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"connection":
+                keep_alive = value.lower() == b"keep-alive"
+        if length:
+            await self._reader.readexactly(length)
+        return status, keep_alive
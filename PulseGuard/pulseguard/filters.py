@@ -0,0 +1,135 @@
+# Integer filter stages for the PPG signal, to run in front of the peak
+# detector: baseline (DC) removal and a biquad band-pass designed for the
+# acquisition rate. Coefficients are computed once, in floating point, and
+# quantized; the per-sample work is integer-only (no float is created) and
+# takes constant time.
+from math import cos, pi, sin, sqrt
+
+# Fixed-point format of the biquad coefficients (Q2.14)
+COEFF_SHIFT = 14
+# Largest relative error allowed on the quantized gain of the band-pass
+# denominator at DC (1 + a1 + a2), which sets the low edge of the band
+MAX_DC_ERROR = 0.25
+
+
+class DCBlocker:
+    """Removes the baseline tracked by an exponential moving average.
+
+    The average spans 2**shift samples, the power of two closest below
+    tau_s seconds, so that it only needs shifts. It starts at the first
+    sample to avoid a long settling step.
+    """
+
+    def __init__(self, sample_rate, tau_s=1.0):
+        shift = 0
+        while (1 << (shift + 1)) <= sample_rate * tau_s:
+            shift += 1
+        self.shift = shift
+        self._acc = 0
+        self._primed = False
+
+    def process(self, x):
+        if self._primed:
+            self._acc += x - (self._acc >> self.shift)
+        else:
+            self._acc = x << self.shift
+            self._primed = True
+        return x - (self._acc >> self.shift)
+
+    def reset(self):
+        self._acc = 0
+        self._primed = False
+
+
+class Biquad:
+    """Second-order IIR section in direct form I with Q2.14 coefficients.
+
+    The rounding error of each output is fed back into the next one (first
+    order noise shaping), which keeps the quantization noise away from the
+    low frequencies of the pulse. Inputs are expected to be baseline-free:
+    with |x| below 2**14 every product stays a MicroPython small integer.
+    """
+
+    def __init__(self, b0, b1, b2, a1, a2):
+        scale = 1 << COEFF_SHIFT
+        self.b0 = int(round(b0 * scale))
+        self.b1 = int(round(b1 * scale))
+        self.b2 = int(round(b2 * scale))
+        self.a1 = int(round(a1 * scale))
+        self.a2 = int(round(a2 * scale))
+        self.reset()
+
+    def process(self, x):
+        acc = (self.b0 * x + self.b1 * self._x1 + self.b2 * self._x2
+               - self.a1 * self._y1 - self.a2 * self._y2 + self._error)
+        y = acc >> COEFF_SHIFT
+        self._error = acc - (y << COEFF_SHIFT)
+        self._x2 = self._x1
+        self._x1 = x
+        self._y2 = self._y1
+        self._y1 = y
+        return y
+
+    def reset(self):
+        self._x1 = self._x2 = 0
+        self._y1 = self._y2 = 0
+        self._error = 0
+
+
+def band_pass(sample_rate, low_hz=0.5, high_hz=4.0):
+    """Biquad band-pass between low_hz and high_hz (0 dB at the center).
+
+    Audio EQ cookbook design, centered on the geometric mean of the edges.
+    The poles get closer to z = 1 as the rate grows, and 1 + a1 + a2 falls
+    to a few LSBs of the Q2.14 coefficients: quantized, the section no
+    longer removes the low frequencies (nor any residual DC). ValueError is
+    raised when that sum is off by more than MAX_DC_ERROR; with the default
+    band this happens above 800 Hz.
+    """
+    if not 0 < low_hz < high_hz < sample_rate / 2:
+        raise ValueError("Wrong band: {}-{} Hz at {} Hz".format(
+            low_hz, high_hz, sample_rate))
+    f0 = sqrt(low_hz * high_hz)
+    q = f0 / (high_hz - low_hz)
+    w0 = 2 * pi * f0 / sample_rate
+    alpha = sin(w0) / (2 * q)
+    a0 = 1 + alpha
+    section = Biquad(alpha / a0, 0.0, -alpha / a0, -2 * cos(w0) / a0,
+                     (1 - alpha) / a0)
+    # 1 + a1 + a2 = (2 - 2 cos(w0)) / a0, without the cancellation
+    exact = 4 * sin(w0 / 2) ** 2 / a0
+    quantized = ((1 << COEFF_SHIFT) + section.a1 + section.a2) \
+        / (1 << COEFF_SHIFT)
+    if abs(quantized - exact) > MAX_DC_ERROR * exact:
+        raise ValueError("Band-pass degenerates at {} Hz: {}-{} Hz".format(
+            sample_rate, low_hz, high_hz))
+    return section
+
+
+class PPGFilter:
+    """DC removal followed by a band-pass, as one pluggable stage.
+
+    PPG pulses lower the reading (more blood absorbs more light); with
+    invert=True the output rises on each systole, so the peak detector
+    locks on the sharp systolic peak instead of the flat diastole.
+    """
+
+    def __init__(self, sample_rate, low_hz=0.5, high_hz=4.0, invert=True):
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self.invert = invert
+        self.set_sample_rate(sample_rate)
+
+    def set_sample_rate(self, sample_rate):
+        """Redesign the stages for a new rate (their state is lost)."""
+        self.sample_rate = sample_rate
+        self.dc = DCBlocker(sample_rate, 1 / self.low_hz)
+        self.band = band_pass(sample_rate, self.low_hz, self.high_hz)
+
+    def process(self, x):
+        y = self.band.process(self.dc.process(x))
+        return -y if self.invert else y
+
+    def reset(self):
+        self.dc.reset()
+        self.band.reset()
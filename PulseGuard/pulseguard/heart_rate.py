@@ -0,0 +1,179 @@
+from array import array
+
+from utime import ticks_ms
+
+from pulseguard.kernels import local_maxima
+from pulseguard.peaks import PeakDetector
+
+
+class HeartRateMonitor:
+    """A simple heart rate monitor that uses a moving window to smooth the signal and find peaks.
+
+    Samples, timestamps and smoothed values live in preallocated ring
+    buffers of window_size entries and the moving average is a running sum,
+    so add_sample() takes constant time and does not allocate, whatever the
+    window size. Beats are detected as the samples arrive (see
+    pulseguard.peaks.PeakDetector), so the heart rate is available at any
+    time without a pass over the window.
+    """
+
+    def __init__(self, sample_rate=100, window_size=10, smoothing_window=5,
+                 rr_intervals=16, prefilter=None):
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.smoothing_window = smoothing_window
+        # Optional stage applied to every sample before the smoothing: any
+        # object with process(int) -> int, e.g. pulseguard.filters.PPGFilter
+        self.prefilter = prefilter
+        # Adaptive threshold over the same window as find_peaks()
+        self.detector = PeakDetector(window_size, intervals=rr_intervals)
+        # Ring buffers of the last window_size samples: _start is the index
+        # of the oldest one, _count how many are stored
+        self.samples = array('i', [0] * window_size)
+        self.timestamps = array('i', [0] * window_size)
+        # Smoothed samples, kept as the sum of the last smoothing_window
+        # samples (i.e. scaled by smoothing_window) to stay integers
+        self.filtered_samples = array('i', [0] * window_size)
+        self._start = 0
+        self._count = 0
+        # Last smoothing_window samples and their running sum
+        self._smoothing_ring = array('i', [0] * smoothing_window)
+        self._smoothing_index = 0
+        self._smoothing_count = 0
+        self._smoothing_sum = 0
+        # Output and parameters of the find_peaks() kernel
+        self._peak_indices = array('i', [0] * window_size)
+        self._peak_params = array('i', [0, 0, 0, 0])
+
+    def __len__(self):
+        return self._count
+
+    def add_sample(self, sample, timestamp=None):
+        """Add a new sample to the monitor.
+
+        timestamp is the acquisition time of the sample (ticks_ms), as given
+        by MAX30102.sample_timestamp(); when omitted the current time is used.
+        Returns True when the sample completes a heart beat.
+        """
+        if timestamp is None:
+            timestamp = ticks_ms()
+        if self.prefilter is not None:
+            sample = self.prefilter.process(sample)
+
+        # Apply smoothing: replace the oldest sample of the running sum
+        k = self._smoothing_index
+        self._smoothing_sum += sample - self._smoothing_ring[k]
+        self._smoothing_ring[k] = sample
+        k += 1
+        self._smoothing_index = 0 if k == self.smoothing_window else k
+        if self._smoothing_count < self.smoothing_window:
+            self._smoothing_count += 1
+        if self._smoothing_count == self.smoothing_window:
+            filtered = self._smoothing_sum
+        else:
+            filtered = sample * self.smoothing_window
+
+        # Maintain the size of samples and timestamps: once the window is
+        # full the newest sample overwrites the oldest one
+        i = self._start + self._count
+        if i >= self.window_size:
+            i -= self.window_size
+        self.samples[i] = sample
+        self.timestamps[i] = timestamp
+        self.filtered_samples[i] = filtered
+        if self._count == self.window_size:
+            self._start = i + 1 if i + 1 < self.window_size else 0
+        else:
+            self._count += 1
+
+        # Streaming beat detection
+        return self.detector.add(filtered, timestamp)
+
+    def find_peaks(self):
+        """Find peaks in the filtered samples.
+
+        Full pass over the window, kept for inspection: the heart rate comes
+        from the streaming detector.
+        """
+        peaks = []
+        n = self._count
+
+        if n < 3:  # Need at least three samples to find a peak
+            return peaks
+
+        # Calculate dynamic threshold based on the min and max of the recent window of filtered samples
+        filtered = self.filtered_samples
+        recent_samples = memoryview(filtered)[:n]
+        min_val = min(recent_samples)
+        max_val = max(recent_samples)
+        # 50% between min and max as a threshold, passed doubled to the
+        # kernel: current > (min + max) / 2 <=> 2 * current > min + max
+        params = self._peak_params
+        params[0] = self._start
+        params[1] = n
+        params[2] = self.window_size
+        params[3] = min_val + max_val
+
+        # Walk the ring from the oldest sample (viper-compiled on
+        # MicroPython, see pulseguard.kernels)
+        indices = self._peak_indices
+        for k in range(local_maxima(filtered, indices, params)):
+            i = indices[k]
+            peaks.append((self.timestamps[i], filtered[i] / self.smoothing_window))
+
+        return peaks
+
+    def calculate_heart_rate(self):
+        """Calculate the heart rate in beats per minute (BPM).
+
+        Mean of the last R-R intervals found by the detector; None until two
+        beats were seen, or when no beat was seen for max_interval_ms
+        before the last sample.
+        """
+        if not self._count:
+            return None
+        last = self._start + self._count - 1
+        if last >= self.window_size:
+            last -= self.window_size
+        return self.detector.heart_rate(self.timestamps[last])
+
+    def get_rr_intervals(self):
+        """Ring of the last R-R intervals (pulseguard.peaks.RRIntervals)."""
+        return self.detector.intervals
+
+    def set_sample_rate(self, sample_rate):
+        """Follow a change of the acquisition rate.
+
+        The window keeps its duration: window_size scales with the rate and
+        the buffers are reallocated. The samples are dropped and the
+        prefilter, which must then have a set_sample_rate() method too, is
+        redesigned; the R-R intervals (in ms) are kept, so the heart rate
+        remains available across the change.
+        """
+        window_size = max(3, self.window_size * sample_rate // self.sample_rate)
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.samples = array('i', [0] * window_size)
+        self.timestamps = array('i', [0] * window_size)
+        self.filtered_samples = array('i', [0] * window_size)
+        self._peak_indices = array('i', [0] * window_size)
+        if self.prefilter is not None:
+            self.prefilter.set_sample_rate(sample_rate)
+        self.detector.set_window(window_size)
+        self._clear()
+
+    def reset(self):
+        """Forget the samples and beats, e.g. after the finger was removed."""
+        if self.prefilter is not None:
+            self.prefilter.reset()
+        self.detector.reset()
+        self._clear()
+
+    def _clear(self):
+        self._start = 0
+        self._count = 0
+        self._smoothing_index = 0
+        self._smoothing_count = 0
+        self._smoothing_sum = 0
+        for k in range(self.smoothing_window):
+            self._smoothing_ring[k] = 0
@@ -0,0 +1,99 @@
+# Constant-memory statistics of the R-R intervals, fed beat by beat: mean
+# and variance (Welford), SDNN, RMSSD and min/max. Each instance covers one
+# horizon, set by how often it is reset (e.g. one per uplink interval and
+# one for the whole session).
+from math import sqrt
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream (Welford's method)."""
+
+    def __init__(self):
+        self.reset()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.count == 1 or x < self.min:
+            self.min = x
+        if self.count == 1 or x > self.max:
+            self.max = x
+
+    def variance(self):
+        """Sample variance, or None with fewer than two values."""
+        if self.count < 2:
+            return None
+        return self._m2 / (self.count - 1)
+
+    def std(self):
+        variance = self.variance()
+        return None if variance is None else sqrt(variance)
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+
+class HRVStats:
+    """Heart rate variability over the R-R intervals (ms) added since reset.
+
+    SDNN is the standard deviation of the intervals and RMSSD the root mean
+    square of the differences between successive ones; gap() marks a
+    discontinuity (e.g. a lost beat), so that no difference spans it.
+    """
+
+    def __init__(self):
+        self.intervals = RunningStats()
+        self.reset()
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, interval):
+        self.intervals.add(interval)
+        if self._previous:
+            diff = interval - self._previous
+            self._squared_diffs += diff * diff
+            self._diffs += 1
+        self._previous = interval
+
+    def gap(self):
+        self._previous = 0
+
+    def mean_interval(self):
+        return self.intervals.mean if len(self.intervals) else None
+
+    def mean_heart_rate(self):
+        """BPM of the mean interval (the average rate over the horizon)."""
+        mean = self.mean_interval()
+        return 60000 / mean if mean else None
+
+    def min_heart_rate(self):
+        longest = self.intervals.max
+        return 60000 / longest if longest else None
+
+    def max_heart_rate(self):
+        shortest = self.intervals.min
+        return 60000 / shortest if shortest else None
+
+    def sdnn(self):
+        return self.intervals.std()
+
+    def rmssd(self):
+        if not self._diffs:
+            return None
+        return sqrt(self._squared_diffs / self._diffs)
+
+    def reset(self):
+        self.intervals.reset()
+        self._previous = 0
+        self._squared_diffs = 0
+        self._diffs = 0
@@ -0,0 +1,80 @@
+# Inner loops of the beat detection and of the window analysis, as
+# standalone functions over arrays. On MicroPython the viper versions of
+# pulseguard/kernels_viper.py are used; on other implementations, or on
+# ports built without the viper emitter, the pure-Python versions below,
+# which give identical results.
+import sys
+
+# Sample positions wrap like ticks, so that they stay small integers
+POSITION_MASK = (1 << 30) - 1
+
+
+def deque_push_py(ring, state, position, value):
+    """Push a value into a monotonic deque (see peaks.MonotonicDeque).
+
+    ring holds the positions in its first size + 1 slots and the values in
+    the next size + 1; state holds the index of the front, the number of
+    values and the window size, and is updated.
+    """
+    head = state[0]
+    count = state[1]
+    size = state[2]
+    capacity = size + 1
+    # Drop the values that can no longer be the maximum
+    while count:
+        back = head + count - 1
+        if back >= capacity:
+            back -= capacity
+        if ring[capacity + back] > value:
+            break
+        count -= 1
+    # Drop the front if it left the window
+    while count and (position - ring[head]) & POSITION_MASK >= size:
+        head = head + 1 if head + 1 < capacity else 0
+        count -= 1
+    i = head + count
+    if i >= capacity:
+        i -= capacity
+    ring[i] = position
+    ring[capacity + i] = value
+    state[0] = head
+    state[1] = count + 1
+
+
+def local_maxima_py(values, out, params):
+    """Indices of the local maxima above a threshold in a ring of values.
+
+    params holds the index of the oldest value, the number of values, the
+    ring size and twice the threshold (so that it stays an integer). The
+    indices are written to out, oldest first; their number is returned.
+    """
+    start = params[0]
+    n = params[1]
+    size = params[2]
+    threshold2 = params[3]
+    count = 0
+    previous = values[start]
+    i = start + 1 if start + 1 < size else 0
+    current = values[i]
+    for _ in range(n - 2):
+        j = i + 1 if i + 1 < size else 0
+        following = values[j]
+        if current + current > threshold2 and previous < current \
+                and current > following:
+            out[count] = i
+            count += 1
+        previous = current
+        current = following
+        i = j
+    return count
+
+
+if sys.implementation.name == 'micropython':
+    try:
+        from pulseguard.kernels_viper import deque_push, local_maxima
+    except (ImportError, SyntaxError):
+        deque_push = deque_push_py
+        local_maxima = local_maxima_py
+else:
+    deque_push = deque_push_py
+    local_maxima = local_maxima_py
@@ -0,0 +1,64 @@
+# Viper versions of the kernels of pulseguard/kernels.py (MicroPython only:
+# the pointer annotations are not valid Python).
+import micropython
+from micropython import const
+
+# Same value as pulseguard.kernels.POSITION_MASK (importing it here would be
+# circular)
+_POSITION_MASK = const(0x3FFFFFFF)
+
+
+@micropython.viper
+def deque_push(ring: ptr32, state: ptr32, position: int, value: int):
+    head = state[0]
+    count = state[1]
+    size = state[2]
+    capacity = size + 1
+    while count > 0:
+        back = head + count - 1
+        if back >= capacity:
+            back -= capacity
+        if ring[capacity + back] > value:
+            break
+        count -= 1
+    while count > 0 and ((position - ring[head]) & _POSITION_MASK) >= size:
+        head += 1
+        if head >= capacity:
+            head = 0
+        count -= 1
+    i = head + count
+    if i >= capacity:
+        i -= capacity
+    ring[i] = position
+    ring[capacity + i] = value
+    state[0] = head
+    state[1] = count + 1
+
+
+@micropython.viper
+def local_maxima(values: ptr32, out: ptr32, params: ptr32) -> int:
+    start = params[0]
+    n = params[1]
+    size = params[2]
+    threshold2 = params[3]
+    count = 0
+    previous = values[start]
+    i = start + 1
+    if i >= size:
+        i = 0
+    current = values[i]
+    k = 0
+    while k < n - 2:
+        j = i + 1
+        if j >= size:
+            j = 0
+        following = values[j]
+        if current + current > threshold2 and previous < current \
+                and current > following:
+            out[count] = i
+            count += 1
+        previous = current
+        current = following
+        i = j
+        k += 1
+    return count
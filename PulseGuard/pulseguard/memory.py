@@ -0,0 +1,97 @@
+# Heap telemetry and garbage collection at chosen points. With the main
+# loops allocation-free in steady state, the garbage left by the uplink and
+# the reports is collected when the program has time for it (e.g. right
+# after an upload, while the samples wait in the driver storage) instead of
+# at a random allocation, and the pauses are measured.
+import gc
+
+from utime import ticks_diff, ticks_ms, ticks_us
+
+
+class HeapMonitor:
+    """Scheduled gc.collect() with pause-time counters and heap statistics.
+
+    idle() is meant to be called where the program would otherwise wait: it
+    collects when period_ms elapsed since the last collection. collect()
+    forces one. heap() returns the free and allocated bytes and the
+    fragmentation, 1 - largest free block / free bytes; they are None on
+    ports without gc.mem_free() (e.g. CPython).
+
+    The largest free block is found by trial allocations, each followed by
+    a collection, which takes a while: it is only measured when
+    probe_period_ms is given, by idle() once per probe_period_ms, and its
+    collections are counted with the others. heap() reports the last
+    measurement (None before the first one) and does not allocate.
+    """
+
+    def __init__(self, period_ms=5000, probe_period_ms=None):
+        self.period_ms = period_ms
+        self.probe_period_ms = probe_period_ms
+        # Collections (scheduled and of the probe) and their pauses (us)
+        self.collections = 0
+        self.pause_us_last = 0
+        self.pause_us_max = 0
+        self.pause_us_total = 0
+        self.fragmentation = None
+        self._last = self._last_probe = ticks_ms()
+
+    def _pause(self, start):
+        pause = ticks_diff(ticks_us(), start)
+        self._last = ticks_ms()
+        self.collections += 1
+        self.pause_us_last = pause
+        self.pause_us_total += pause
+        if pause > self.pause_us_max:
+            self.pause_us_max = pause
+        return pause
+
+    def collect(self):
+        start = ticks_us()
+        gc.collect()
+        return self._pause(start)
+
+    def idle(self):
+        """Collect (or probe) if its period elapsed; True when it did."""
+        now = ticks_ms()
+        if self.probe_period_ms is not None and \
+                ticks_diff(now, self._last_probe) >= self.probe_period_ms:
+            self.probe()
+            return True
+        if ticks_diff(now, self._last) < self.period_ms:
+            return False
+        self.collect()
+        return True
+
+    def probe(self, step=16):
+        """Measure the fragmentation now; returns it (None if unknown)."""
+        self._last_probe = ticks_ms()
+        if not hasattr(gc, 'mem_free'):
+            return None
+        self.collect()
+        free = gc.mem_free()
+        if not free:
+            return None
+        # Binary search of the largest block that can be allocated: a
+        # successful trial is released by a collection, a failed one made
+        # the allocator collect before giving up
+        low, high = 0, free // step
+        while low < high:
+            middle = (low + high + 1) // 2
+            start = ticks_us()
+            try:
+                block = bytearray(middle * step)
+            except MemoryError:
+                self._pause(start)
+                high = middle - 1
+            else:
+                block = None
+                self.collect()
+                low = middle
+        self.fragmentation = 1 - low * step / free
+        return self.fragmentation
+
+    def heap(self):
+        """(free bytes, allocated bytes, fragmentation), or Nones."""
+        if not hasattr(gc, 'mem_free'):
+            return None, None, None
+        return gc.mem_free(), gc.mem_alloc(), self.fragmentation
@@ -0,0 +1,256 @@
+# Store-and-forward queue for the uplink. Readings are appended, as JSON,
+# to a bounded ring file on flash and sent to the server in batches (one
+# JSON array per request) whenever it can be reached, so that a device that
+# stays offline for a while keeps what it measured. The flushes are
+# rate-limited, with an exponential back-off while the server cannot be
+# reached, and the oldest readings are evicted when the file is full.
+import json
+
+from ustruct import calcsize, pack, unpack
+from utime import ticks_add, ticks_diff, ticks_ms
+
+# File header: magic, capacity, offset and sequence number of the oldest
+# reading not yet delivered
+_STATE = '<4sIII'
+_MAGIC = b'PGOB'
+_DATA_START = calcsize(_STATE)
+# Record header: marker, length of the JSON (0 for a wrap marker, which
+# sends the reader back to the start of the data) and sequence number
+_RECORD = '<HHI'
+_RECORD_SIZE = calcsize(_RECORD)
+_MARKER = 0xB10B
+
+
+class Outbox:
+    """Bounded append-only ring file of JSON readings awaiting upload.
+
+    append() stores a reading (evicting the oldest ones if needed, counted
+    in `evicted`). When wait_ms() returns 0 a batch is due: next_batch()
+    gives the oldest readings, at most max_batch_bytes of JSON unless a
+    single reading is larger, as (count, body) with body a JSON array, and
+    complete() takes the HTTP status of its upload (failed() an exception).
+    flush() does all of that with a blocking pulseguard.uplink.Uplink.
+
+    After a delivered batch the next one waits min_interval_ms, so a long
+    backlog does not monopolise the loop or the radio; after a failure the
+    wait doubles up to max_backoff_ms. A batch rejected by the server (4xx
+    other than 408 and 429) would be rejected again: it is dropped and
+    counted in `rejected`.
+
+    Each record is written before its header, and the oldest pending
+    position is saved in the file header when readings are delivered or
+    evicted: after a power loss the queue is found again by following the
+    records from there. Readings delivered just before a power loss may
+    be sent twice.
+    """
+
+    def __init__(self, path, capacity=256 * 1024, max_batch_bytes=4096,
+                 min_interval_ms=1000, max_backoff_ms=60000):
+        if capacity <= _DATA_START + _RECORD_SIZE:
+            raise ValueError('Wrong outbox capacity:{0}!'.format(capacity))
+        self.path = path
+        self.capacity = capacity
+        self.max_batch_bytes = max_batch_bytes
+        self.min_interval_ms = min_interval_ms
+        self.max_backoff_ms = max_backoff_ms
+        # Readings stored, delivered, evicted (file full) and rejected
+        self.stored = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.rejected = 0
+        self._backoff = 0
+        self._next = ticks_ms()
+        self._file = self._open()
+        self._recover()
+
+    def __len__(self):
+        return self._count
+
+    def _open(self):
+        try:
+            f = open(self.path, 'r+b')
+            state = f.read(_DATA_START)
+            if len(state) == _DATA_START:
+                magic, capacity, tail, tail_seq = unpack(_STATE, state)
+                if magic == _MAGIC and capacity == self.capacity:
+                    self._tail, self._tail_seq = tail, tail_seq
+                    return f
+            f.close()
+        except OSError:
+            pass
+        # New file (or another capacity): empty queue
+        f = open(self.path, 'w+b')
+        self._tail, self._tail_seq = _DATA_START, 0
+        self._file = f
+        self._write_state()
+        return f
+
+    def _write_state(self):
+        self._file.seek(0)
+        self._file.write(pack(_STATE, _MAGIC, self.capacity, self._tail,
+                              self._tail_seq))
+        self._file.flush()
+
+    def _read_header(self, pos):
+        self._file.seek(pos)
+        header = self._file.read(_RECORD_SIZE)
+        if len(header) < _RECORD_SIZE:
+            return None, 0, None
+        return unpack(_RECORD, header)
+
+    def _recover(self):
+        # Follow the records from the oldest pending one: the queue ends at
+        # the first header that is not the expected next record. The head
+        # stays where the last record ends, even when no header fits there
+        # (append() wraps from such a position, as before the reboot)
+        pos, seq, count = self._tail, self._tail_seq, 0
+        while True:
+            at = pos if pos + _RECORD_SIZE <= self.capacity else _DATA_START
+            marker, length, record_seq = self._read_header(at)
+            if marker != _MARKER or record_seq != seq:
+                break
+            if not length:
+                if at == _DATA_START:
+                    break
+                pos = _DATA_START
+                continue
+            if at + _RECORD_SIZE + length > self.capacity:
+                break
+            pos = at + _RECORD_SIZE + length
+            seq += 1
+            count += 1
+        self._head, self._head_seq, self._count = pos, seq, count
+
+    def _record_at(self, pos):
+        # (position, length) of the record at pos, following a wrap
+        if pos + _RECORD_SIZE <= self.capacity:
+            length = self._read_header(pos)[1]
+            if length:
+                return pos, length
+        return _DATA_START, self._read_header(_DATA_START)[1]
+
+    def _drop_oldest(self):
+        pos, length = self._record_at(self._tail)
+        self._tail = pos + _RECORD_SIZE + length
+        self._tail_seq += 1
+        self._count -= 1
+
+    def append(self, payload):
+        """Store a reading (any JSON-serializable value)."""
+        data = json.dumps(payload).encode()
+        size = _RECORD_SIZE + len(data)
+        if size > self.capacity - _DATA_START or len(data) > 0xFFFF:
+            raise ValueError('Reading too large:{0}!'.format(len(data)))
+        # Positions where no record header fits are aliases of the start
+        pos = self._head
+        if pos + _RECORD_SIZE > self.capacity:
+            pos = _DATA_START
+        wrap = pos + size > self.capacity
+        start = _DATA_START if wrap else pos
+        # Evict the oldest readings that are in the way
+        evicted = 0
+        while self._count:
+            tail = self._tail
+            if tail + _RECORD_SIZE > self.capacity:
+                tail = _DATA_START
+            if wrap:
+                if tail < pos and tail >= start + size:
+                    break
+            elif not pos <= tail < pos + size:
+                break
+            self._drop_oldest()
+            evicted += 1
+        moved = False
+        if not self._count and (self._tail != start or
+                                self._tail_seq != self._head_seq):
+            self._tail, self._tail_seq = start, self._head_seq
+            moved = True
+        if evicted:
+            self.evicted += evicted
+        if evicted or moved:
+            self._write_state()
+        f = self._file
+        if wrap:
+            f.seek(pos)
+            f.write(pack(_RECORD, _MARKER, 0, self._head_seq))
+        f.seek(start + _RECORD_SIZE)
+        f.write(data)
+        f.flush()
+        f.seek(start)
+        f.write(pack(_RECORD, _MARKER, len(data), self._head_seq))
+        f.flush()
+        self._head = start + size
+        self._head_seq += 1
+        self._count += 1
+        self.stored += 1
+
+    def wait_ms(self, now=None):
+        """None when the queue is empty, else ms until the next batch is due
+        (0: now)."""
+        if not self._count:
+            return None
+        if now is None:
+            now = ticks_ms()
+        remaining = ticks_diff(self._next, now)
+        return remaining if remaining > 0 else 0
+
+    def next_batch(self):
+        """(count, JSON array) of the oldest readings; they stay queued."""
+        parts = []
+        size = 2
+        pos = self._tail
+        f = self._file
+        while len(parts) < self._count:
+            pos, length = self._record_at(pos)
+            if parts and size + length + 1 > self.max_batch_bytes:
+                break
+            f.seek(pos + _RECORD_SIZE)
+            parts.append(f.read(length))
+            size += length + 1
+            pos += _RECORD_SIZE + length
+        return len(parts), b'[' + b','.join(parts) + b']'
+
+    def _remove(self, count):
+        for _ in range(count):
+            self._drop_oldest()
+        self._write_state()
+
+    def complete(self, count, status):
+        """Result (HTTP status) of the upload of the next `count` readings."""
+        if 200 <= status < 300:
+            self._remove(count)
+            self.delivered += count
+        elif 400 <= status < 500 and status not in (408, 429):
+            self._remove(count)
+            self.rejected += count
+        else:
+            self.failed()
+            return
+        self._backoff = 0
+        self._next = ticks_add(ticks_ms(), self.min_interval_ms)
+
+    def failed(self):
+        """The upload failed (network error, timeout, 5xx): back off."""
+        backoff = self._backoff * 2 if self._backoff else self.min_interval_ms
+        self._backoff = min(backoff, self.max_backoff_ms)
+        self._next = ticks_add(ticks_ms(), self._backoff)
+
+    def flush(self, uplink, path):
+        """Upload the next batch through `uplink` if it is due.
+
+        Returns the HTTP status, or None when nothing was due; network
+        errors are raised (the batch stays queued).
+        """
+        if self.wait_ms() != 0:
+            return None
+        count, body = self.next_batch()
+        try:
+            status = uplink.send(path, (body,))[0]
+        except Exception:
+            self.failed()
+            raise
+        self.complete(count, status)
+        return status
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,205 @@
+# Streaming beat detection: sliding-window minimum/maximum with monotonic
+# deques, an adaptive threshold and a ring of R-R intervals. Everything is
+# updated once per sample, in amortized constant time and without
+# allocation, so that the heart rate is available at any instant.
+from array import array
+
+from utime import ticks_diff
+
+from pulseguard.kernels import POSITION_MASK, deque_push
+
+
+class MonotonicDeque:
+    """Maximum of the values pushed during the last `size` positions.
+
+    Values are kept in decreasing order in a preallocated ring: a new value
+    evicts the smaller ones at the back, and the front expires when it
+    falls out of the window, so each value is pushed and popped once.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        # Positions, then values, and the front index, number of values and
+        # size, as kept by pulseguard.kernels.deque_push() (viper-compiled on
+        # MicroPython)
+        self._ring = array('i', [0] * (2 * (size + 1)))
+        self._state = array('i', [0, 0, size])
+
+    def __len__(self):
+        return self._state[1]
+
+    def push(self, position, value):
+        deque_push(self._ring, self._state, position, value)
+
+    def front(self):
+        return self._ring[self.size + 1 + self._state[0]]
+
+    def clear(self):
+        self._state[0] = 0
+        self._state[1] = 0
+
+
+class SlidingExtrema:
+    """Running minimum and maximum of the last `size` values."""
+
+    def __init__(self, size):
+        self.size = size
+        self._max = MonotonicDeque(size)
+        # The minimum is the maximum of the negated values
+        self._min = MonotonicDeque(size)
+        self._position = 0
+
+    def push(self, value):
+        position = self._position
+        self._max.push(position, value)
+        self._min.push(position, -value)
+        self._position = (position + 1) & POSITION_MASK
+
+    def maximum(self):
+        return self._max.front()
+
+    def minimum(self):
+        return -self._min.front()
+
+    def clear(self):
+        self._max.clear()
+        self._min.clear()
+
+
+class RRIntervals:
+    """Ring of the last `size` R-R intervals (ms) with a running sum."""
+
+    def __init__(self, size=16):
+        self.size = size
+        self._intervals = array('i', [0] * size)
+        self._start = 0
+        self._count = 0
+        self._sum = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, interval):
+        i = self._start + self._count
+        if i >= self.size:
+            i -= self.size
+        if self._count == self.size:
+            # Full: the oldest interval is replaced
+            self._sum -= self._intervals[i]
+            self._start = i + 1 if i + 1 < self.size else 0
+        else:
+            self._count += 1
+        self._intervals[i] = interval
+        self._sum += interval
+
+    def get(self, k):
+        """Return the k-th interval, from the oldest (0) to the newest."""
+        i = self._start + k
+        if i >= self.size:
+            i -= self.size
+        return self._intervals[i]
+
+    def last(self):
+        return self.get(self._count - 1) if self._count else 0
+
+    def mean(self):
+        return self._sum / self._count if self._count else None
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+        self._sum = 0
+
+
+class PeakDetector:
+    """Streaming peak detector with an adaptive threshold.
+
+    The threshold sits threshold_percent of the way between the minimum and
+    the maximum of the last `window` values. Each run of values above it
+    yields one peak, at its highest value, emitted as soon as the signal
+    falls back below the threshold. Peaks closer than refractory_ms to the
+    previous one are ignored; a gap longer than max_interval_ms (e.g. the
+    finger was removed) restarts the interval history.
+    """
+
+    def __init__(self, window, threshold_percent=50, refractory_ms=250,
+                 max_interval_ms=2000, intervals=16):
+        self.threshold_percent = threshold_percent
+        self.refractory_ms = refractory_ms
+        self.max_interval_ms = max_interval_ms
+        self.extrema = SlidingExtrema(window)
+        self.intervals = RRIntervals(intervals)
+        self.beats = 0
+        self.last_peak_time = 0
+        # Interval (ms) closed by the last beat, 0 after a gap or on the
+        # first beat
+        self.last_interval = 0
+        self._has_peak = False
+        self._in_peak = False
+        self._peak_value = 0
+        self._peak_time = 0
+
+    def add(self, value, timestamp):
+        """Process a sample; return True when it completes a new beat."""
+        extrema = self.extrema
+        extrema.push(value)
+        low = extrema.minimum()
+        span = extrema.maximum() - low
+        if span > 0 and (value - low) * 100 > span * self.threshold_percent:
+            if not self._in_peak or value > self._peak_value:
+                self._in_peak = True
+                self._peak_value = value
+                self._peak_time = timestamp
+            return False
+        if not self._in_peak:
+            return False
+        self._in_peak = False
+        return self._beat(self._peak_time)
+
+    def _beat(self, peak_time):
+        self.last_interval = 0
+        if self._has_peak:
+            interval = ticks_diff(peak_time, self.last_peak_time)
+            if interval < self.refractory_ms:
+                return False
+            if interval <= self.max_interval_ms:
+                self.intervals.add(interval)
+                self.last_interval = interval
+            else:
+                self.intervals.clear()
+        self._has_peak = True
+        self.last_peak_time = peak_time
+        self.beats += 1
+        return True
+
+    def heart_rate(self, now=None):
+        """Mean heart rate (BPM) over the stored intervals, or None.
+
+        With now (ticks_ms), None is also returned when no beat was seen for
+        more than max_interval_ms.
+        """
+        mean = self.intervals.mean()
+        if mean is None:
+            return None
+        if now is not None and \
+                ticks_diff(now, self.last_peak_time) > self.max_interval_ms:
+            return None
+        return 60000 / mean
+
+    def set_window(self, window):
+        """Resize the threshold window, e.g. after a change of sample rate.
+
+        The peak being tracked is dropped and the next beat does not close
+        an interval, but the stored intervals (in ms) are kept.
+        """
+        self.extrema = SlidingExtrema(window)
+        self.last_interval = 0
+        self._has_peak = False
+        self._in_peak = False
+
+    def reset(self):
+        self.extrema.clear()
+        self.intervals.clear()
+        self.last_interval = 0
+        self._has_peak = False
+        self._in_peak = False
@@ -0,0 +1,61 @@
+# Single pass over the red/IR samples producing every vital sign: the heart
+# rate monitor detects the beats on the IR channel, each beat closes an
+# SpO2 window and feeds its R-R interval to the HRV statistics.
+
+
+class VitalSignsMonitor:
+    """Feeds a HeartRateMonitor and an SpO2Estimator with the same samples.
+
+    rr_stats are pulseguard.hrv.HRVStats (one per horizon) that receive
+    every R-R interval as it is detected. With a
+    pulseguard.quality.SignalQuality, the samples are not analysed while it
+    reports no contact (no finger, clipping): the monitors are reset once
+    and start afresh when the contact is back.
+    """
+
+    def __init__(self, heart_rate_monitor, spo2_estimator, rr_stats=(),
+                 quality=None):
+        self.heart_rate_monitor = heart_rate_monitor
+        self.spo2_estimator = spo2_estimator
+        self.rr_stats = rr_stats
+        self.quality = quality
+        # Samples not analysed for lack of contact
+        self.skipped = 0
+        self._analysing = True
+
+    def add_sample(self, red, ir, timestamp=None):
+        """Add a red/IR pair; returns True when it completes a heart beat."""
+        quality = self.quality
+        if quality is not None and not quality.add_sample(ir):
+            if self._analysing:
+                self._analysing = False
+                self.heart_rate_monitor.reset()
+                self.spo2_estimator.reset()
+            self.skipped += 1
+            return False
+        self._analysing = True
+        beat = self.heart_rate_monitor.add_sample(ir, timestamp)
+        self.spo2_estimator.add_sample(red, ir, beat)
+        if beat:
+            interval = self.heart_rate_monitor.detector.last_interval
+            if interval and quality is not None:
+                quality.add_interval(interval)
+            for stats in self.rr_stats:
+                if interval:
+                    stats.add(interval)
+                else:
+                    stats.gap()
+        return beat
+
+    def set_sample_rate(self, sample_rate):
+        """Follow a change of the acquisition rate in every stage."""
+        self.heart_rate_monitor.set_sample_rate(sample_rate)
+        self.spo2_estimator.set_sample_rate(sample_rate)
+        if self.quality is not None:
+            self.quality.set_sample_rate(sample_rate)
+
+    def calculate_heart_rate(self):
+        return self.heart_rate_monitor.calculate_heart_rate()
+
+    def calculate_spo2(self):
+        return self.spo2_estimator.calculate_spo2()
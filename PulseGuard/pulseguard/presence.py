@@ -0,0 +1,84 @@
+# Presence (HC-SR501 PIR) events from pin interrupts. The sensor holds its
+# output high for seconds after a detection and retriggers while there is
+# motion, so sampling the pin in the loop reports the same motion over and
+# over. Here the edges are taken by Pin.irq, debounced, and coalesced into
+# motion episodes: one event when an episode starts and one when it ends,
+# with its duration and number of detections, whatever its length.
+from machine import Pin
+from utime import ticks_diff, ticks_ms
+
+# Events returned by MotionEpisodes.poll()
+MOTION_START = 1
+MOTION_END = 2
+
+
+class MotionEpisodes:
+    """Debounced PIR edges coalesced into motion episodes.
+
+    The interrupt handler only records the level and the time of the last
+    edge (no allocation). poll(), called periodically from the main loop or
+    a task, accepts a level once it has been stable for debounce_ms and
+    returns MOTION_START, MOTION_END or None.
+
+    An episode starts at an accepted rising edge and ends when the output
+    has stayed low for gap_ms; the detections (rising edges) in between are
+    counted in `triggers`. Rate limit: an episode lasts at least
+    min_interval_ms, so there is at most one start and one end event per
+    min_interval_ms however often the sensor fires. A high output when the
+    detector is created (the HC-SR501 warm-up) does not start an episode.
+
+    After an event, start_ms and end_ms (ticks_ms of the first rising and
+    last falling edges), duration_ms and triggers describe the episode, and
+    `episodes` counts them.
+    """
+
+    def __init__(self, pin, debounce_ms=100, gap_ms=5000, min_interval_ms=0):
+        self.pin = pin
+        self.debounce_ms = debounce_ms
+        self.gap_ms = gap_ms
+        self.min_interval_ms = min_interval_ms
+        self.active = False
+        self.episodes = 0
+        self.triggers = 0
+        self.start_ms = self.end_ms = ticks_ms()
+        self.duration_ms = 0
+        # Edges seen by the interrupt handler, bounces included
+        self.edges = 0
+        self._level = self._stable = pin.value()
+        self._changed = self.start_ms
+        pin.irq(handler=self._irq_handler,
+                trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
+
+    def _irq_handler(self, pin):
+        self._level = pin.value()
+        self._changed = ticks_ms()
+        self.edges += 1
+
+    def poll(self, now=None):
+        if now is None:
+            now = ticks_ms()
+        level, changed = self._level, self._changed
+        if level != self._stable and \
+                ticks_diff(now, changed) >= self.debounce_ms:
+            self._stable = level
+            if not level:
+                self.end_ms = changed
+            elif self.active:
+                self.triggers += 1
+            else:
+                self.active = True
+                self.episodes += 1
+                self.triggers = 1
+                self.start_ms = self.end_ms = changed
+                self.duration_ms = 0
+                return MOTION_START
+        if self.active and not self._stable and \
+                ticks_diff(now, self.end_ms) >= self.gap_ms and \
+                ticks_diff(now, self.start_ms) >= self.min_interval_ms:
+            self.active = False
+            self.duration_ms = ticks_diff(self.end_ms, self.start_ms)
+            return MOTION_END
+        return None
+
+    def close(self):
+        self.pin.irq(handler=None)
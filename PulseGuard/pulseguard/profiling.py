@@ -0,0 +1,186 @@
+# Lightweight instrumentation of the main loop, built on ticks_us: timed
+# spans around its stages with fixed-bucket latency histograms, the loop
+# rate and the worst stalls. All the counters are preallocated, so timing a
+# span does not allocate; a disabled Profiler replaces its methods with a
+# function that does nothing, so the hooks can stay in production code.
+from array import array
+
+from utime import ticks_diff, ticks_us
+
+# Upper bounds (us) of the histogram buckets; a last bucket takes the rest
+BOUNDS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000,
+             100000, 200000, 500000, 1000000)
+
+
+def _nothing(*args):
+    pass
+
+
+class Profiler:
+    """Named spans, latency histograms and loop-timing counters.
+
+    The spans are given by their index in `names` (module constants in the
+    caller keep that readable):
+
+        perfil = Profiler(("sensor", "analise", "envio"))
+        perfil.start(ETAPA_ENVIO)
+        ...
+        perfil.stop(ETAPA_ENVIO)
+
+    A stage timed elsewhere (e.g. a drain run from an interrupt) gives its
+    duration to record(). A span named None is not reported, for a stage
+    that the configuration skips.
+
+    loop() is called once per iteration of the main loop: it counts the
+    iterations and takes the gap since the previous call; gaps longer than
+    stall_us are stalls (e.g. samples waiting while an upload blocks).
+
+    dump() prints the counters (serial console), summary() returns them as
+    a dict for the uplink and reset() starts a new window. The sums are
+    32-bit: reset at least once an hour.
+    """
+
+    def __init__(self, names, bounds=BOUNDS_US, stall_us=100000,
+                 enabled=True):
+        self.names = names
+        self.bounds = bounds
+        self.stall_us = stall_us
+        self.enabled = enabled
+        if not enabled:
+            self.start = self.stop = self.record = self.loop = _nothing
+            return
+        spans = len(names)
+        self._buckets = len(bounds) + 1
+        self._starts = array('i', [0] * spans)
+        self._counts = array('I', [0] * spans)
+        self._totals = array('I', [0] * spans)
+        self._maxima = array('I', [0] * spans)
+        self._histograms = array('I', [0] * (spans * self._buckets))
+        self._last_loop = None
+        # Dict returned by summary(), allocated once and updated in place
+        self._spans = {}
+        for name in names:
+            if name is not None:
+                self._spans[name] = dict.fromkeys(
+                    ("count", "mean_us", "p95_us", "max_us"))
+        self._summary = dict.fromkeys(
+            ("loops_per_s", "worst_gap_us", "stalls"))
+        self._summary["spans"] = self._spans
+        self.reset()
+
+    def reset(self):
+        """Clear the counters (a gap spanning the reset still counts)."""
+        if not self.enabled:
+            return
+        for counters in (self._counts, self._totals, self._maxima,
+                         self._histograms):
+            for i in range(len(counters)):
+                counters[i] = 0
+        # Iterations, worst gap (us) and stalls since the reset
+        self.loops = 0
+        self.worst_gap_us = 0
+        self.stalls = 0
+        self._window_start = ticks_us()
+
+    def start(self, span):
+        self._starts[span] = ticks_us()
+
+    def stop(self, span):
+        """End the span; returns its duration (us)."""
+        return self.record(span, ticks_diff(ticks_us(), self._starts[span]))
+
+    def record(self, span, elapsed):
+        """Count a duration (us) of the span measured by the caller."""
+        self._counts[span] += 1
+        self._totals[span] += elapsed
+        if elapsed > self._maxima[span]:
+            self._maxima[span] = elapsed
+        bucket = 0
+        for bound in self.bounds:
+            if elapsed <= bound:
+                break
+            bucket += 1
+        self._histograms[span * self._buckets + bucket] += 1
+        return elapsed
+
+    def loop(self):
+        now = ticks_us()
+        self.loops += 1
+        if self._last_loop is not None:
+            gap = ticks_diff(now, self._last_loop)
+            if gap > self.worst_gap_us:
+                self.worst_gap_us = gap
+            if gap > self.stall_us:
+                self.stalls += 1
+        self._last_loop = now
+
+    def percentile(self, span, fraction):
+        """Upper bound (us) of the bucket holding the given fraction of the
+        span's durations (its maximum for the last bucket), or None."""
+        count = self._counts[span]
+        if not count:
+            return None
+        target = fraction * count
+        seen = 0
+        first = span * self._buckets
+        for bucket in range(len(self.bounds)):
+            seen += self._histograms[first + bucket]
+            if seen >= target:
+                return min(self.bounds[bucket], self._maxima[span])
+        return self._maxima[span]
+
+    def loop_rate(self):
+        """Iterations per second since the reset."""
+        elapsed = ticks_diff(ticks_us(), self._window_start)
+        return self.loops * 1000000 / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """Counters of the window as a dict (None when disabled).
+
+        The same dict is returned each time, updated in place: serialize it
+        before the next call.
+        """
+        if not self.enabled:
+            return None
+        for span in range(len(self.names)):
+            name = self.names[span]
+            if name is None:
+                continue
+            count = self._counts[span]
+            counters = self._spans[name]
+            counters["count"] = count
+            counters["mean_us"] = (self._totals[span] // count if count
+                                   else None)
+            counters["p95_us"] = self.percentile(span, 0.95)
+            counters["max_us"] = self._maxima[span]
+        summary = self._summary
+        summary["loops_per_s"] = round(self.loop_rate(), 1)
+        summary["worst_gap_us"] = self.worst_gap_us
+        summary["stalls"] = self.stalls
+        return summary
+
+    def dump(self):
+        """Print the counters and the non-empty buckets of each span."""
+        if not self.enabled:
+            return
+        print("loop: {:.1f}/s, worst gap {} us, {} stalls > {} us".format(
+            self.loop_rate(), self.worst_gap_us, self.stalls, self.stall_us))
+        for span, name in enumerate(self.names):
+            if name is None:
+                continue
+            count = self._counts[span]
+            if not count:
+                print("{}: -".format(name))
+                continue
+            buckets = []
+            first = span * self._buckets
+            for bucket in range(self._buckets):
+                hits = self._histograms[first + bucket]
+                if hits:
+                    bound = (self.bounds[bucket] if bucket < len(self.bounds)
+                             else "inf")
+                    buckets.append("<={}:{}".format(bound, hits))
+            print("{}: n={} mean={} us p95={} us max={} us [{}]".format(
+                name, count, self._totals[span] // count,
+                self.percentile(span, 0.95), self._maxima[span],
+                " ".join(buckets)))
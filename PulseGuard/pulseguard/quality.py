@@ -0,0 +1,108 @@
+# Signal quality index (SQI) of the IR channel, updated sample by sample
+# with integer compares and additions. It tells when the analysis is worth
+# running (a finger is on the sensor and the ADC is not clipping) and
+# whether a report window is good enough to be uploaded.
+from pulseguard.hrv import RunningStats
+
+
+class SignalQuality:
+    """Contact, perfusion, clipping and beat regularity of a PPG signal.
+
+    The samples are checked in blocks of block_s seconds. A block is good
+    when its mean (DC) is at least min_dc, its perfusion index
+    100 * (max - min) / DC lies between min_perfusion and max_perfusion (%)
+    and at most max_clipped_percent of its samples reach the ADC ceiling.
+    `contact` is the verdict of the last block. The R-R intervals added
+    with add_interval() measure the regularity of the beats.
+
+    index() scores the window since the last reset() from 0 to 1: the
+    fraction of good blocks times a regularity score that falls from 1 for
+    constant intervals to 0 when their coefficient of variation reaches
+    max_variation.
+    """
+
+    def __init__(self, sample_rate, ceiling, block_s=1.0, min_dc=None,
+                 min_perfusion=0.1, max_perfusion=20.0,
+                 max_clipped_percent=1.0, max_variation=0.3):
+        self.ceiling = ceiling
+        self.block_s = block_s
+        # Without a finger only ambient light reaches the photodiode: by
+        # default the DC must reach 1/16 of the full scale
+        self.min_dc = ceiling >> 4 if min_dc is None else min_dc
+        self.min_perfusion = min_perfusion
+        self.max_perfusion = max_perfusion
+        self.max_clipped_percent = max_clipped_percent
+        self.max_variation = max_variation
+        self.intervals = RunningStats()
+        # Verdict and perfusion index (%) of the last block; the signal is
+        # assumed usable until the first block is complete
+        self.contact = True
+        self.perfusion = None
+        self.reset()
+        self.set_sample_rate(sample_rate)
+
+    def set_sample_rate(self, sample_rate):
+        """Follow a change of the acquisition rate (the block restarts)."""
+        self.block_size = max(1, int(sample_rate * self.block_s))
+        self.max_clipped = self.block_size * self.max_clipped_percent / 100
+        self._reset_block()
+
+    def _reset_block(self):
+        self._n = 0
+        self._min = self._max = self._sum = 0
+        self._clipped = 0
+
+    def add_sample(self, ir):
+        """Add an IR reading; returns the contact verdict."""
+        if self._n:
+            if ir < self._min:
+                self._min = ir
+            elif ir > self._max:
+                self._max = ir
+            self._sum += ir
+        else:
+            self._min = self._max = self._sum = ir
+        if ir >= self.ceiling:
+            self._clipped += 1
+        self._n += 1
+        if self._n == self.block_size:
+            self._close_block()
+        return self.contact
+
+    def _close_block(self):
+        dc = self._sum / self._n
+        self.perfusion = 100 * (self._max - self._min) / dc if dc > 0 else 0.0
+        self.contact = (dc >= self.min_dc
+                        and self._clipped <= self.max_clipped
+                        and self.min_perfusion <= self.perfusion
+                        <= self.max_perfusion)
+        self.blocks += 1
+        if self.contact:
+            self.good_blocks += 1
+        self.clipped += self._clipped
+        self._reset_block()
+
+    def add_interval(self, interval):
+        """Add the R-R interval (ms) closed by a detected beat."""
+        self.intervals.add(interval)
+
+    def regularity(self):
+        """1 for constant R-R intervals, down to 0 (or fewer than two)."""
+        std = self.intervals.std()
+        if std is None:
+            return 0.0
+        score = 1 - std / self.intervals.mean / self.max_variation
+        return score if score > 0 else 0.0
+
+    def index(self):
+        """Signal quality of the current window, from 0 to 1."""
+        if not self.blocks:
+            return 0.0
+        return self.good_blocks / self.blocks * self.regularity()
+
+    def reset(self):
+        """Start a new window (the current block goes on)."""
+        self.blocks = 0
+        self.good_blocks = 0
+        self.clipped = 0
+        self.intervals.reset()
@@ -0,0 +1,136 @@
+# Adaptive acquisition rate: moves the MAX30102 between sample rate /
+# averaging profiles according to the headroom measured while the program
+# runs (how full the FIFO is at each drain, how long the samples wait to be
+# processed, whether any was lost).
+from utime import ticks_diff, ticks_ms
+
+# (set_sample_rate(), set_fifo_average()) profiles, from the lowest
+# effective rate to the highest: 25, 50 and 100 Hz. The sensor keeps 400
+# samples/s, which every pulse width supports with two LEDs. Faster rates
+# cost more without measuring better: in bench.accuracy the heart rate error
+# is lowest at 100 Hz and at 400 Hz it is higher than at 50 Hz, mostly on
+# the motion trace.
+PROFILES = ((400, 16), (400, 8), (400, 4))
+# Pressures are kept in thousandths, so that recording a drain does not
+# create floats
+PRESSURE_SCALE = 1000
+
+
+class RateController:
+    """Chooses the acquisition profile from the measured headroom.
+
+    Each time samples are taken from the driver, record_drain() receives
+    the number of samples found in the FIFO by the last drain, the age
+    (ms) of the oldest sample when the program gets to it and the
+    cumulative count of lost samples. The pressure is the larger of:
+    - the FIFO fill level above fifo_threshold (the level at which it is
+      normally drained, e.g. the almost-full interrupt threshold), as a
+      fraction of the rest of the FIFO;
+    - the samples acquired while the oldest one waited, as a fraction of
+      the capacity of the driver storage.
+    Pressures are in thousandths (PRESSURE_SCALE): at 1000 samples are
+    about to be lost.
+
+    The first drain only sets the baseline: it follows the setup, when
+    nobody was reading the sensor.
+
+    update() steps down as soon as a sample is lost or the pressure
+    exceeds `high`: to the fastest profile at which the pressure, scaled to
+    its rate, would not exceed `high`, and at least one step. It steps up
+    one profile after calm_periods periods of period_ms in which the
+    pressure, scaled to the next rate, stayed below `low`. The gap between
+    the thresholds and the calm periods are the hysteresis that keeps the
+    rate from oscillating.
+    """
+
+    def __init__(self, profiles=PROFILES, initial=1, capacity=256,
+                 fifo_depth=32, fifo_threshold=0, high=0.6, low=0.3,
+                 period_ms=5000, calm_periods=3):
+        if not 0 <= initial < len(profiles):
+            raise ValueError('Wrong initial profile:{0}!'.format(initial))
+        self.profiles = profiles
+        self.index = initial
+        self.capacity = capacity
+        self.fifo_depth = fifo_depth
+        self.fifo_threshold = fifo_threshold
+        self.high = high
+        self.low = low
+        self._high = int(high * PRESSURE_SCALE)
+        self._low = int(low * PRESSURE_SCALE)
+        self.period_ms = period_ms
+        self.calm_periods = calm_periods
+        # Profile changes since the start
+        self.switches = 0
+        # Highest pressure seen in the current period, in thousandths
+        self.pressure = 0
+        self._lost = None
+        self._losing = False
+        self._calm = 0
+        self._period_start = ticks_ms()
+
+    def profile(self):
+        """(sample_rate, sample_avg) of the current profile."""
+        return self.profiles[self.index]
+
+    def rate(self):
+        """Effective acquisition rate (Hz) of the current profile."""
+        return self._rate_of(self.index)
+
+    def _rate_of(self, index):
+        sample_rate, sample_avg = self.profiles[index]
+        return sample_rate // sample_avg
+
+    def record_drain(self, fifo_samples, latency_ms, lost):
+        if self._lost is None:
+            self._lost = lost
+            return
+        span = self.fifo_depth - self.fifo_threshold
+        fill = ((fifo_samples - self.fifo_threshold) * PRESSURE_SCALE // span
+                if span > 0 else 0)
+        # latency_ms * rate / 1000 samples waited, in thousandths of the
+        # capacity (dividing once keeps the product a small integer)
+        delay = latency_ms * self.rate() * (PRESSURE_SCALE // 1000) \
+            // self.capacity
+        pressure = fill if fill > delay else delay
+        if pressure > self.pressure:
+            self.pressure = pressure
+        if lost > self._lost:
+            self._losing = True
+        self._lost = lost
+
+    def update(self, now=None):
+        """Return True when the profile changed: apply profile() then."""
+        if now is None:
+            now = ticks_ms()
+        rate = self.rate()
+        if self._losing or self.pressure > self._high:
+            index = self.index - 1
+            while index > 0 and \
+                    self.pressure * self._rate_of(index) > self._high * rate:
+                index -= 1
+            return self._switch(index, now)
+        if ticks_diff(now, self._period_start) < self.period_ms:
+            return False
+        # End of a calm period: would the next profile be calm as well?
+        if self.index + 1 < len(self.profiles):
+            if self.pressure * self._rate_of(self.index + 1) < \
+                    self._low * rate:
+                self._calm += 1
+            else:
+                self._calm = 0
+        self.pressure = 0
+        self._period_start = now
+        if self._calm >= self.calm_periods:
+            return self._switch(self.index + 1, now)
+        return False
+
+    def _switch(self, index, now):
+        self.pressure = 0
+        self._losing = False
+        self._calm = 0
+        self._period_start = now
+        if not 0 <= index < len(self.profiles):
+            return False
+        self.index = index
+        self.switches += 1
+        return True
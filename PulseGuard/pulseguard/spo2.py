@@ -0,0 +1,113 @@
+# Streaming SpO2 estimation from the red and IR channels (ratio of ratios),
+# aligned on the beats detected by the heart rate monitor.
+from array import array
+
+
+class SpO2Estimator:
+    """Beat-aligned SpO2 in constant memory.
+
+    Between two beats it tracks, for each channel, the minimum, the maximum
+    and the sum of the raw samples: AC is the peak-to-peak amplitude over
+    the beat and DC its mean. When a beat ends, the ratio
+    R = (AC_red / DC_red) / (AC_ir / DC_ir) goes into a ring of the last
+    `beats` ratios, and SpO2 = a - b * mean(R) (the usual linear
+    calibration; a and b depend on the LEDs and should be adjusted against
+    a reference oximeter). Per sample the work is integer compares and
+    additions; floats are only created once per beat.
+    """
+
+    def __init__(self, sample_rate, beats=8, a=110.0, b=25.0, min_beats=3,
+                 min_ratio=0.2, max_ratio=1.8):
+        self.a = a
+        self.b = b
+        self.min_beats = min_beats
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self.set_sample_rate(sample_rate)
+        # Ring of the last ratios and their running sum
+        self.size = beats
+        self._ratios = array('f', [0.0] * beats)
+        self._start = 0
+        self._count = 0
+        self._sum = 0.0
+        # Beats whose ratio was out of range
+        self.rejected = 0
+
+    def set_sample_rate(self, sample_rate):
+        """Follow a change of the acquisition rate (the ratios are kept)."""
+        self.sample_rate = sample_rate
+        # A beat lasts 0.25-2 s (240-30 BPM); other windows are discarded
+        self.min_samples = max(2, sample_rate // 4)
+        self.max_samples = sample_rate * 2
+        self._reset_window()
+
+    def _reset_window(self):
+        self._n = 0
+        self._red_min = self._red_max = self._red_sum = 0
+        self._ir_min = self._ir_max = self._ir_sum = 0
+
+    def add_sample(self, red, ir, beat=False):
+        """Add a red/IR pair; beat is True when this sample ends a beat."""
+        if beat:
+            self._close_window()
+        if self._n:
+            if red < self._red_min:
+                self._red_min = red
+            elif red > self._red_max:
+                self._red_max = red
+            if ir < self._ir_min:
+                self._ir_min = ir
+            elif ir > self._ir_max:
+                self._ir_max = ir
+            self._red_sum += red
+            self._ir_sum += ir
+        else:
+            self._red_min = self._red_max = self._red_sum = red
+            self._ir_min = self._ir_max = self._ir_sum = ir
+        self._n += 1
+
+    def _close_window(self):
+        n = self._n
+        ac_red = self._red_max - self._red_min
+        ac_ir = self._ir_max - self._ir_min
+        if self.min_samples <= n <= self.max_samples and ac_ir > 0 \
+                and self._red_sum > 0:
+            # The sample counts of the two means cancel out
+            ratio = (ac_red * float(self._ir_sum)) / (self._red_sum * float(ac_ir))
+            if self.min_ratio <= ratio <= self.max_ratio:
+                self._push(ratio)
+            else:
+                self.rejected += 1
+        self._reset_window()
+
+    def _push(self, ratio):
+        i = self._start + self._count
+        if i >= self.size:
+            i -= self.size
+        if self._count == self.size:
+            self._sum -= self._ratios[i]
+            self._start = i + 1 if i + 1 < self.size else 0
+        else:
+            self._count += 1
+        self._ratios[i] = ratio
+        self._sum += ratio
+
+    def ratio(self):
+        """Mean ratio of ratios over the stored beats, or None."""
+        if self._count < self.min_beats:
+            return None
+        return self._sum / self._count
+
+    def calculate_spo2(self):
+        """Estimated SpO2 (%), or None until min_beats beats were seen."""
+        ratio = self.ratio()
+        if ratio is None:
+            return None
+        spo2 = self.a - self.b * ratio
+        return 100.0 if spo2 > 100.0 else spo2
+
+    def reset(self):
+        self._start = 0
+        self._count = 0
+        self._sum = 0.0
+        self._reset_window()
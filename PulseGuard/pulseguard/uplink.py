@@ -0,0 +1,170 @@
+# HTTP/1.1 uplink over one persistent connection. Opening a TCP connection
+# for each reading (urequests) costs a handshake and a teardown, which
+# dominate both the radio airtime and the time the loop is blocked for small
+# JSON uploads. Here the socket is kept open (keep-alive), several requests
+# can be written before their answers are read (pipelining), a connection
+# dropped by the server is reopened transparently, and every exchange has a
+# strict deadline.
+import errno
+import json
+
+import usocket as socket
+from utime import ticks_add, ticks_diff, ticks_ms
+
+
+def request_head(method, path, host, port, length):
+    return ("{} {} HTTP/1.1\r\nHost: {}:{}\r\nConnection: keep-alive\r\n"
+            "Content-Type: application/json\r\nContent-Length: {}\r\n\r\n"
+            .format(method, path, host, port, length).encode())
+
+
+def encode_requests(method, path, host, port, bodies):
+    """One buffer with the requests for the JSON bodies, so that a pipelined
+    batch leaves in as few TCP segments as possible."""
+    parts = []
+    for body in bodies:
+        parts.append(request_head(method, path, host, port, len(body)))
+        parts.append(body)
+    return b"".join(parts)
+
+
+def parse_status(line):
+    """(status code, keep-alive by default) of an HTTP status line."""
+    fields = line.split(None, 2)
+    if len(fields) < 2 or not fields[0].startswith(b"HTTP/"):
+        raise OSError(errno.EIO, "bad status line")
+    return int(fields[1]), fields[0] != b"HTTP/1.0"
+
+
+def parse_header(line):
+    """(name, value) of a header line, name in lower case."""
+    colon = line.find(b":")
+    if colon < 0:
+        return line.strip().lower(), b""
+    return line[:colon].strip().lower(), line[colon + 1:].strip()
+
+
+class Uplink:
+    """Blocking JSON uplink keeping one HTTP/1.1 connection to the server.
+
+    put_json() sends one payload and returns the HTTP status; put_many()
+    pipelines up to max_pipeline requests per round trip and returns the
+    statuses in order; send() does the same with bodies already encoded as
+    JSON (bytes). Each call must finish within timeout_ms, connection
+    included, or OSError(ETIMEDOUT) is raised and the connection is closed
+    (its state is unknown).
+
+    When a reused connection turns out to be closed (the server dropped it
+    while idle), the unanswered requests are sent again once on a new
+    connection; PUT is idempotent. A response with "Connection: close" ends
+    the connection as well, and the rest of the batch goes on a new one.
+    Other errors raise OSError.
+    """
+
+    def __init__(self, host, port, timeout_ms=5000, max_pipeline=4,
+                 method="PUT"):
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.max_pipeline = max_pipeline
+        self.method = method
+        # Connections opened, requests answered and transparent reconnects
+        self.connections = 0
+        self.requests = 0
+        self.reconnects = 0
+        self._address = None
+        self._sock = None
+
+    def connected(self):
+        return self._sock is not None
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def put_json(self, path, payload):
+        return self.put_many(path, (payload,))[0]
+
+    def put_many(self, path, payloads):
+        return self.send(path, [json.dumps(payload).encode()
+                                for payload in payloads])
+
+    def send(self, path, bodies):
+        deadline = ticks_add(ticks_ms(), self.timeout_ms)
+        statuses = []
+        retried = False
+        while len(statuses) < len(bodies):
+            reused = self._sock is not None
+            try:
+                if not reused:
+                    self._connect(deadline)
+                self._pipeline(path, bodies, statuses, deadline)
+            except OSError as e:
+                self.close()
+                if e.args[0] == errno.ETIMEDOUT or not reused or retried:
+                    raise
+                retried = True
+                self.reconnects += 1
+        return statuses
+
+    def _arm(self, deadline):
+        # Socket timeout = what is left of the deadline
+        remaining = ticks_diff(deadline, ticks_ms())
+        if remaining <= 0:
+            raise OSError(errno.ETIMEDOUT, "uplink deadline")
+        self._sock.settimeout(remaining / 1000)
+
+    def _connect(self, deadline):
+        if self._address is None:
+            self._address = socket.getaddrinfo(self.host, self.port)[0][-1]
+        self._sock = socket.socket()
+        self._arm(deadline)
+        self._sock.connect(self._address)
+        self.connections += 1
+
+    def _pipeline(self, path, bodies, statuses, deadline):
+        # Send the next requests, then read their answers in order
+        first = len(statuses)
+        last = min(first + self.max_pipeline, len(bodies))
+        self._arm(deadline)
+        self._sock.write(encode_requests(
+            self.method, path, self.host, self.port, bodies[first:last]))
+        for _ in range(first, last):
+            status, keep_alive = self._read_response(deadline)
+            statuses.append(status)
+            self.requests += 1
+            if not keep_alive:
+                self.close()
+                return
+
+    def _readline(self, deadline):
+        self._arm(deadline)
+        line = self._sock.readline()
+        if not line:
+            raise OSError(errno.ECONNRESET, "connection closed")
+        return line
+
+    def _read_response(self, deadline):
+        status, keep_alive = parse_status(self._readline(deadline))
+        length = 0
+        while True:
+            line = self._readline(deadline)
+            if line == b"\r\n":
+                break
+            name, value = parse_header(line)
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"connection":
+                keep_alive = value.lower() == b"keep-alive"
+        # The body ("Dados recebidos") is not used
+        while length > 0:
+            self._arm(deadline)
+            chunk = self._sock.read(length)
+            if not chunk:
+                raise OSError(errno.ECONNRESET, "connection closed")
+            length -= len(chunk)
+        return status, keep_alive